@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""Compares ways of building /facets Elasticsearch requests.
+
+Compares elasticsearch-dsl's FacetedSearch with FacetsSearchTemplate.get_body().
+Without --elasticsearch_url, builds requests
+for synthetic facets and reports request size and build time:
+
+    python api/benchmarks/faceted_search_request.py --facets 150 --filters 5
+
+With --elasticsearch_url, also reports latency against a real index. Facets
+are terms facets on every non-nested keyword, numeric and boolean field of
+the index, and filters select the top value of the first --filters facets:
+
+    python api/benchmarks/faceted_search_request.py \
+        --elasticsearch_url localhost:9200 --index_name 1000_genomes
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from elasticsearch_dsl import FacetedSearch
+from elasticsearch_dsl import TermsFacet
+from flask import Flask
+from flask import current_app
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from data_explorer.util import dataset_faceted_search
+from data_explorer.util import elasticsearch_util
+
+_FACET_FIELD_TYPES = ('keyword', 'long', 'integer', 'float', 'double',
+                      'boolean')
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--facets',
+                    type=int,
+                    help='Number of synthetic facets',
+                    default=150)
+parser.add_argument('--filters',
+                    type=int,
+                    help='Number of facets with a selection',
+                    default=5)
+parser.add_argument('--elasticsearch_url',
+                    type=str,
+                    help='Optional Elasticsearch url, to measure latency',
+                    default='')
+parser.add_argument('--index_name',
+                    type=str,
+                    help='Index to run searches against',
+                    default='')
+parser.add_argument('--requests',
+                    type=int,
+                    help='Number of requests per implementation',
+                    default=20)
+
+
+class LegacyFacetedSearch(FacetedSearch):
+    """FacetedSearch over es_facets, with one filter aggregation per facet."""
+    def __init__(self, filters, es_facets):
+        self.index = current_app.config['INDEX_NAME']
+        self.facets = dict((name, facet_info['es_facet'])
+                           for name, facet_info in es_facets.items())
+        self.using = elasticsearch_util.get_elasticsearch()
+        super(LegacyFacetedSearch, self).__init__(None, filters)
+
+    def search(self):
+        return super(LegacyFacetedSearch, self).search().params(size=0)
+
+
+def _get_synthetic_facets_and_filters(args):
+    facets = {}
+    for i in range(args.facets):
+        name = 'project.dataset.table.field_%d' % i
+        facets[name] = {'es_facet': TermsFacet(field=name)}
+    filters = dict(('project.dataset.table.field_%d' % i, ['value'])
+                   for i in range(args.filters))
+    return facets, filters
+
+
+def _add_index_facets(prefix, properties, facets):
+    for name, field in sorted(properties.items()):
+        field_name = prefix + name
+        if field.get('type') == 'nested':
+            continue
+        if field.get('type') in _FACET_FIELD_TYPES:
+            facets[field_name] = {'es_facet': TermsFacet(field=field_name)}
+        _add_index_facets(field_name + '.', field.get('properties', {}),
+                          facets)
+
+
+def _get_index_facets_and_filters(es, args):
+    mapping = es.indices.get_mapping(index=args.index_name)
+    facets = {}
+    _add_index_facets(
+        '', mapping[args.index_name]['mappings']['type']['properties'], facets)
+
+    template = dataset_faceted_search.FacetsSearchTemplate(facets)
+    response = es.search(index=args.index_name, body=template.get_body({}))
+    facet_values = template.get_facets({}, response['aggregations'])
+    filters = {}
+    for name in list(facets.keys()):
+        if len(filters) == args.filters:
+            break
+        values = facet_values[name]
+        if values:
+            filters[name] = [values[0][0]]
+    return facets, filters
+
+
+def _report_faceted_search(facets, filters, args):
+    start = time.time()
+    for _ in range(args.requests):
+        search = LegacyFacetedSearch(filters, facets)
+        request = json.dumps(search._s.to_dict())
+    build_ms = (time.time() - start) * 1000 / args.requests
+    print('FacetedSearch.aggregate()')
+    print('    request size: %d bytes' % len(request))
+    print('    build time: %.2f ms' % build_ms)
+    if not args.elasticsearch_url:
+        return
+
+    latencies = []
+    for _ in range(args.requests):
+        start = time.time()
+        search.execute()
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print('    latency p50: %.1f ms' % (latencies[len(latencies) // 2] * 1000))
+    print('    latency max: %.1f ms' % (latencies[-1] * 1000))
+
+
+def _report_template(facets, filters, args):
+    start = time.time()
+    template = dataset_faceted_search.FacetsSearchTemplate(facets)
+    compile_ms = (time.time() - start) * 1000
+    start = time.time()
+    for _ in range(args.requests):
+        # Serializing is part of building a request; the client does it.
+        request = json.dumps(template.get_body(filters))
+    build_ms = (time.time() - start) * 1000 / args.requests
+    print('FacetsSearchTemplate.get_body()')
+    print('    request size: %d bytes' % len(request))
+    print('    compile time: %.2f ms' % compile_ms)
+    print('    build time: %.2f ms' % build_ms)
+    if not args.elasticsearch_url:
+        return
+
+    es = elasticsearch_util.get_elasticsearch()
+    latencies = []
+    for _ in range(args.requests):
+        start = time.time()
+        es.search(index=args.index_name, body=template.get_body(filters))
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print('    latency p50: %.1f ms' % (latencies[len(latencies) // 2] * 1000))
+    print('    latency max: %.1f ms' % (latencies[-1] * 1000))
+
+
+def main():
+    args = parser.parse_args()
+    app = Flask(__name__)
+    app.config['INDEX_NAME'] = args.index_name
+    # Without --elasticsearch_url no search is executed, but creating the
+    # client still needs a url.
+    app.config['ELASTICSEARCH_URL'] = (args.elasticsearch_url
+                                       or 'localhost:9200')
+    app.config['ELASTICSEARCH_MAXSIZE'] = 1
+    app.config['ELASTICSEARCH_TIMEOUT'] = 60
+    app.config['ELASTICSEARCH_MAX_RETRIES'] = 0
+    app.config['ELASTICSEARCH_RETRY_ON_TIMEOUT'] = False
+    with app.app_context():
+        if args.elasticsearch_url:
+            facets, filters = _get_index_facets_and_filters(
+                elasticsearch_util.get_elasticsearch(), args)
+        else:
+            facets, filters = _get_synthetic_facets_and_filters(args)
+        print('%d facets, %d filters' % (len(facets), len(filters)))
+        _report_faceted_search(facets, filters, args)
+        _report_template(facets, filters, args)
+
+
+if __name__ == '__main__':
+    main()
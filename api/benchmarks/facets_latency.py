@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Measures /count, /facets and /search latency against a running API server.
+
+Run before and after a change to compare, for example:
+
+    python api/benchmarks/facets_latency.py --api_url http://localhost:4400/api
+
+Filters and queries are passed through verbatim, so they should be valid for
+the dataset the server is running with.
+"""
+
+import argparse
+import concurrent.futures
+import time
+
+import requests
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--api_url',
+                    type=str,
+                    help='API server url, including path prefix',
+                    default='http://localhost:4400/api')
+parser.add_argument('--requests',
+                    type=int,
+                    help='Number of requests per endpoint',
+                    default=200)
+parser.add_argument('--concurrency',
+                    type=int,
+                    help='Number of requests in flight at once',
+                    default=8)
+parser.add_argument(
+    '--filter',
+    type=str,
+    help='Optional /facets filter param, eg "a.b.c.Gender=male"',
+    default='')
+parser.add_argument('--approximate',
+                    action='store_true',
+                    help='Request approximate /facets counts')
+parser.add_argument('--query',
+                    type=str,
+                    help='Optional /search query param',
+                    default='')
+
+
+def _percentile(sorted_values, percentile):
+    index = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def _time_request(session, url, params):
+    start = time.time()
+    response = session.get(url, params=params)
+    response.raise_for_status()
+    return time.time() - start
+
+
+def _benchmark(url, params, args):
+    # One session per worker thread, like a browser keeping its connection
+    # open to the API server.
+    sessions = [requests.Session() for _ in range(args.concurrency)]
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as executor:
+        futures = [
+            executor.submit(_time_request, sessions[i % args.concurrency], url,
+                            params) for i in range(args.requests)
+        ]
+        latencies = sorted(f.result() for f in futures)
+    elapsed = time.time() - start
+    print('%s %s' % (url, params))
+    print('    requests/sec: %.1f' % (args.requests / elapsed))
+    for percentile in (50, 90, 99):
+        print('    p%d: %.1f ms' %
+              (percentile, _percentile(latencies, percentile) * 1000))
+
+
+def main():
+    args = parser.parse_args()
+    facets_params = {'filter': args.filter} if args.filter else {}
+    _benchmark(args.api_url + '/count', dict(facets_params), args)
+    if args.approximate:
+        facets_params['approximate'] = 'true'
+    _benchmark(args.api_url + '/facets', facets_params, args)
+    search_params = {'query': args.query} if args.query else {}
+    _benchmark(args.api_url + '/search', search_params, args)
+
+
+if __name__ == '__main__':
+    main()
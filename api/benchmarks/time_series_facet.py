@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Compares time series facet assembly before and after NumPy.
+
+Builds synthetic facet values for a time series facet, checks that both
+implementations return the same value_names and time_series_value_counts, and
+reports the time each takes. Also reports the time and JSON size of the sparse
+encoding (timeSeriesEncoding=sparse):
+
+    python api/benchmarks/time_series_facet.py --times 300 --values 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from data_explorer.controllers import facets_controller
+from data_explorer.util import elasticsearch_util
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--times',
+                    type=int,
+                    help='Number of time series values',
+                    default=300)
+parser.add_argument('--values',
+                    type=int,
+                    help='Number of facet values per time',
+                    default=50)
+parser.add_argument('--density',
+                    type=float,
+                    help='Fraction of non-zero counts',
+                    default=0.5)
+parser.add_argument('--repeats',
+                    type=int,
+                    help='Number of times to run each implementation',
+                    default=20)
+
+
+def _legacy_get_time_series_params(ts_values, sort_by_count):
+    """The pure Python implementation, from _get_time_series_facet() and
+    _get_time_series_params()."""
+    ts_value_names = {}
+    nonzero_ts_values = []
+    for value_names, value_counts in ts_values:
+        for i in range(len(value_names)):
+            if sort_by_count:
+                if value_names[i] in ts_value_names:
+                    ts_value_names[value_names[i]] -= value_counts[i]
+                else:
+                    ts_value_names[value_names[i]] = -value_counts[i]
+            else:
+                ts_value_names[
+                    value_names[i]] = elasticsearch_util.range_to_number(
+                        value_names[i])
+        if not all(count == 0 for count in value_counts):
+            nonzero_ts_values.append([value_names, value_counts])
+
+    srt = sorted([(ts_value_names[i], i) for i in ts_value_names])
+    value_names = [interval for value, interval in srt]
+    for i in range(len(srt)):
+        value, interval = srt[i]
+        ts_value_names[interval] = i
+    time_series_value_counts = []
+    for entry in nonzero_ts_values:
+        cur_value_names = entry[0]
+        cur_value_counts = entry[1]
+        entry_array = [0 for name in value_names]
+        for i in range(len(cur_value_names)):
+            entry_array[ts_value_names[
+                cur_value_names[i]]] = cur_value_counts[i]
+        time_series_value_counts.append(entry_array)
+    return value_names, time_series_value_counts
+
+
+def _get_ts_values(args, sort_by_count):
+    rand = random.Random(0)
+    ts_values = []
+    for _ in range(args.times):
+        if sort_by_count:
+            value_names = [
+                'value%d' % i for i in range(args.values)
+                if rand.random() < 0.8
+            ]
+        else:
+            value_names = [
+                '%d-%d' % (i * 10, i * 10 + 9) for i in range(args.values)
+                if rand.random() < 0.8
+            ]
+        value_counts = [
+            rand.randint(1, 3) if rand.random() < args.density else 0
+            for _ in value_names
+        ]
+        ts_values.append([value_names, value_counts])
+    # A time without any values.
+    ts_values.append([[], []])
+    return ts_values
+
+
+def _report(name, ts_values, sort_by_count, args):
+    results = []
+    print(name)
+    for implementation_name, implementation in [
+        ('pure Python', _legacy_get_time_series_params),
+        ('NumPy', facets_controller._get_time_series_params)
+    ]:
+        start = time.time()
+        for _ in range(args.repeats):
+            result = implementation(ts_values, sort_by_count)
+        print('    %s: %.2f ms' %
+              (implementation_name,
+               (time.time() - start) * 1000 / args.repeats))
+        results.append(result)
+    assert results[0] == results[1]
+
+    start = time.time()
+    for _ in range(args.repeats):
+        value_names, value_indexes, value_counts = (
+            facets_controller._get_sparse_time_series_params(
+                ts_values, sort_by_count))
+    print('    sparse: %.2f ms' %
+          ((time.time() - start) * 1000 / args.repeats))
+    for row, indexes, counts in zip(results[0][1], value_indexes,
+                                    value_counts):
+        assert [(i, count) for i, count in enumerate(row)
+                if count] == list(zip(indexes, counts))
+    print('    JSON size: dense %d bytes, sparse %d bytes' %
+          (len(json.dumps(
+              results[0][1])), len(json.dumps([value_indexes, value_counts]))))
+
+
+def main():
+    args = parser.parse_args()
+    print('%d times, %d values' % (args.times, args.values))
+    _report('text facet', _get_ts_values(args, True), True, args)
+    _report('histogram facet', _get_ts_values(args, False), False, args)
+
+
+if __name__ == '__main__':
+    main()
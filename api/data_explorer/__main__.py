@@ -11,9 +11,13 @@ import sys
 import time
 
 from collections import OrderedDict
+from data_explorer.controllers import facets_controller
 from data_explorer.encoder import JSONEncoder
+from data_explorer.util import columnar_facets
 from data_explorer.util import elasticsearch_util
-from elasticsearch import Elasticsearch
+from data_explorer.util import facet_info_snapshot
+from data_explorer.util import field_registry
+from data_explorer.util import schema_catalog
 from elasticsearch.client.cat import CatClient
 from elasticsearch.exceptions import ConnectionError
 from elasticsearch.exceptions import TransportError
@@ -21,6 +25,11 @@ from elasticsearch.exceptions import TransportError
 if sys.version_info.major < 3:
     raise Exception('Python2 is deprecated. Please upgrade to Python3')
 
+
+def _str_to_bool(s):
+    return str(s).lower() in ('true', '1', 'yes')
+
+
 # gunicorn flags are passed via env variables, so we use these as the default
 # values. These arguments will rarely be specified as flags directly, aside from
 # occasional use during local debugging.
@@ -37,12 +46,115 @@ parser.add_argument('--dataset_config_dir',
                     type=str,
                     help='Dataset config dir. Can be relative or absolute',
                     default=os.environ.get('DATASET_CONFIG_DIR'))
+# Elasticsearch client settings. One client, and thus one urllib3 connection
+# pool, is shared by all requests in a worker.
+parser.add_argument(
+    '--elasticsearch_maxsize',
+    type=int,
+    help='Maximum number of pooled connections per Elasticsearch node',
+    default=int(os.environ.get('ELASTICSEARCH_MAXSIZE', 10)))
+parser.add_argument('--elasticsearch_timeout',
+                    type=float,
+                    help='Default Elasticsearch request timeout, in seconds',
+                    default=float(os.environ.get('ELASTICSEARCH_TIMEOUT', 10)))
+parser.add_argument(
+    '--elasticsearch_max_retries',
+    type=int,
+    help='Number of times a failed Elasticsearch request is retried',
+    default=int(os.environ.get('ELASTICSEARCH_MAX_RETRIES', 3)))
+parser.add_argument(
+    '--elasticsearch_retry_on_timeout',
+    type=_str_to_bool,
+    help='Whether Elasticsearch requests that time out are retried',
+    default=_str_to_bool(
+        os.environ.get('ELASTICSEARCH_RETRY_ON_TIMEOUT', 'false')))
+# Settings for loading bundled datasets from index.json.
+parser.add_argument(
+    '--bulk_load_thread_count',
+    type=int,
+    help='Number of threads indexing documents when loading index.json',
+    default=int(os.environ.get('BULK_LOAD_THREAD_COUNT', 4)))
+parser.add_argument('--bulk_load_chunk_size',
+                    type=int,
+                    help='Maximum number of documents per bulk request',
+                    default=int(os.environ.get('BULK_LOAD_CHUNK_SIZE', 500)))
+parser.add_argument('--bulk_load_max_chunk_bytes',
+                    type=int,
+                    help='Maximum size of a bulk request, in bytes',
+                    default=int(
+                        os.environ.get('BULK_LOAD_MAX_CHUNK_BYTES',
+                                       10 * 1024 * 1024)))
+parser.add_argument(
+    '--index_generation_check_seconds',
+    type=float,
+    help='How often to check whether the Elasticsearch indices changed. '
+    'In-memory data derived from the indices is rebuilt when they change.',
+    default=float(os.environ.get('INDEX_GENERATION_CHECK_SECONDS', 30)))
+parser.add_argument(
+    '--facet_info_snapshot',
+    type=str,
+    help='Path of facet info snapshot. Defaults to '
+    'facet_info_snapshot.json in dataset config dir. Empty string disables '
+    'the snapshot.',
+    default=os.environ.get('FACET_INFO_SNAPSHOT'))
+parser.add_argument(
+    '--facets_cache_max_bytes',
+    type=int,
+    help='Maximum total size of cached /facets responses per worker, in '
+    'bytes. 0 disables the cache.',
+    default=int(os.environ.get('FACETS_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+parser.add_argument(
+    '--facets_cache_ttl_seconds',
+    type=float,
+    help='How long /facets and /count responses are cached for, in seconds',
+    default=float(os.environ.get('FACETS_CACHE_TTL_SECONDS', 600)))
+parser.add_argument(
+    '--count_cache_max_bytes',
+    type=int,
+    help='Maximum total size of cached /count responses per worker, in '
+    'bytes. 0 disables the cache.',
+    default=int(os.environ.get('COUNT_CACHE_MAX_BYTES', 1024 * 1024)))
+parser.add_argument(
+    '--facets_search_group_size',
+    type=int,
+    help='If set, /facets searches with more facets than this are split into '
+    'groups of at most this many facets, with one search per group',
+    default=int(os.environ.get('FACETS_SEARCH_GROUP_SIZE', 0)))
+parser.add_argument(
+    '--facets_search_mode',
+    type=str,
+    choices=['msearch', 'threads'],
+    help='How grouped /facets searches are sent: in one _msearch request, or '
+    'as concurrent requests from a thread pool',
+    default=os.environ.get('FACETS_SEARCH_MODE', 'msearch'))
+parser.add_argument(
+    '--facets_search_concurrency',
+    type=int,
+    help='Number of threads sending grouped /facets searches, in threads mode',
+    default=int(os.environ.get('FACETS_SEARCH_CONCURRENCY', 4)))
+parser.add_argument(
+    '--terms_facet_max_size',
+    type=int,
+    help='Maximum number of values returned by /facets for a text facet. The '
+    'rest can be paged through with /facetValues',
+    default=int(os.environ.get('TERMS_FACET_MAX_SIZE', 1000)))
+parser.add_argument(
+    '--approximate_facets_shard_size',
+    type=int,
+    help='Documents per shard whose values are counted by /facets with '
+    'approximate=true',
+    default=int(os.environ.get('APPROXIMATE_FACETS_SHARD_SIZE', 10000)))
 
 if __name__ == '__main__':
     parser.add_argument('--port',
                         type=int,
                         default=8390,
                         help='The port on which to serve HTTP requests')
+    parser.add_argument(
+        '--build_facet_info_snapshot',
+        action='store_true',
+        help='Write facet info snapshot and exit, instead of serving. '
+        'Can be run at Docker image build time.')
     args = parser.parse_args()
 else:
     # Allow unknown args if we aren't the main program, these include flags to
@@ -54,6 +166,29 @@ app = connexion.App(__name__,
                     options={'swagger_ui': True})
 app.app.config['ELASTICSEARCH_URL'] = args.elasticsearch_url
 app.app.config['DATASET_CONFIG_DIR'] = args.dataset_config_dir
+app.app.config['ELASTICSEARCH_MAXSIZE'] = args.elasticsearch_maxsize
+app.app.config['ELASTICSEARCH_TIMEOUT'] = args.elasticsearch_timeout
+app.app.config['ELASTICSEARCH_MAX_RETRIES'] = args.elasticsearch_max_retries
+app.app.config[
+    'ELASTICSEARCH_RETRY_ON_TIMEOUT'] = args.elasticsearch_retry_on_timeout
+app.app.config[
+    'INDEX_GENERATION_CHECK_SECONDS'] = args.index_generation_check_seconds
+app.app.config['BULK_LOAD_THREAD_COUNT'] = args.bulk_load_thread_count
+app.app.config['BULK_LOAD_CHUNK_SIZE'] = args.bulk_load_chunk_size
+app.app.config['BULK_LOAD_MAX_CHUNK_BYTES'] = args.bulk_load_max_chunk_bytes
+if args.facet_info_snapshot is None and args.dataset_config_dir:
+    args.facet_info_snapshot = os.path.join(args.dataset_config_dir,
+                                            'facet_info_snapshot.json')
+app.app.config['FACET_INFO_SNAPSHOT'] = args.facet_info_snapshot
+app.app.config['FACETS_CACHE_MAX_BYTES'] = args.facets_cache_max_bytes
+app.app.config['FACETS_CACHE_TTL_SECONDS'] = args.facets_cache_ttl_seconds
+app.app.config['COUNT_CACHE_MAX_BYTES'] = args.count_cache_max_bytes
+app.app.config['FACETS_SEARCH_GROUP_SIZE'] = args.facets_search_group_size
+app.app.config['FACETS_SEARCH_MODE'] = args.facets_search_mode
+app.app.config['FACETS_SEARCH_CONCURRENCY'] = args.facets_search_concurrency
+app.app.config['TERMS_FACET_MAX_SIZE'] = args.terms_facet_max_size
+app.app.config[
+    'APPROXIMATE_FACETS_SHARD_SIZE'] = args.approximate_facets_shard_size
 
 # Log to stderr.
 handler = logging.StreamHandler()
@@ -73,8 +208,11 @@ app.add_api('swagger.yaml', base_path=args.path_prefix)
 
 
 def init_elasticsearch():
+    # This is the client shared by all requests in this process. If gunicorn
+    # preloads the app, workers create their own client after fork.
+    es = elasticsearch_util.get_elasticsearch()
+
     # Wait for Elasticsearch to be healthy.
-    es = Elasticsearch(app.app.config['ELASTICSEARCH_URL'])
     start = time.time()
     for _ in range(0, 120):
         try:
@@ -89,7 +227,9 @@ def init_elasticsearch():
         raise EnvironmentError('Elasticsearch failed to start.')
 
     # Use the cached JSON files to load the example 1000 genomes and
-    # framingham teaching datasets without having to run the indexer.
+    # framingham teaching datasets without having to run the indexer. The
+    # indices are only reloaded if the JSON files have changed since they were
+    # last loaded.
     if (app.app.config['INDEX_NAME'] == '1000_genomes'
             or app.app.config['INDEX_NAME']
             == 'framingham_heart_study_teaching_dataset'):
@@ -137,7 +277,10 @@ def _parse_json_file(json_path):
 def _process_dataset():
     config_path = os.path.join(app.app.config['DATASET_CONFIG_DIR'],
                                'dataset.json')
-    app.app.config['DATASET_NAME'] = _parse_json_file(config_path)['name']
+    config = _parse_json_file(config_path)
+    app.app.config['DATASET_NAME'] = config['name']
+    app.app.config['FACET_ENGINE'] = config.get('facet_engine',
+                                                'elasticsearch')
     app.app.config['INDEX_NAME'] = elasticsearch_util.convert_to_index_name(
         app.app.config['DATASET_NAME'])
     app.app.config[
@@ -186,7 +329,7 @@ def _process_bigquery():
 
 def _add_facet(es_field_name, is_time_series, parent_is_time_series,
                time_series_panel, separate_panel, facet_config,
-               time_series_vals, facets, es, mapping):
+               time_series_vals, facets, facets_time_series_vals, catalog):
     if (es_field_name in facets
             and is_time_series == facets[es_field_name]['time_series_panel']):
         # es_field_name is allowed to occur at most twice,
@@ -194,7 +337,7 @@ def _add_facet(es_field_name, is_time_series, parent_is_time_series,
         # separate facet
         raise EnvironmentError('%s appears too many times in ui.json' %
                                es_field_name)
-    field_type = elasticsearch_util.get_field_type(es_field_name, mapping)
+    field_type = elasticsearch_util.get_field_type(es_field_name, catalog)
     ui_facet_name = facet_config['ui_facet_name']
     if es_field_name.startswith('samples.'):
         ui_facet_name = '%s (samples)' % ui_facet_name
@@ -222,39 +365,39 @@ def _add_facet(es_field_name, is_time_series, parent_is_time_series,
     if 'ui_facet_description' in facet_config:
         facets[es_field_name]['description'] = facet_config[
             'ui_facet_description']
-    facets[es_field_name][
-        'es_facet'] = elasticsearch_util.get_elasticsearch_facet(
-            es, es_field_name, field_type, time_series_vals)
+    # es_facet is added in add_elasticsearch_facets(), after metrics for all numeric
+    # and text facets have been fetched together.
+    facets_time_series_vals[es_field_name] = time_series_vals
 
 
-def _process_facets(es):
-    config_path = os.path.join(app.app.config['DATASET_CONFIG_DIR'], 'ui.json')
+def _compute_facets(es, config_path):
     facets_config = _parse_json_file(config_path)['facets']
 
     # Preserve order, so facets are returned in same order as the config file.
     facets = OrderedDict()
+    # Map from Elasticsearch field name to the field's time series values.
+    facets_time_series_vals = {}
 
-    app.app.config['NESTED_PATHS'] = elasticsearch_util.get_nested_paths(es)
-
-    # Precompute mapping for getting time series values later.
-    mapping = es.indices.get_mapping(index=app.app.config['INDEX_NAME'])
+    catalog = schema_catalog.get_schema_catalog()
+    app.app.config['NESTED_PATHS'] = elasticsearch_util.get_nested_paths(
+        catalog)
 
     for facet_config in facets_config:
         es_base_field_name = facet_config['elasticsearch_field_name']
         es_parent_field_name = es_base_field_name.rsplit('.', 1)[0]
         try:
             is_time_series = elasticsearch_util.is_time_series(
-                es_base_field_name, mapping)
+                es_base_field_name, catalog)
         except KeyError:
             raise EnvironmentError(
                 'Elasticsearch field name %s in ui.json not found in index' %
                 es_base_field_name)
         parent_is_time_series = elasticsearch_util.is_time_series(
-            es_parent_field_name, mapping)
+            es_parent_field_name, catalog)
 
         if is_time_series:
             time_series_vals = elasticsearch_util.get_time_series_vals(
-                es_base_field_name, mapping)
+                es_base_field_name, catalog)
             es_field_names = [
                 es_base_field_name + '.' + tsv for tsv in time_series_vals
             ]
@@ -263,20 +406,44 @@ def _process_facets(es):
                                   and facets[es_field_name]['separate_panel'])
                 _add_facet(es_field_name, is_time_series,
                            parent_is_time_series, True, separate_panel,
-                           facet_config, time_series_vals, facets, es, mapping)
+                           facet_config, time_series_vals, facets,
+                           facets_time_series_vals, catalog)
         elif parent_is_time_series:
             time_series_vals = elasticsearch_util.get_time_series_vals(
-                es_parent_field_name, mapping)
+                es_parent_field_name, catalog)
             time_series_panel = (
                 es_base_field_name in facets
                 and facets[es_base_field_name]['time_series_panel'])
             _add_facet(es_base_field_name, is_time_series,
                        parent_is_time_series, time_series_panel, True,
-                       facet_config, time_series_vals, facets, es, mapping)
+                       facet_config, time_series_vals, facets,
+                       facets_time_series_vals, catalog)
         else:
             _add_facet(es_base_field_name, is_time_series,
                        parent_is_time_series, False, True, facet_config, [],
-                       facets, es, mapping)
+                       facets, facets_time_series_vals, catalog)
+
+    elasticsearch_util.add_elasticsearch_facets(es, facets,
+                                                facets_time_series_vals)
+    return facets
+
+
+def _process_facets(es):
+    config_path = os.path.join(app.app.config['DATASET_CONFIG_DIR'], 'ui.json')
+    snapshot_path = app.app.config['FACET_INFO_SNAPSHOT']
+    if snapshot_path:
+        start = time.time()
+        snapshot_key = facet_info_snapshot.get_snapshot_key(es, config_path)
+        facets, nested_paths = facet_info_snapshot.load(
+            snapshot_path, snapshot_key)
+        if facets is not None:
+            app.app.config['NESTED_PATHS'] = nested_paths
+            app.app.config['FACET_INFO'] = facets
+            app.app.logger.info('Loaded facet info snapshot %s in %d ms.' %
+                                (snapshot_path, (time.time() - start) * 1000))
+            return
+
+    facets = _compute_facets(es, config_path)
 
     # Map from Elasticsearch field name to dict with
     # - ui_facet_name: name to display in UI
@@ -292,6 +459,17 @@ def _process_facets(es):
     # - es_facet: Elasticsearch facet
     app.app.config['FACET_INFO'] = facets
 
+    if snapshot_path:
+        try:
+            facet_info_snapshot.save(snapshot_path, snapshot_key, facets,
+                                     app.app.config['NESTED_PATHS'])
+        except (IOError, OSError) as e:
+            # For example, the dataset config dir may be read-only. The server
+            # still works, it just won't start faster next time.
+            app.app.logger.warning(
+                'Could not write facet info snapshot %s: %s' %
+                (snapshot_path, e))
+
 
 def _process_export_url():
     """Sets config variables related to /exportUrl endpoint."""
@@ -353,7 +531,14 @@ def init():
         _process_bigquery()
         es = init_elasticsearch()
         _process_facets(es)
+        # Load the field registry before workers are forked, so they share it.
+        field_registry.get_field_registry()
+        if app.app.config['FACET_ENGINE'] == 'columnar':
+            columnar_facets.init(
+                os.path.join(app.app.config['DATASET_CONFIG_DIR'],
+                             'index.json'))
         _process_export_url()
+        facets_controller.init_landing_page()
 
         app.app.logger.info('app.app.config:')
         for key in sorted(app.app.config.keys()):
@@ -363,4 +548,7 @@ def init():
 init()
 
 if __name__ == '__main__':
+    if args.build_facet_info_snapshot:
+        # init() has written the snapshot.
+        sys.exit(0)
     app.run(host='0.0.0.0', port=args.port)
@@ -22,7 +22,6 @@ from oauth2client.service_account import ServiceAccountCredentials
 from data_explorer.models.export_url_response import ExportUrlResponse  # noqa: E501
 from data_explorer.util import elasticsearch_util
 from data_explorer.util import query_util
-from data_explorer.util.dataset_faceted_search import DatasetFacetedSearch
 
 # Save in Terra flow
 # - User clicks export button on bottom right of Data Explorer
@@ -1,15 +1,47 @@
+import itertools
 import pprint
+import threading
 
+import numpy as np
+
+from cachetools import LRUCache
 from collections import OrderedDict
-from elasticsearch import Elasticsearch
 from elasticsearch_dsl import HistogramFacet
 from flask import current_app
+from flask import json
+from werkzeug.exceptions import BadRequest
 
+from data_explorer.models.count_response import CountResponse
 from data_explorer.models.facet import Facet
+from data_explorer.models.facet_values_response import FacetValuesResponse
 from data_explorer.models.facets_response import FacetsResponse
+from data_explorer.util import dataset_faceted_search
 from data_explorer.util import elasticsearch_util
+from data_explorer.util import field_registry
+from data_explorer.util import index_generation
+from data_explorer.util import schema_catalog
 from data_explorer.util import query_util
-from data_explorer.util.dataset_faceted_search import DatasetFacetedSearch
+from data_explorer.util import response_cache
+from data_explorer.util import single_flight
+
+# Extra facet infos, keyed by (es_field_name, index generation). Building an
+# extra facet info takes Elasticsearch requests for the description and, for
+# numeric fields, the histogram interval. Cache them so a facet a user added is
+# only built once, rather than on every /facets request.
+_EXTRA_FACET_CACHE_SIZE = 1000
+_extra_facet_cache = LRUCache(maxsize=_EXTRA_FACET_CACHE_SIZE)
+_extra_facet_cache_lock = threading.Lock()
+
+# Coalesces concurrent /facets requests that miss the response cache.
+_facets_single_flight = single_flight.SingleFlight()
+
+# (index generation, serialized /facets response) for the landing page: no
+# filters and no extra facets. Every UI session starts with this request. It is
+# computed in init_landing_page() and recomputed in the background when the
+# index generation changes.
+_landing_page = None
+_landing_page_refreshing = False
+_landing_page_lock = threading.Lock()
 
 
 def _get_bucket_interval(facet):
@@ -20,9 +52,9 @@ def _get_bucket_interval(facet):
 
 
 def _add_facet(es_field_name, is_time_series, parent_is_time_series,
-               time_series_panel, separate_panel, time_series_vals, facets, es,
-               mapping):
-    field_type = elasticsearch_util.get_field_type(es_field_name, mapping)
+               time_series_panel, separate_panel, time_series_vals, facets,
+               facets_time_series_vals, catalog):
+    field_type = elasticsearch_util.get_field_type(es_field_name, catalog)
     name_arr = es_field_name.split('.')
     if is_time_series or parent_is_time_series:
         # If parent_is_time_series, then time_series_field will be True, so
@@ -48,18 +80,55 @@ def _add_facet(es_field_name, is_time_series, parent_is_time_series,
         'separate_panel': separate_panel,
         'time_series_field': is_time_series or parent_is_time_series
     }
-    if is_time_series or parent_is_time_series:
-        facets[es_field_name][
-            'description'] = elasticsearch_util.get_field_description(
-                es,
-                es_field_name.rsplit('.', 1)[0])
-    else:
-        facets[es_field_name][
-            'description'] = elasticsearch_util.get_field_description(
-                es, es_field_name)
-    facets[es_field_name][
-        'es_facet'] = elasticsearch_util.get_elasticsearch_facet(
-            es, es_field_name, field_type, time_series_vals)
+    # description is added in _add_descriptions(), es_facet is added in
+    # add_elasticsearch_facets().
+    facets_time_series_vals[es_field_name] = time_series_vals
+
+
+def _get_description_field_name(es_field_name, facet):
+    if facet['time_series_field']:
+        # The fields index only has the field without the time.
+        return es_field_name.rsplit('.', 1)[0]
+    return es_field_name
+
+
+def _add_descriptions(facets):
+    descriptions = field_registry.get_field_descriptions([
+        _get_description_field_name(es_field_name, facet)
+        for es_field_name, facet in facets.items()
+    ])
+    for es_field_name, facet in facets.items():
+        facet['description'] = descriptions[_get_description_field_name(
+            es_field_name, facet)]
+
+
+def _add_descriptions_and_es_facets(es, facets, facets_time_series_vals,
+                                    generation):
+    """Sets description and es_facet for every facet in facets.
+
+    These only depend on es_field_name and the index, so they are taken from
+    _extra_facet_cache when possible. time_series_panel and separate_panel
+    depend on which other extra facets were requested, so they are never taken
+    from the cache.
+    """
+    uncached_facets = OrderedDict()
+    with _extra_facet_cache_lock:
+        for es_field_name, facet in facets.items():
+            cached_facet = _extra_facet_cache.get((es_field_name, generation))
+            if cached_facet is None:
+                uncached_facets[es_field_name] = facet
+            else:
+                facet['description'] = cached_facet['description']
+                facet['es_facet'] = cached_facet['es_facet']
+    if not uncached_facets:
+        return
+
+    _add_descriptions(uncached_facets)
+    elasticsearch_util.add_elasticsearch_facets(es, uncached_facets,
+                                                facets_time_series_vals)
+    with _extra_facet_cache_lock:
+        for es_field_name, facet in uncached_facets.items():
+            _extra_facet_cache[(es_field_name, generation)] = dict(facet)
 
 
 def _process_extra_facets(es, extra_facets):
@@ -78,22 +147,24 @@ def _process_extra_facets(es, extra_facets):
         return {}, None
 
     extra_facets_dict = OrderedDict()
-    mapping = es.indices.get_mapping(index=current_app.config['INDEX_NAME'])
+    facets_time_series_vals = {}
+    catalog = schema_catalog.get_schema_catalog()
+    registry = field_registry.get_field_registry()
     invalid_extra_facets = []
 
     for es_base_field_name in extra_facets:
-        if not elasticsearch_util.field_exists(es, es_base_field_name):
+        if not elasticsearch_util.field_exists(es_base_field_name, registry):
             invalid_extra_facets.append(es_base_field_name)
             continue
 
         es_parent_field_name = es_base_field_name.rsplit('.', 1)[0]
         is_time_series = elasticsearch_util.is_time_series(
-            es_base_field_name, mapping)
+            es_base_field_name, catalog)
         parent_is_time_series = elasticsearch_util.is_time_series(
-            es_parent_field_name, mapping)
+            es_parent_field_name, catalog)
         if is_time_series:
             time_series_vals = elasticsearch_util.get_time_series_vals(
-                es_base_field_name, mapping)
+                es_base_field_name, catalog)
             es_field_names = [
                 es_base_field_name + '.' + tsv for tsv in time_series_vals
             ]
@@ -103,21 +174,26 @@ def _process_extra_facets(es, extra_facets):
                     and extra_facets_dict[es_field_name]['separate_panel'])
                 _add_facet(es_field_name, is_time_series,
                            parent_is_time_series, True, separate_panel,
-                           time_series_vals, extra_facets_dict, es, mapping)
+                           time_series_vals, extra_facets_dict,
+                           facets_time_series_vals, catalog)
         elif parent_is_time_series:
             time_series_vals = elasticsearch_util.get_time_series_vals(
-                es_parent_field_name, mapping)
+                es_parent_field_name, catalog)
             time_series_panel = (
                 es_base_field_name in extra_facets_dict
                 and extra_facets_dict[es_base_field_name]['time_series_panel'])
             _add_facet(es_base_field_name, is_time_series,
                        parent_is_time_series, time_series_panel, True,
-                       time_series_vals, extra_facets_dict, es, mapping)
+                       time_series_vals, extra_facets_dict,
+                       facets_time_series_vals, catalog)
         else:
             _add_facet(es_base_field_name, is_time_series,
                        parent_is_time_series, False, True, [],
-                       extra_facets_dict, es, mapping)
+                       extra_facets_dict, facets_time_series_vals, catalog)
 
+    _add_descriptions_and_es_facets(es, extra_facets_dict,
+                                    facets_time_series_vals,
+                                    catalog.generation)
     return extra_facets_dict, invalid_extra_facets
 
 
@@ -125,45 +201,122 @@ def _get_time_name(tsv):
     return tsv.replace('_', '.')
 
 
-def _get_time_series_params(ts_value_names, ts_values):
-    """_get_time_series_params
-    Converts data in ts_value_names and ts_values into the value_names
-    and time_series_value_counts properties of the Facet API.
+def _get_time_series_cells(ts_values, sort_by_count):
+    """Returns value names and the cells of time series facet counts.
 
-    ts_value_names is a dictionary mapping value names (such as True
-    or '10-19') to numbers by which to sort the value names in the
-    array final value_names array.
+    Cells are parallel arrays of rows, value name indexes and counts, for
+    every value name and count in ts_values. See _get_time_series_params() for
+    the format of ts_values, and how value names and rows are ordered.
+
+    Returns:
+      value_names, row_count, rows, columns, counts.
+    """
+    all_names = list(
+        itertools.chain.from_iterable(cur_value_names
+                                      for cur_value_names, _ in ts_values))
+    all_counts = list(
+        itertools.chain.from_iterable(cur_value_counts
+                                      for _, cur_value_counts in ts_values))
+    counts = np.fromiter(all_counts, dtype=np.int64, count=len(all_counts))
+    # Index of each distinct value name, in order of first appearance.
+    name_indexes = dict.fromkeys(all_names)
+    names = list(name_indexes.keys())
+    for i, name in enumerate(names):
+        name_indexes[name] = i
+    codes = np.fromiter(map(name_indexes.__getitem__, all_names),
+                        dtype=np.int64,
+                        count=len(all_names))
+    # Row of the counts of each time, or -1 if they are all 0.
+    is_nonzero_row = np.array(
+        [any(cur_value_counts) for _, cur_value_counts in ts_values],
+        dtype=bool)
+    row_indexes = np.where(is_nonzero_row, np.cumsum(is_nonzero_row) - 1, -1)
+    row_count = int(is_nonzero_row.sum())
+    rows = np.repeat(
+        row_indexes,
+        [len(cur_value_counts) for _, cur_value_counts in ts_values])
+
+    if sort_by_count:
+        # Counts are well below 2**53, so float weights are exact.
+        sort_keys = -np.bincount(codes, weights=counts,
+                                 minlength=len(names)).astype(np.int64)
+    else:
+        sort_keys = np.array(
+            [elasticsearch_util.range_to_number(name) for name in names],
+            dtype=np.float64)
+    name_ranks = np.empty(len(names), dtype=np.int64)
+    name_ranks[sorted(range(len(names)),
+                      key=lambda i: names[i])] = np.arange(len(names))
+    order = np.lexsort((name_ranks, sort_keys))
+    columns = np.empty(len(names), dtype=np.int64)
+    columns[order] = np.arange(len(names))
+
+    is_in_row = rows >= 0
+    return ([names[i] for i in order], row_count, rows[is_in_row],
+            columns[codes[is_in_row]], counts[is_in_row])
+
+
+def _get_time_series_params(ts_values, sort_by_count):
+    """_get_time_series_params
+    Converts data in ts_values into the value_names and
+    time_series_value_counts properties of the Facet API.
 
     ts_values contains a time-indexed array of pairs of arrays giving
     value names and counts, and is converted into the 2-dimensional
-    array time_series_value_counts.
+    array time_series_value_counts. Times whose counts are all 0 get no
+    row, but their value names are included.
+
+    If sort_by_count, value names are sorted by total count over all
+    times, highest first. Otherwise they are sorted by number, for
+    histogram ranges such as '10-19'. Ties are sorted by name.
 
     Sample input:
-    ts_value_names = {True: -5, False: -7}
     ts_values = [[[True, False], [4, 5]],
                  [[True, False], [1, 0]],
                  [[True, False], [0, 2]]]
+    sort_by_count = True
     Sample output:
     value_names = [False, True]
     value_counts = [[5, 4],
                     [0, 1],
                     [2, 0]]
     """
-    srt = sorted([(ts_value_names[i], i) for i in ts_value_names])
-    value_names = [interval for value, interval in srt]
-    for i in range(len(srt)):
-        value, interval = srt[i]
-        ts_value_names[interval] = i
-    time_series_value_counts = []
-    for entry in ts_values:
-        cur_value_names = entry[0]
-        cur_value_counts = entry[1]
-        entry_array = [0 for name in value_names]
-        for i in range(len(cur_value_names)):
-            entry_array[ts_value_names[
-                cur_value_names[i]]] = cur_value_counts[i]
-        time_series_value_counts.append(entry_array)
-    return value_names, time_series_value_counts
+    value_names, row_count, rows, columns, counts = _get_time_series_cells(
+        ts_values, sort_by_count)
+    matrix = np.zeros((row_count, len(value_names)), dtype=np.int64)
+    matrix[rows, columns] = counts
+    return value_names, matrix.tolist()
+
+
+def _get_sparse_time_series_params(ts_values, sort_by_count):
+    """Like _get_time_series_params(), but only returns non-zero counts.
+
+    Returns value_names, time_series_value_indexes and
+    time_series_value_counts. Row i of time_series_value_counts has the
+    non-zero counts of time i, for the value_names indexes in row i of
+    time_series_value_indexes. For the sample input of
+    _get_time_series_params(), the output is:
+    value_names = [False, True]
+    value_indexes = [[0, 1],
+                     [1],
+                     [0]]
+    value_counts = [[5, 4],
+                    [1],
+                    [2]]
+    """
+    value_names, row_count, rows, columns, counts = _get_time_series_cells(
+        ts_values, sort_by_count)
+    is_nonzero = counts != 0
+    rows = rows[is_nonzero]
+    columns = columns[is_nonzero]
+    counts = counts[is_nonzero]
+    order = np.lexsort((columns, rows))
+    row_starts = np.searchsorted(rows[order], np.arange(row_count + 1))
+    columns = columns[order].tolist()
+    counts = counts[order].tolist()
+    bounds = list(zip(row_starts[:-1].tolist(), row_starts[1:].tolist()))
+    return (value_names, [columns[start:end] for start, end in bounds],
+            [counts[start:end] for start, end in bounds])
 
 
 def _get_facet_values(es_field_name, facet_info, es_response_facets):
@@ -192,7 +345,8 @@ def _get_facet_values(es_field_name, facet_info, es_response_facets):
     return value_names, value_counts
 
 
-def _get_time_series_facet(time_series_facets, es_response_facets):
+def _get_time_series_facet(time_series_facets, es_response_facets,
+                           time_series_encoding):
     assert len(time_series_facets) > 0
     es_field_name, facet_info = time_series_facets[0]
     # Initialize variables that are same over all of time_series_facets
@@ -202,35 +356,25 @@ def _get_time_series_facet(time_series_facets, es_response_facets):
     ts_field_type = facet_info.get('type')
 
     ts_time_names = []
-    ts_value_names = {}
     ts_values = []
     for es_field_name, facet_info in time_series_facets:
         value_names, value_counts = _get_facet_values(es_field_name,
                                                       facet_info,
                                                       es_response_facets)
-
-        for i in range(len(value_names)):
-            # Update ts_value_names to store ordering information for
-            # the value names (want to sort by name if the name is
-            # numeric, or by count if it is text/boolean).
-            if facet_info.get('type') == 'text' or facet_info.get(
-                    'type') == 'boolean':
-                if value_names[i] in ts_value_names:
-                    # Subtract to show highest count first.
-                    ts_value_names[value_names[i]] -= value_counts[i]
-                else:
-                    ts_value_names[value_names[i]] = -value_counts[i]
-            else:
-                ts_value_names[
-                    value_names[i]] = elasticsearch_util.range_to_number(
-                        value_names[i])
-
         if not all(count == 0 for count in value_counts):
             ts_time_names.append(_get_time_name(es_field_name.split('.')[-1]))
-            ts_values.append([value_names, value_counts])
-
-    value_names, time_series_value_counts = _get_time_series_params(
-        ts_value_names, ts_values)
+        ts_values.append([value_names, value_counts])
+
+    # Sort value names by name if the name is numeric, or by count if it is
+    # text/boolean.
+    sort_by_count = ts_field_type == 'text' or ts_field_type == 'boolean'
+    if time_series_encoding == 'sparse':
+        value_names, time_series_value_indexes, time_series_value_counts = (
+            _get_sparse_time_series_params(ts_values, sort_by_count))
+    else:
+        value_names, time_series_value_counts = _get_time_series_params(
+            ts_values, sort_by_count)
+        time_series_value_indexes = None
     return Facet(name=ts_ui_name,
                  description=ts_description,
                  es_field_name=ts_field_name,
@@ -238,10 +382,14 @@ def _get_time_series_facet(time_series_facets, es_response_facets):
                  value_names=value_names,
                  value_counts=[],
                  time_names=ts_time_names,
-                 time_series_value_counts=time_series_value_counts)
+                 time_series_value_counts=time_series_value_counts,
+                 time_series_value_indexes=time_series_value_indexes)
 
 
-def _get_histogram_facet(es_field_name, facet_info, es_response_facets):
+def _get_histogram_facet(es_field_name,
+                         facet_info,
+                         es_response_facets,
+                         es_response_errors=None):
     name = facet_info.get('ui_facet_name')
     if facet_info.get('time_series_field'):
         tsv = _get_time_name(es_field_name.split('.')[-1])
@@ -262,11 +410,17 @@ def _get_histogram_facet(es_field_name, facet_info, es_response_facets):
                  es_field_type=facet_info.get('type'),
                  value_names=value_names,
                  value_counts=value_counts,
+                 value_count_errors=(es_response_errors[es_field_name] if
+                                     es_response_errors is not None else None),
                  time_names=[],
                  time_series_value_counts=[])
 
 
-def facets_get(filter=None, extraFacets=None):  # noqa: E501
+def facets_get(filter=None,
+               extraFacets=None,
+               timeSeriesEncoding='dense',
+               approximate=False,
+               fields=None):  # noqa: E501
     """facets_get
     Returns facets. # noqa: E501
     :param filter: filter represents selected facet values. Elasticsearch query
@@ -276,9 +430,23 @@ def facets_get(filter=None, extraFacets=None):  # noqa: E501
     :type filter: List[str]
     :param extraFacets: extra_facets represents the additional facets selected by the user from the UI.
     :type extraFacets: List[str]
+    :param timeSeriesEncoding: How time series facet counts are returned, dense or sparse.
+    :type timeSeriesEncoding: str
+    :param approximate: If true, facet counts may be estimated from a sample of documents.
+    :type approximate: bool
+    :param fields: If set, only facets with these es_field_names are returned.
+    :type fields: List[str]
     :rtype: FacetsResponse
     """
-    es = Elasticsearch(current_app.config['ELASTICSEARCH_URL'])
+    # The precomputed landing page is dense. Its counts are exact, which is
+    # also fine for approximate requests.
+    if (_is_empty(filter) and _is_empty(extraFacets) and _is_empty(fields)
+            and timeSeriesEncoding == 'dense'):
+        body = _get_landing_page()
+        if body is not None:
+            return _get_json_response(body, {'X-Cache': 'precomputed'})
+
+    es = elasticsearch_util.get_elasticsearch()
     extra_facets_dict, invalid_extra_facets = _process_extra_facets(
         es, extraFacets)
     combined_facets = (list(extra_facets_dict.items()) +
@@ -286,52 +454,352 @@ def facets_get(filter=None, extraFacets=None):  # noqa: E501
     combined_facets_dict = OrderedDict(combined_facets)
 
     filter_dict, invalid_filter_facets = elasticsearch_util.get_facet_value_dict(
-        es, filter, combined_facets_dict)
-    search = DatasetFacetedSearch(filter_dict, combined_facets_dict)
-    # Uncomment to print Elasticsearch request python object
-    # current_app.logger.info(
-    #     'Elasticsearch request: %s' % pprint.pformat(search.build_search().to_dict()))
-    es_response = search.execute()
-    es_response_facets = es_response.facets.to_dict()
+        field_registry.get_field_registry(), filter, combined_facets_dict)
+
+    cache = response_cache.get_facets_cache()
+    generation = index_generation.get_index_generation()
+    selected_fields = None if _is_empty(fields) else set(fields)
+    cache_key = _get_cache_key(filter_dict, invalid_filter_facets, extraFacets,
+                               timeSeriesEncoding, approximate,
+                               selected_fields)
+    body = cache.get(cache_key, generation)
+    if body is None:
+
+        def get_body():
+            response = _get_facets_response(filter_dict, invalid_filter_facets,
+                                            extra_facets_dict,
+                                            invalid_extra_facets,
+                                            combined_facets,
+                                            timeSeriesEncoding, approximate,
+                                            selected_fields)
+            body = json.dumps(response).encode('utf-8')
+            cache.put(cache_key, generation, body)
+            return body
+
+        # Identical requests that miss the cache at the same time share one
+        # Elasticsearch search.
+        body, coalesced = _facets_single_flight.do((cache_key, generation),
+                                                   get_body)
+        cache_status = 'coalesced' if coalesced else 'miss'
+    else:
+        cache_status = 'hit'
+    stats = cache.get_stats()
+    single_flight_stats = _facets_single_flight.get_stats()
+    return _get_json_response(
+        body, {
+            'X-Cache':
+            cache_status,
+            'X-Cache-Stats':
+            'hits=%d, misses=%d, entries=%d, bytes=%d' %
+            (stats['hits'], stats['misses'], stats['entries'], stats['bytes']),
+            'X-Single-Flight-Stats':
+            'executions=%d, coalesced=%d' % (single_flight_stats['executions'],
+                                             single_flight_stats['coalesced'])
+        })
+
+
+def facet_values_get(esFieldName,
+                     filter=None,
+                     extraFacets=None,
+                     after=None,
+                     pageSize=100):  # noqa: E501
+    """facet_values_get
+    Returns a page of the values of a text facet, in value order. # noqa: E501
+    :param esFieldName: The Elasticsearch field name of the facet.
+    :type esFieldName: str
+    :param filter: Same as the /facets filter parameter.
+    :type filter: List[str]
+    :param extraFacets: Same as the /facets extraFacets parameter.
+    :type extraFacets: List[str]
+    :param after: after from the previous page's response.
+    :type after: str
+    :param pageSize: Maximum number of values to return.
+    :type pageSize: int
+    :rtype: FacetValuesResponse
+    """
+    extra_facets = [] if _is_empty(extraFacets) else list(extraFacets)
+    if (esFieldName not in current_app.config['FACET_INFO']
+            and esFieldName not in extra_facets):
+        extra_facets.append(esFieldName)
+    extra_facets_dict, _ = _process_extra_facets(
+        elasticsearch_util.get_elasticsearch(), extra_facets)
+    combined_facets_dict = OrderedDict(
+        list(extra_facets_dict.items()) +
+        list(current_app.config['FACET_INFO'].items()))
+    if esFieldName not in combined_facets_dict:
+        raise BadRequest('%s is not in the index.' % esFieldName)
+    if combined_facets_dict[esFieldName]['type'] != 'text':
+        raise BadRequest('%s is not a text field.' % esFieldName)
+
+    filter_dict, _ = elasticsearch_util.get_facet_value_dict(
+        field_registry.get_field_registry(), filter, combined_facets_dict)
+    try:
+        values, next_after = dataset_faceted_search.get_terms_page(
+            filter_dict, combined_facets_dict, esFieldName, after, pageSize)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    return FacetValuesResponse(es_field_name=esFieldName,
+                               value_names=[value for value, _ in values],
+                               value_counts=[count for _, count in values],
+                               after=next_after)
+
+
+def count_get(filter=None, extraFacets=None):  # noqa: E501
+    """count_get
+    Returns the number of entities matching filter. # noqa: E501
+    :param filter: Same as the /facets filter parameter.
+    :type filter: List[str]
+    :param extraFacets: Same as the /facets extraFacets parameter.
+    :type extraFacets: List[str]
+    :rtype: CountResponse
+    """
+    es = elasticsearch_util.get_elasticsearch()
+    extra_facets_dict, _ = _process_extra_facets(es, extraFacets)
+    combined_facets_dict = OrderedDict(
+        list(extra_facets_dict.items()) +
+        list(current_app.config['FACET_INFO'].items()))
+    filter_dict, invalid_filter_facets = elasticsearch_util.get_facet_value_dict(
+        field_registry.get_field_registry(), filter, combined_facets_dict)
+
+    cache = response_cache.get_count_cache()
+    generation = index_generation.get_index_generation()
+    # Extra facets don't change the count, so aren't part of the key.
+    cache_key = _get_filters_key(filter_dict, invalid_filter_facets)
+    body = cache.get(cache_key, generation)
+    if body is None:
+        count = dataset_faceted_search.execute_count(filter_dict,
+                                                     combined_facets_dict)
+        body = json.dumps(
+            CountResponse(count=count,
+                          invalid_filter_facets=sorted(
+                              set(invalid_filter_facets)))).encode('utf-8')
+        cache.put(cache_key, generation, body)
+        cache_status = 'miss'
+    else:
+        cache_status = 'hit'
+    return _get_json_response(body, {'X-Cache': cache_status})
+
+
+def _is_empty(param):
+    return not param or param == ['']
+
+
+def _get_json_response(body, headers):
+    return current_app.response_class(body,
+                                      mimetype='application/json',
+                                      headers=headers)
+
+
+def _compute_landing_page():
+    generation = index_generation.get_index_generation()
+    response = _get_facets_response(
+        {}, [], OrderedDict(), None,
+        list(current_app.config['FACET_INFO'].items()), 'dense', False, None)
+    return generation, json.dumps(response).encode('utf-8')
+
+
+def init_landing_page():
+    """Computes the landing page /facets response.
+
+    Called from init(), so with gunicorn preload the response is computed once
+    and shared by all workers.
+    """
+    global _landing_page
+    landing_page = _compute_landing_page()
+    with _landing_page_lock:
+        _landing_page = landing_page
+
+
+def _refresh_landing_page(app):
+    global _landing_page, _landing_page_refreshing
+    with app.app_context():
+        try:
+            landing_page = _compute_landing_page()
+            with _landing_page_lock:
+                _landing_page = landing_page
+            app.logger.info('Refreshed landing page facets.')
+        except Exception:
+            app.logger.exception('Could not refresh landing page facets.')
+        finally:
+            with _landing_page_lock:
+                _landing_page_refreshing = False
+
+
+def _get_landing_page():
+    """Returns the serialized landing page response.
+
+    Returns None if the index has changed since the response was computed, and
+    starts recomputing it in a background thread. Until that finishes,
+    requests are served as if there was no precomputed response.
+    """
+    global _landing_page_refreshing
+    generation = index_generation.get_index_generation()
+    with _landing_page_lock:
+        if _landing_page is not None and _landing_page[0] == generation:
+            return _landing_page[1]
+        if not _landing_page_refreshing:
+            _landing_page_refreshing = True
+            # Threads don't survive fork, so start one on demand in the
+            # worker rather than in init().
+            threading.Thread(target=_refresh_landing_page,
+                             args=(current_app._get_current_object(), ),
+                             daemon=True).start()
+        return None
+
+
+def _get_filters_key(filter_dict, invalid_filter_facets):
+    """Returns a key for filters, for response caches.
+
+    filter_dict has already been unquoted and had histogram ranges parsed, so
+    equivalent filters in any order give the same key.
+    """
+    filters = tuple((es_field_name, tuple(sorted(set(values), key=str)))
+                    for es_field_name, values in sorted(filter_dict.items()))
+    return filters, tuple(sorted(set(invalid_filter_facets)))
+
+
+def _get_canonical_filter(filter_dict, facets):
+    """Returns filter params equivalent to filter_dict, in a canonical order.
+
+    Responses are cached by _get_filters_key(), so anything in a response that
+    is built from filters is built from these, not from the request's filter
+    param. Otherwise a cached response would show the order and duplicates of
+    whichever request computed it.
+    """
+    canonical_filter = []
+    for es_field_name, values in sorted(filter_dict.items()):
+        es_facet = facets[es_field_name]['es_facet']
+        for value in sorted(set(values), key=str):
+            if elasticsearch_util.is_histogram_facet(es_facet):
+                value = elasticsearch_util.number_to_range(
+                    value, _get_bucket_interval(es_facet))
+            canonical_filter.append('%s=%s' % (es_field_name, value))
+    return canonical_filter
+
+
+def _get_cache_key(filter_dict, invalid_filter_facets, extra_facets,
+                   time_series_encoding, approximate, selected_fields):
+    """Returns a key for the /facets response cache.
+
+    extra_facets order is kept, since it determines facet order in the
+    response. selected_fields order doesn't matter.
+    """
+    return (_get_filters_key(filter_dict,
+                             invalid_filter_facets), tuple(extra_facets or []),
+            time_series_encoding, approximate, tuple(sorted(selected_fields))
+            if selected_fields is not None else None)
+
+
+def _get_time_series_field_name(es_field_name):
+    """Returns the es_field_name of the time series facet of a time series
+    panel."""
+    return '.'.join(es_field_name.split('.')[:-1])
+
+
+def _get_aggregated_facet_names(combined_facets, selected_fields):
+    """Returns the names of the facets whose values are needed for the facets
+    in selected_fields.
+
+    A time series facet needs the values of all its time series panels.
+    """
+    if selected_fields is None:
+        return None
+    return [
+        es_field_name for es_field_name, facet_info in combined_facets
+        if es_field_name in selected_fields or (
+            facet_info.get('time_series_panel')
+            and _get_time_series_field_name(es_field_name) in selected_fields)
+    ]
+
+
+def _get_invalid_fields(combined_facets, selected_fields):
+    """Returns the names in selected_fields that aren't facets or time series
+    facets, sorted so cached responses don't depend on the fields order."""
+    if selected_fields is None:
+        return None
+    field_names = set()
+    for es_field_name, facet_info in combined_facets:
+        field_names.add(es_field_name)
+        if facet_info.get('time_series_panel'):
+            field_names.add(_get_time_series_field_name(es_field_name))
+    return sorted(selected_fields - field_names)
+
+
+def _get_facets_response(filter_dict, invalid_filter_facets, extra_facets_dict,
+                         invalid_extra_facets, combined_facets,
+                         time_series_encoding, approximate, selected_fields):
+    """Returns the /facets response.
+
+    If selected_fields is set, only facets whose es_field_name is in it are
+    aggregated and returned. Filters still apply to all facets. Names in
+    selected_fields that aren't facets are returned in invalid_fields.
+    """
+    sql_query = query_util.get_sql_query(
+        _get_canonical_filter(filter_dict, OrderedDict(combined_facets)),
+        extra_facets_dict)
+    invalid_fields = _get_invalid_fields(combined_facets, selected_fields)
+    aggregated_facet_names = _get_aggregated_facet_names(
+        combined_facets, selected_fields)
+    if approximate:
+        es_response_facets, count, es_response_errors = (
+            dataset_faceted_search.execute_approximate_facets_search(
+                filter_dict, OrderedDict(combined_facets),
+                aggregated_facet_names))
+    else:
+        es_response_facets, count = dataset_faceted_search.execute_facets_search(
+            filter_dict, OrderedDict(combined_facets), aggregated_facet_names)
+        es_response_errors = None
     # Uncomment to print Elasticsearch response python object
     # current_app.logger.info(
     #     'Elasticsearch response: %s' % pprint.pformat(es_response_facets))
 
+    if aggregated_facet_names is not None:
+        aggregated_facet_names = set(aggregated_facet_names)
+        combined_facets = [(es_field_name, facet_info)
+                           for es_field_name, facet_info in combined_facets
+                           if es_field_name in aggregated_facet_names]
+
     facets = []
     i = 0
     while i < len(combined_facets):
         es_field_name, facet_info = combined_facets[i]
         if facet_info.get('time_series_panel'):
-            ts_field_name = '.'.join(es_field_name.split('.')[:-1])
+            ts_field_name = _get_time_series_field_name(es_field_name)
             start = i
             while i < len(combined_facets):
                 next_es_field_name, next_facet_info = combined_facets[i]
-                next_ts_field_name = '.'.join(
-                    next_es_field_name.split('.')[:-1])
+                next_ts_field_name = _get_time_series_field_name(
+                    next_es_field_name)
                 if (next_facet_info.get('time_series_panel')
                         and next_ts_field_name == ts_field_name):
-                    if next_facet_info.get('separate_panel'):
+                    if next_facet_info.get('separate_panel') and (
+                            selected_fields is None
+                            or next_es_field_name in selected_fields):
                         facets.append(
                             _get_histogram_facet(next_es_field_name,
                                                  next_facet_info,
-                                                 es_response_facets))
+                                                 es_response_facets,
+                                                 es_response_errors))
                     i += 1
                 else:
                     break
-            facets.append(
-                _get_time_series_facet(combined_facets[start:i],
-                                       es_response_facets))
+            if selected_fields is None or ts_field_name in selected_fields:
+                facets.append(
+                    _get_time_series_facet(combined_facets[start:i],
+                                           es_response_facets,
+                                           time_series_encoding))
         else:
             assert facet_info.get('separate_panel', True)
             i += 1
             facets.append(
                 _get_histogram_facet(es_field_name, facet_info,
-                                     es_response_facets))
-
-    sql_query = query_util.get_sql_query(filter, extra_facets_dict)
-
-    return FacetsResponse(facets=facets,
-                          count=es_response._faceted_search.count(),
-                          invalid_filter_facets=invalid_filter_facets,
-                          invalid_extra_facets=invalid_extra_facets,
-                          sql_query=sql_query)
+                                     es_response_facets, es_response_errors))
+
+    return FacetsResponse(
+        facets=facets,
+        count=count,
+        invalid_filter_facets=sorted(set(invalid_filter_facets)),
+        invalid_extra_facets=invalid_extra_facets,
+        sql_query=sql_query,
+        approximate=True if es_response_errors is not None else None,
+        invalid_fields=invalid_fields or None)
@@ -4,14 +4,17 @@ import time
 from data_explorer.models.search_result import SearchResult
 from data_explorer.models.search_response import SearchResponse
 from data_explorer.util import elasticsearch_util
+from data_explorer.util import schema_catalog
+from data_explorer.util import single_flight
 
 from flask import current_app
-from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MultiMatch
 
+_search_single_flight = single_flight.SingleFlight()
 
-def _results_from_fields_index(fields, mapping):
+
+def _results_from_fields_index(fields, catalog):
     results = []
     for field in fields['hits']['hits']:
         es_base_field_name = field["_id"]
@@ -22,9 +25,9 @@ def _results_from_fields_index(fields, mapping):
                              elasticsearch_field_name=es_base_field_name,
                              facet_value="",
                              is_time_series=False))
-            if elasticsearch_util.is_time_series(es_base_field_name, mapping):
+            if elasticsearch_util.is_time_series(es_base_field_name, catalog):
                 time_series_vals = elasticsearch_util.get_time_series_vals(
-                    es_base_field_name, mapping)
+                    es_base_field_name, catalog)
                 for tsv in time_series_vals:
                     results.append(
                         SearchResult(
@@ -40,9 +43,9 @@ def _results_from_fields_index(fields, mapping):
                              elasticsearch_field_name=es_base_field_name,
                              facet_value="",
                              is_time_series=False))
-            if elasticsearch_util.is_time_series(es_base_field_name, mapping):
+            if elasticsearch_util.is_time_series(es_base_field_name, catalog):
                 time_series_vals = elasticsearch_util.get_time_series_vals(
-                    es_base_field_name, mapping)
+                    es_base_field_name, catalog)
                 for tsv in time_series_vals:
                     results.append(
                         SearchResult(
@@ -115,9 +118,24 @@ def search_get(query=None):
 
     rtype: SearchResponse
     """
+    catalog = schema_catalog.get_schema_catalog()
+    # Identical concurrent searches, such as the initial search box drop-down
+    # for many users loading the page at once, share one set of Elasticsearch
+    # searches.
+    response, coalesced = _search_single_flight.do(
+        (query or '', catalog.generation), lambda: _search(query, catalog))
+    stats = _search_single_flight.get_stats()
+    return response, 200, {
+        'X-Coalesced':
+        str(coalesced).lower(),
+        'X-Single-Flight-Stats':
+        'executions=%d, coalesced=%d' %
+        (stats['executions'], stats['coalesced'])
+    }
+
 
-    es = Elasticsearch(current_app.config['ELASTICSEARCH_URL'])
-    mapping = es.indices.get_mapping(index=current_app.config['INDEX_NAME'])
+def _search(query, catalog):
+    es = elasticsearch_util.get_elasticsearch()
     search_results = []
 
     # The number of results that Elasticsearch returns from search queries to
@@ -139,7 +157,7 @@ def search_get(query=None):
                 'name.keyword')[0:num_field_search_results]
         fields_search_response = fields_search.execute()
         fields = fields_search_response.to_dict()
-        search_results.extend(_results_from_fields_index(fields, mapping))
+        search_results.extend(_results_from_fields_index(fields, catalog))
     else:
         # Return only fields matching query.
 
@@ -154,7 +172,7 @@ def search_get(query=None):
                 multi_match)[0:num_field_search_results]
         fields_search_response = fields_search.execute()
         fields = fields_search_response.to_dict()
-        search_results.extend(_results_from_fields_index(fields, mapping))
+        search_results.extend(_results_from_fields_index(fields, catalog))
 
         # Part 2: Search main index. For the BigQuery indexer, this searches
         # BigQuery column values.
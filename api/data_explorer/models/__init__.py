@@ -3,10 +3,12 @@
 # flake8: noqa
 from __future__ import absolute_import
 # import models into model package
+from data_explorer.models.count_response import CountResponse
 from data_explorer.models.dataset_response import DatasetResponse
 from data_explorer.models.export_url_request import ExportUrlRequest
 from data_explorer.models.export_url_response import ExportUrlResponse
 from data_explorer.models.facet import Facet
+from data_explorer.models.facet_values_response import FacetValuesResponse
 from data_explorer.models.facets_response import FacetsResponse
 from data_explorer.models.search_response import SearchResponse
 from data_explorer.models.search_result import SearchResult
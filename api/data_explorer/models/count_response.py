@@ -0,0 +1,90 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from datetime import date, datetime  # noqa: F401
+
+from typing import List, Dict  # noqa: F401
+
+from data_explorer.models.base_model_ import Model
+from data_explorer import util
+
+
+class CountResponse(Model):
+    """NOTE: This class is auto generated by the swagger code generator program.
+
+    Do not edit the class manually.
+    """
+    def __init__(self, count=None, invalid_filter_facets=None):  # noqa: E501
+        """CountResponse - a model defined in Swagger
+
+        :param count: The count of this CountResponse.  # noqa: E501
+        :type count: int
+        :param invalid_filter_facets: The invalid_filter_facets of this CountResponse.  # noqa: E501
+        :type invalid_filter_facets: List[str]
+        """
+        self.swagger_types = {'count': int, 'invalid_filter_facets': List[str]}
+
+        self.attribute_map = {
+            'count': 'count',
+            'invalid_filter_facets': 'invalid_filter_facets'
+        }
+
+        self._count = count
+        self._invalid_filter_facets = invalid_filter_facets
+
+    @classmethod
+    def from_dict(cls, dikt):
+        """Returns the dict as a model
+
+        :param dikt: A dict.
+        :type: dict
+        :return: The CountResponse of this CountResponse.  # noqa: E501
+        :rtype: CountResponse
+        """
+        return util.deserialize_model(dikt, cls)
+
+    @property
+    def count(self):
+        """Gets the count of this CountResponse.
+
+        Number of entities represented by current facet selection.  # noqa: E501
+
+        :return: The count of this CountResponse.
+        :rtype: int
+        """
+        return self._count
+
+    @count.setter
+    def count(self, count):
+        """Sets the count of this CountResponse.
+
+        Number of entities represented by current facet selection.  # noqa: E501
+
+        :param count: The count of this CountResponse.
+        :type count: int
+        """
+
+        self._count = count
+
+    @property
+    def invalid_filter_facets(self):
+        """Gets the invalid_filter_facets of this CountResponse.
+
+        Facets that were passed in filter param that don't exist in Elasticsearch index. See FacetsResponse.  # noqa: E501
+
+        :return: The invalid_filter_facets of this CountResponse.
+        :rtype: List[str]
+        """
+        return self._invalid_filter_facets
+
+    @invalid_filter_facets.setter
+    def invalid_filter_facets(self, invalid_filter_facets):
+        """Sets the invalid_filter_facets of this CountResponse.
+
+        Facets that were passed in filter param that don't exist in Elasticsearch index. See FacetsResponse.  # noqa: E501
+
+        :param invalid_filter_facets: The invalid_filter_facets of this CountResponse.
+        :type invalid_filter_facets: List[str]
+        """
+
+        self._invalid_filter_facets = invalid_filter_facets
@@ -22,7 +22,9 @@ class Facet(Model):
                  value_names=None,
                  value_counts=None,
                  time_names=None,
-                 time_series_value_counts=None):  # noqa: E501
+                 time_series_value_counts=None,
+                 time_series_value_indexes=None,
+                 value_count_errors=None):  # noqa: E501
         """Facet - a model defined in Swagger
 
         :param name: The name of this Facet.  # noqa: E501
@@ -41,6 +43,10 @@ class Facet(Model):
         :type time_names: List[str]
         :param time_series_value_counts: The time_series_value_counts of this Facet.  # noqa: E501
         :type time_series_value_counts: List[List[int]]
+        :param time_series_value_indexes: The time_series_value_indexes of this Facet.  # noqa: E501
+        :type time_series_value_indexes: List[List[int]]
+        :param value_count_errors: The value_count_errors of this Facet.  # noqa: E501
+        :type value_count_errors: List[int]
         """
         self.swagger_types = {
             'name': str,
@@ -50,7 +56,9 @@ class Facet(Model):
             'value_names': List[str],
             'value_counts': List[int],
             'time_names': List[str],
-            'time_series_value_counts': List[List[int]]
+            'time_series_value_counts': List[List[int]],
+            'time_series_value_indexes': List[List[int]],
+            'value_count_errors': List[int]
         }
 
         self.attribute_map = {
@@ -61,7 +69,9 @@ class Facet(Model):
             'value_names': 'value_names',
             'value_counts': 'value_counts',
             'time_names': 'time_names',
-            'time_series_value_counts': 'time_series_value_counts'
+            'time_series_value_counts': 'time_series_value_counts',
+            'time_series_value_indexes': 'time_series_value_indexes',
+            'value_count_errors': 'value_count_errors'
         }
 
         self._name = name
@@ -72,6 +82,8 @@ class Facet(Model):
         self._value_counts = value_counts
         self._time_names = time_names
         self._time_series_value_counts = time_series_value_counts
+        self._time_series_value_indexes = time_series_value_indexes
+        self._value_count_errors = value_count_errors
 
     @classmethod
     def from_dict(cls, dikt):
@@ -249,7 +261,7 @@ class Facet(Model):
     def time_series_value_counts(self):
         """Gets the time_series_value_counts of this Facet.
 
-        2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names.   # noqa: E501
+        2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names. If timeSeriesEncoding is sparse, each time only has its non-zero counts, for the values in time_series_value_indexes.   # noqa: E501
 
         :return: The time_series_value_counts of this Facet.
         :rtype: List[List[int]]
@@ -260,10 +272,56 @@ class Facet(Model):
     def time_series_value_counts(self, time_series_value_counts):
         """Sets the time_series_value_counts of this Facet.
 
-        2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names.   # noqa: E501
+        2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names. If timeSeriesEncoding is sparse, each time only has its non-zero counts, for the values in time_series_value_indexes.   # noqa: E501
 
         :param time_series_value_counts: The time_series_value_counts of this Facet.
         :type time_series_value_counts: List[List[int]]
         """
 
         self._time_series_value_counts = time_series_value_counts
+
+    @property
+    def time_series_value_indexes(self):
+        """Gets the time_series_value_indexes of this Facet.
+
+        Only set if timeSeriesEncoding is sparse. 2-dimensional array of value_names indexes, indexed by time, in increasing order. time_series_value_counts[i][j] is the count of value_names[time_series_value_indexes[i][j]] at time_names[i].   # noqa: E501
+
+        :return: The time_series_value_indexes of this Facet.
+        :rtype: List[List[int]]
+        """
+        return self._time_series_value_indexes
+
+    @time_series_value_indexes.setter
+    def time_series_value_indexes(self, time_series_value_indexes):
+        """Sets the time_series_value_indexes of this Facet.
+
+        Only set if timeSeriesEncoding is sparse. 2-dimensional array of value_names indexes, indexed by time, in increasing order. time_series_value_counts[i][j] is the count of value_names[time_series_value_indexes[i][j]] at time_names[i].   # noqa: E501
+
+        :param time_series_value_indexes: The time_series_value_indexes of this Facet.
+        :type time_series_value_indexes: List[List[int]]
+        """
+
+        self._time_series_value_indexes = time_series_value_indexes
+
+    @property
+    def value_count_errors(self):
+        """Gets the value_count_errors of this Facet.
+
+        Only set if the response is approximate. Standard errors of value_counts.  # noqa: E501
+
+        :return: The value_count_errors of this Facet.
+        :rtype: List[int]
+        """
+        return self._value_count_errors
+
+    @value_count_errors.setter
+    def value_count_errors(self, value_count_errors):
+        """Sets the value_count_errors of this Facet.
+
+        Only set if the response is approximate. Standard errors of value_counts.  # noqa: E501
+
+        :param value_count_errors: The value_count_errors of this Facet.
+        :type value_count_errors: List[int]
+        """
+
+        self._value_count_errors = value_count_errors
@@ -0,0 +1,153 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from datetime import date, datetime  # noqa: F401
+
+from typing import List, Dict  # noqa: F401
+
+from data_explorer.models.base_model_ import Model
+from data_explorer import util
+
+
+class FacetValuesResponse(Model):
+    """NOTE: This class is auto generated by the swagger code generator program.
+
+    Do not edit the class manually.
+    """
+    def __init__(self,
+                 es_field_name=None,
+                 value_names=None,
+                 value_counts=None,
+                 after=None):  # noqa: E501
+        """FacetValuesResponse - a model defined in Swagger
+
+        :param es_field_name: The es_field_name of this FacetValuesResponse.  # noqa: E501
+        :type es_field_name: str
+        :param value_names: The value_names of this FacetValuesResponse.  # noqa: E501
+        :type value_names: List[str]
+        :param value_counts: The value_counts of this FacetValuesResponse.  # noqa: E501
+        :type value_counts: List[int]
+        :param after: The after of this FacetValuesResponse.  # noqa: E501
+        :type after: str
+        """
+        self.swagger_types = {
+            'es_field_name': str,
+            'value_names': List[str],
+            'value_counts': List[int],
+            'after': str
+        }
+
+        self.attribute_map = {
+            'es_field_name': 'es_field_name',
+            'value_names': 'value_names',
+            'value_counts': 'value_counts',
+            'after': 'after'
+        }
+
+        self._es_field_name = es_field_name
+        self._value_names = value_names
+        self._value_counts = value_counts
+        self._after = after
+
+    @classmethod
+    def from_dict(cls, dikt):
+        """Returns the dict as a model
+
+        :param dikt: A dict.
+        :type: dict
+        :return: The FacetValuesResponse of this FacetValuesResponse.  # noqa: E501
+        :rtype: FacetValuesResponse
+        """
+        return util.deserialize_model(dikt, cls)
+
+    @property
+    def es_field_name(self):
+        """Gets the es_field_name of this FacetValuesResponse.
+
+        The Elasticsearch field name.  # noqa: E501
+
+        :return: The es_field_name of this FacetValuesResponse.
+        :rtype: str
+        """
+        return self._es_field_name
+
+    @es_field_name.setter
+    def es_field_name(self, es_field_name):
+        """Sets the es_field_name of this FacetValuesResponse.
+
+        The Elasticsearch field name.  # noqa: E501
+
+        :param es_field_name: The es_field_name of this FacetValuesResponse.
+        :type es_field_name: str
+        """
+
+        self._es_field_name = es_field_name
+
+    @property
+    def value_names(self):
+        """Gets the value_names of this FacetValuesResponse.
+
+        Array of names of facet values, in order.  # noqa: E501
+
+        :return: The value_names of this FacetValuesResponse.
+        :rtype: List[str]
+        """
+        return self._value_names
+
+    @value_names.setter
+    def value_names(self, value_names):
+        """Sets the value_names of this FacetValuesResponse.
+
+        Array of names of facet values, in order.  # noqa: E501
+
+        :param value_names: The value_names of this FacetValuesResponse.
+        :type value_names: List[str]
+        """
+
+        self._value_names = value_names
+
+    @property
+    def value_counts(self):
+        """Gets the value_counts of this FacetValuesResponse.
+
+        Array of counts for each facet value.  # noqa: E501
+
+        :return: The value_counts of this FacetValuesResponse.
+        :rtype: List[int]
+        """
+        return self._value_counts
+
+    @value_counts.setter
+    def value_counts(self, value_counts):
+        """Sets the value_counts of this FacetValuesResponse.
+
+        Array of counts for each facet value.  # noqa: E501
+
+        :param value_counts: The value_counts of this FacetValuesResponse.
+        :type value_counts: List[int]
+        """
+
+        self._value_counts = value_counts
+
+    @property
+    def after(self):
+        """Gets the after of this FacetValuesResponse.
+
+        Pass as after to get the next page. Not set on the last page.  # noqa: E501
+
+        :return: The after of this FacetValuesResponse.
+        :rtype: str
+        """
+        return self._after
+
+    @after.setter
+    def after(self, after):
+        """Sets the after of this FacetValuesResponse.
+
+        Pass as after to get the next page. Not set on the last page.  # noqa: E501
+
+        :param after: The after of this FacetValuesResponse.
+        :type after: str
+        """
+
+        self._after = after
@@ -20,7 +20,9 @@ class FacetsResponse(Model):
                  count=None,
                  invalid_filter_facets=None,
                  invalid_extra_facets=None,
-                 sql_query=None):  # noqa: E501
+                 sql_query=None,
+                 approximate=None,
+                 invalid_fields=None):  # noqa: E501
         """FacetsResponse - a model defined in Swagger
 
         :param facets: The facets of this FacetsResponse.  # noqa: E501
@@ -33,13 +35,19 @@ class FacetsResponse(Model):
         :type invalid_extra_facets: List[str]
         :param sql_query: The sql_query of this FacetsResponse.  # noqa: E501
         :type sql_query: str
+        :param approximate: The approximate of this FacetsResponse.  # noqa: E501
+        :type approximate: bool
+        :param invalid_fields: The invalid_fields of this FacetsResponse.  # noqa: E501
+        :type invalid_fields: List[str]
         """
         self.swagger_types = {
             'facets': List[Facet],
             'count': int,
             'invalid_filter_facets': List[str],
             'invalid_extra_facets': List[str],
-            'sql_query': str
+            'sql_query': str,
+            'approximate': bool,
+            'invalid_fields': List[str]
         }
 
         self.attribute_map = {
@@ -47,7 +55,9 @@ class FacetsResponse(Model):
             'count': 'count',
             'invalid_filter_facets': 'invalid_filter_facets',
             'invalid_extra_facets': 'invalid_extra_facets',
-            'sql_query': 'sql_query'
+            'sql_query': 'sql_query',
+            'approximate': 'approximate',
+            'invalid_fields': 'invalid_fields'
         }
 
         self._facets = facets
@@ -55,6 +65,8 @@ class FacetsResponse(Model):
         self._invalid_filter_facets = invalid_filter_facets
         self._invalid_extra_facets = invalid_extra_facets
         self._sql_query = sql_query
+        self._approximate = approximate
+        self._invalid_fields = invalid_fields
 
     @classmethod
     def from_dict(cls, dikt):
@@ -179,3 +191,49 @@ class FacetsResponse(Model):
         """
 
         self._sql_query = sql_query
+
+    @property
+    def approximate(self):
+        """Gets the approximate of this FacetsResponse.
+
+        True if facet counts were estimated from a sample of documents. Unset if they are exact.  # noqa: E501
+
+        :return: The approximate of this FacetsResponse.
+        :rtype: bool
+        """
+        return self._approximate
+
+    @approximate.setter
+    def approximate(self, approximate):
+        """Sets the approximate of this FacetsResponse.
+
+        True if facet counts were estimated from a sample of documents. Unset if they are exact.  # noqa: E501
+
+        :param approximate: The approximate of this FacetsResponse.
+        :type approximate: bool
+        """
+
+        self._approximate = approximate
+
+    @property
+    def invalid_fields(self):
+        """Gets the invalid_fields of this FacetsResponse.
+
+        Names that were passed in fields param that aren't facets, for example because the dataset was updated since a saved url was created. Unset if fields isn't set or all of its names are facets.  # noqa: E501
+
+        :return: The invalid_fields of this FacetsResponse.
+        :rtype: List[str]
+        """
+        return self._invalid_fields
+
+    @invalid_fields.setter
+    def invalid_fields(self, invalid_fields):
+        """Sets the invalid_fields of this FacetsResponse.
+
+        Names that were passed in fields param that aren't facets, for example because the dataset was updated since a saved url was created. Unset if fields isn't set or all of its names are facets.  # noqa: E501
+
+        :param invalid_fields: The invalid_fields of this FacetsResponse.
+        :type invalid_fields: List[str]
+        """
+
+        self._invalid_fields = invalid_fields
@@ -0,0 +1,65 @@
+import numpy as np
+
+from data_explorer.util import bitmap_postings
+from data_explorer.util.bitmap_postings import Postings
+
+SIZE = 200
+
+
+def _get_postings():
+    # Code 0 is dense; codes 1 and 2 are sparse; code 3 has no entities.
+    codes = [0] * 150 + [1, 1, 1, 2]
+    entities = list(range(150)) + [3, 160, 160, 199]
+    return Postings(codes, entities, 4, SIZE)
+
+
+def test_bitset_round_trip():
+    ordinals = [0, 63, 64, 130, 199]
+    bitset = bitmap_postings.ordinals_to_bitset(ordinals, SIZE)
+    assert 4 == len(bitset)
+    assert 5 == bitmap_postings.count(bitset)
+    assert ordinals == bitmap_postings.bitset_to_ordinals(bitset,
+                                                          SIZE).tolist()
+    assert [True, False,
+            True] == bitmap_postings.contains(bitset, [63, 65, 199]).tolist()
+
+
+def test_get_bitset():
+    postings = _get_postings()
+    assert [3, 160
+            ] == bitmap_postings.bitset_to_ordinals(postings.get_bitset([1]),
+                                                    SIZE).tolist()
+    assert list(range(150)) + [160, 199] == bitmap_postings.bitset_to_ordinals(
+        postings.get_bitset([0, 1, 2]), SIZE).tolist()
+    assert 0 == bitmap_postings.count(postings.get_bitset([3]))
+
+
+def test_get_counts():
+    postings = _get_postings()
+    # Duplicate pairs are counted once.
+    assert [150, 2, 1, 0] == postings.get_counts(None).tolist()
+    bitset = bitmap_postings.ordinals_to_bitset([3, 4, 160], SIZE)
+    assert [2, 2, 0, 0] == postings.get_counts(bitset).tolist()
+
+
+def test_get_counts_matches_masks():
+    random = np.random.RandomState(0)
+    codes = random.randint(0, 20, 5000)
+    # Skewed, so some values are dense.
+    codes[:3000] = random.randint(0, 3, 3000)
+    entities = random.randint(0, 1000, 5000)
+    postings = Postings(codes, entities, 20, 1000)
+    mask = random.rand(1000) < 0.3
+
+    expected = [
+        len(set(entities[(codes == code) & mask[entities]]))
+        for code in range(20)
+    ]
+    assert expected == postings.get_counts(
+        bitmap_postings.mask_to_bitset(mask)).tolist()
+
+
+def test_map_codes():
+    postings = _get_postings().map_codes(np.array([0, 1, 1, 0]), 2)
+    # Codes 1 and 2 are merged.
+    assert [150, 3] == postings.get_counts(None).tolist()
@@ -0,0 +1,577 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+from elasticsearch_dsl.faceted_search import NestedFacet
+from flask import Flask
+from unittest import mock
+
+from data_explorer.util import columnar_facets
+from data_explorer.util import dataset_faceted_search
+from data_explorer.util import elasticsearch_util
+from data_explorer.util.columnar_facets import ColumnarIndex
+from data_explorer.util.filters_facet import FiltersFacet
+from data_explorer.util.schema_catalog import SchemaCatalog
+
+_TEXT = {
+    'type': 'text',
+    'fields': {
+        'keyword': {
+            'type': 'keyword',
+            'ignore_above': 256
+        }
+    }
+}
+
+PROPERTIES = {
+    'p': {
+        'properties': {
+            'd': {
+                'properties': {
+                    't': {
+                        'properties': {
+                            'Gender': _TEXT,
+                            'Age': {
+                                'type': 'long'
+                            },
+                            'Smoker': {
+                                'type': 'boolean'
+                            },
+                            'BMI': {
+                                'properties': {
+                                    '_is_time_series': {
+                                        'type': 'boolean'
+                                    },
+                                    '1': {
+                                        'type': 'float'
+                                    },
+                                    '2': {
+                                        'type': 'float'
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    },
+    'samples': {
+        'type': 'nested',
+        'properties': {
+            'p': {
+                'properties': {
+                    'd': {
+                        'properties': {
+                            's': {
+                                'properties': {
+                                    'Platform': _TEXT,
+                                    'Coverage': {
+                                        'type': 'float'
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+# Like the BigQuery indexer, fields use dotted names.
+SOURCES = [
+    {
+        'p.d.t.Gender':
+        'female',
+        'p.d.t.Age':
+        34,
+        'p.d.t.Smoker':
+        True,
+        'p.d.t.BMI': {
+            '_is_time_series': True,
+            '1': 22.5,
+            '2': 23.1
+        },
+        'samples': [{
+            'p.d.s.Platform': 'Illumina',
+            'p.d.s.Coverage': 0.91
+        }, {
+            'p.d.s.Platform': 'SOLID',
+            'p.d.s.Coverage': 0.85
+        }]
+    },
+    {
+        'p.d.t.Gender': 'male',
+        'p.d.t.Age': 45,
+        'p.d.t.Smoker': False,
+        'p.d.t.BMI': {
+            '_is_time_series': True,
+            '1': 27.0
+        },
+        'samples': [{
+            'p.d.s.Platform': 'Illumina',
+            'p.d.s.Coverage': 0.95
+        }]
+    },
+    {
+        'p.d.t.Gender': 'female',
+        'p.d.t.Age': 51,
+        'p.d.t.Smoker': False,
+        'p.d.t.BMI': {
+            '_is_time_series': True,
+            '1': 31.2,
+            '2': 30.0
+        },
+        'samples': []
+    },
+    {
+        'p.d.t.Gender':
+        'male',
+        'p.d.t.Age':
+        38,
+        'p.d.t.Smoker':
+        True,
+        'samples': [{
+            'p.d.s.Platform': 'Illumina',
+            'p.d.s.Coverage': 0.88
+        }, {
+            'p.d.s.Platform': 'Illumina',
+            'p.d.s.Coverage': 0.93
+        }]
+    },
+    {
+        'p.d.t.Gender': 'female',
+        'p.d.t.Age': 62,
+        'p.d.t.BMI': {
+            '_is_time_series': True,
+            '1': 24.0
+        },
+        'samples': [{
+            'p.d.s.Platform': 'SOLID',
+            'p.d.s.Coverage': 0.7
+        }]
+    },
+    {
+        'p.d.t.Age': [29, 33],
+        'p.d.t.Smoker': True,
+        'samples': [{
+            'p.d.s.Platform': 'Illumina'
+        }]
+    },
+]
+
+
+def _get_facets():
+    return {
+        'p.d.t.Gender': {
+            'type': 'text',
+            'es_facet': TermsFacet(field='p.d.t.Gender.keyword', size=1000)
+        },
+        'p.d.t.Age': {
+            'type': 'long',
+            'es_facet': HistogramFacet(field='p.d.t.Age', interval=10)
+        },
+        'p.d.t.Smoker': {
+            'type': 'boolean',
+            'es_facet': TermsFacet(field='p.d.t.Smoker')
+        },
+        'p.d.t.BMI.1': {
+            'type': 'float',
+            'es_facet': HistogramFacet(field='p.d.t.BMI.1', interval=5)
+        },
+        'samples.p.d.s.Platform': {
+            'type':
+            'text',
+            'es_facet':
+            NestedFacet(
+                'samples',
+                TermsFacet(field='samples.p.d.s.Platform.keyword', size=1000))
+        },
+        'samples.p.d.s.Coverage': {
+            'type':
+            'float',
+            'es_facet':
+            NestedFacet(
+                'samples',
+                HistogramFacet(field='samples.p.d.s.Coverage', interval=0.1))
+        },
+    }
+
+
+# Filters to compare the columnar engine and Elasticsearch on.
+FILTERS = [
+    {},
+    {
+        'p.d.t.Gender': ['female'],
+        'samples.p.d.s.Platform': ['Illumina']
+    },
+    {
+        'p.d.t.Age': [30]
+    },
+    {
+        'p.d.t.Smoker': ['true']
+    },
+    {
+        'p.d.t.Gender': ['female', 'male'],
+        'samples.p.d.s.Coverage': [0.9]
+    },
+]
+
+
+def _get_index():
+    return ColumnarIndex(SOURCES, SchemaCatalog(PROPERTIES))
+
+
+def _get_field_type(field):
+    properties = PROPERTIES
+    for part in field.split('.'):
+        mapping = properties[part]
+        properties = mapping.get('properties')
+    return mapping['type']
+
+
+def _get_source_values(source, field):
+    """Returns the values of dotted field name field in source."""
+    parts = field.split('.')
+    for i in range(len(parts), 0, -1):
+        key = '.'.join(parts[:i])
+        if key not in source:
+            continue
+        if i < len(parts):
+            if not isinstance(source[key], dict):
+                return []
+            return _get_source_values(source[key], '.'.join(parts[i:]))
+        values = source[key]
+        if not isinstance(values, list):
+            values = [values]
+        return values
+    return []
+
+
+class FakeElasticsearch(object):
+    """Answers requests by evaluating them over sources in memory.
+
+    Supports the queries and aggregations in FacetsSearchTemplate bodies.
+    Documents under a nested path are given the path as a field name prefix.
+    """
+    def __init__(self, sources):
+        self.sources = sources
+
+    def _get_values(self, doc, field):
+        """Returns the values of field in doc.
+
+        Like Elasticsearch, float values are rounded to 32 bits.
+        """
+        if field.endswith('.keyword'):
+            field = field[:-len('.keyword')]
+        path, source = doc
+        values = _get_source_values(source,
+                                    field[len(path) + 1:] if path else field)
+        if _get_field_type(field) == 'float':
+            values = [float(np.float32(value)) for value in values]
+        return values
+
+    def _matches(self, doc, query):
+        (query_type, params), = query.items()
+        if query_type == 'match_all':
+            return True
+        if query_type == 'bool':
+            if not all(self._matches(doc, q) for q in params.get('must', [])):
+                return False
+            should = params.get('should', [])
+            return not should or any(self._matches(doc, q) for q in should)
+        if query_type == 'nested':
+            return any(
+                self._matches(nested_doc, params['query'])
+                for nested_doc in self._get_nested_docs([doc], params['path']))
+        (field, condition), = params.items()
+        values = self._get_values(doc, field)
+        if query_type == 'terms':
+            return any(
+                str(value).lower() in [str(c).lower() for c in condition]
+                for value in values)
+        assert 'range' == query_type
+        return any(condition['gte'] <= value < condition['lt']
+                   for value in values)
+
+    def _get_nested_docs(self, docs, path):
+        return [(path, nested_source) for _, source in docs
+                for nested_source in source.get(path, [])]
+
+    def _aggregate(self, docs, aggs):
+        aggregations = {}
+        for name, agg in aggs.items():
+            sub_aggs = agg.get('aggs', {})
+            (agg_type, params), = ((agg_type, params)
+                                   for agg_type, params in agg.items()
+                                   if agg_type != 'aggs')
+            if agg_type == 'filter':
+                matching_docs = [
+                    doc for doc in docs if self._matches(doc, params)
+                ]
+                aggregations[name] = self._aggregate(matching_docs, sub_aggs)
+                aggregations[name]['doc_count'] = len(matching_docs)
+            elif agg_type == 'nested':
+                nested_docs = self._get_nested_docs(docs, params['path'])
+                aggregations[name] = self._aggregate(nested_docs, sub_aggs)
+                aggregations[name]['doc_count'] = len(nested_docs)
+            elif agg_type == 'terms':
+                counts = {}
+                for doc in docs:
+                    for value in set(self._get_values(doc, params['field'])):
+                        # Boolean keys are 1 and 0.
+                        if isinstance(value, bool):
+                            value = int(value)
+                        counts[value] = counts.get(value, 0) + 1
+                buckets = sorted(counts.items(),
+                                 key=lambda item: (-item[1], item[0]))
+                aggregations[name] = {
+                    'buckets': [{
+                        'key': key,
+                        'doc_count': doc_count
+                    } for key, doc_count in buckets[:params.get('size', 10)]]
+                }
+            else:
+                assert 'histogram' == agg_type
+                interval = params['interval']
+                counts = {}
+                for doc in docs:
+                    for bucket in set(
+                            int(math.floor(value / interval))
+                            for value in self._get_values(
+                                doc, params['field'])):
+                        counts[bucket] = counts.get(bucket, 0) + 1
+                # Empty buckets between the first and last are included.
+                aggregations[name] = {
+                    'buckets': [{
+                        'key': float(bucket) * interval,
+                        'doc_count': counts.get(bucket, 0)
+                    } for bucket in (range(min(counts),
+                                           max(counts) + 1) if counts else [])]
+                }
+        return aggregations
+
+    def search(self, index, body):
+        docs = [(None, source) for source in self.sources]
+        hits = [
+            doc for doc in docs
+            if self._matches(doc, body.get('post_filter', {'match_all': {}}))
+        ]
+        return {
+            'took': 1,
+            'hits': {
+                'total': len(hits),
+                'hits': []
+            },
+            'aggregations': self._aggregate(docs, body.get('aggs', {}))
+        }
+
+    def count(self, index, body):
+        return {
+            'count':
+            len([
+                source for source in self.sources
+                if self._matches((None, source), body['query'])
+            ])
+        }
+
+
+def test_execute_without_filters():
+    facets, count = _get_index().execute({}, _get_facets())
+    assert 6 == count
+    assert {
+        'p.d.t.Gender': [('female', 3, False), ('male', 2, False)],
+        # The document with ages 29 and 33 is in two buckets.
+        'p.d.t.Age': [(20.0, 1, False), (30.0, 3, False), (40.0, 1, False),
+                      (50.0, 1, False), (60.0, 1, False)],
+        'p.d.t.Smoker': [(1, 3, False), (0, 2, False)],
+        'p.d.t.BMI.1': [(20.0, 2, False), (25.0, 1, False), (30.0, 1, False)],
+        # Nested facets count samples, not participants.
+        'samples.p.d.s.Platform': [('Illumina', 5, False),
+                                   ('SOLID', 2, False)],
+        # Includes the empty 0.7 bucket. 0.7 / 0.1 < 7, so 0.7 is in the 0.6
+        # bucket, as in Elasticsearch.
+        'samples.p.d.s.Coverage': [(6 * 0.1, 1, False), (7 * 0.1, 0, False),
+                                   (8 * 0.1, 2, False), (9 * 0.1, 3, False)],
+    } == facets
+
+
+def test_execute_with_filters():
+    facets, count = _get_index().execute(
+        {
+            'p.d.t.Gender': ['female'],
+            'samples.p.d.s.Platform': ['Illumina']
+        }, _get_facets())
+    assert 1 == count
+    assert {
+        # A facet's own filter doesn't apply to it.
+        'p.d.t.Gender': [('male', 2, False), ('female', 1, True)],
+        'p.d.t.Age': [(30.0, 1, False)],
+        'p.d.t.Smoker': [(1, 1, False)],
+        'p.d.t.BMI.1': [(20.0, 1, False)],
+        'samples.p.d.s.Platform': [('SOLID', 2, False), ('Illumina', 1, True)],
+        'samples.p.d.s.Coverage': [(8 * 0.1, 1, False), (9 * 0.1, 1, False)],
+    } == facets
+
+
+def test_execute_with_histogram_and_boolean_filters():
+    facets, count = _get_index().execute({'p.d.t.Age': [30]}, _get_facets())
+    assert 3 == count
+    assert (30.0, 3, True) in facets['p.d.t.Age']
+    # Ties are ordered by key.
+    assert [('female', 1, False), ('male', 1, False)] == facets['p.d.t.Gender']
+
+    _, count = _get_index().execute({'p.d.t.Smoker': ['true']}, _get_facets())
+    assert 3 == count
+
+
+def test_execute_aggregated_facet_names():
+    index = _get_index()
+    filters = {'p.d.t.Gender': ['female'], 'p.d.t.Age': [30]}
+    facets, count = index.execute(filters, _get_facets())
+    # Filters apply to facets that aren't aggregated.
+    assert ({
+        'p.d.t.Age': facets['p.d.t.Age'],
+        'p.d.t.Smoker': facets['p.d.t.Smoker']
+    }, count) == index.execute(filters, _get_facets(),
+                               ['p.d.t.Age', 'p.d.t.Smoker'])
+
+
+def test_count():
+    index = _get_index()
+    filters_list = [{}, {
+        'p.d.t.Age': [30]
+    }, {
+        'p.d.t.Gender': ['female'],
+        'samples.p.d.s.Platform': ['Illumina']
+    }, {
+        'p.d.t.Gender': []
+    }]
+    for filters in filters_list:
+        assert index.execute(filters, _get_facets())[1] == index.count(
+            filters, _get_facets())
+    facets = _get_facets()
+    facets['p.d.t.Gender']['es_facet'] = FiltersFacet(
+        {'female': {
+            'term': {
+                'p.d.t.Gender.keyword': 'female'
+            }
+        }})
+    assert index.count({'p.d.t.Gender': ['female']}, facets) is None
+    # Facets without filters don't need to be supported.
+    assert index.count({'p.d.t.Age': [30]}, facets) is not None
+
+
+def test_float_precision():
+    # Elasticsearch stores float fields with 32 bits. As a double, 0.3 / 0.1
+    # is just below 3, but the float32 0.3 is just above it.
+    index = ColumnarIndex([{
+        'samples': [{
+            'p.d.s.Coverage': 0.3
+        }]
+    }], SchemaCatalog(PROPERTIES))
+    facets = _get_facets()
+    facets = {'samples.p.d.s.Coverage': facets['samples.p.d.s.Coverage']}
+    assert ({
+        'samples.p.d.s.Coverage': [(3 * 0.1, 1, False)]
+    }, 1) == index.execute({}, facets)
+
+
+def test_execute_unsupported_facet():
+    facets = _get_facets()
+    facets['p.d.t.Gender']['es_facet'] = FiltersFacet(
+        {'female': {
+            'term': {
+                'p.d.t.Gender.keyword': 'female'
+            }
+        }})
+    assert _get_index().execute({}, facets) is None
+
+
+def test_get_columnar_index_reloads_in_background():
+    old_index = ColumnarIndex(SOURCES, SchemaCatalog(PROPERTIES), 'old')
+    new_index = ColumnarIndex(SOURCES[:1], SchemaCatalog(PROPERTIES), 'new')
+    loaded = threading.Event()
+
+    def load():
+        loaded.wait(10)
+        return new_index
+
+    with Flask(__name__).app_context(), mock.patch.object(
+            columnar_facets, '_index', old_index), mock.patch.object(
+                columnar_facets.index_generation,
+                'get_index_generation',
+                return_value='new'), mock.patch.object(
+                    columnar_facets, '_load', side_effect=load) as _load:
+        # The old index is served while the new one loads.
+        assert old_index is columnar_facets.get_columnar_index()
+        assert old_index is columnar_facets.get_columnar_index()
+        loaded.set()
+        for _ in range(100):
+            if columnar_facets.get_columnar_index() is new_index:
+                break
+            time.sleep(0.01)
+        assert new_index is columnar_facets.get_columnar_index()
+        assert 1 == _load.call_count
+
+
+def _assert_equivalent_to_elasticsearch(index):
+    for filters in FILTERS:
+        assert dataset_faceted_search.execute_facets_search(
+            filters, _get_facets()) == index.execute(filters, _get_facets())
+        assert dataset_faceted_search.execute_count(
+            filters, _get_facets()) == index.count(filters, _get_facets())
+
+
+def test_equivalent_to_fake_elasticsearch():
+    app = Flask(__name__)
+    app.config['INDEX_NAME'] = 'test_columnar_facets'
+    app.config['FACET_ENGINE'] = 'elasticsearch'
+    app.config['FACETS_SEARCH_GROUP_SIZE'] = 0
+    with app.app_context(), mock.patch.object(
+            dataset_faceted_search.elasticsearch_util,
+            'get_elasticsearch',
+            return_value=FakeElasticsearch(SOURCES)):
+        _assert_equivalent_to_elasticsearch(_get_index())
+
+
+@pytest.mark.skipif('ELASTICSEARCH_URL' not in os.environ,
+                    reason='Needs Elasticsearch at ELASTICSEARCH_URL')
+def test_equivalent_to_elasticsearch():
+    app = Flask(__name__)
+    app.config['ELASTICSEARCH_URL'] = os.environ['ELASTICSEARCH_URL']
+    app.config['ELASTICSEARCH_MAXSIZE'] = 1
+    app.config['ELASTICSEARCH_TIMEOUT'] = 30
+    app.config['ELASTICSEARCH_MAX_RETRIES'] = 0
+    app.config['ELASTICSEARCH_RETRY_ON_TIMEOUT'] = False
+    app.config['INDEX_NAME'] = 'test_columnar_facets'
+    app.config['FACET_ENGINE'] = 'elasticsearch'
+    app.config['FACETS_SEARCH_GROUP_SIZE'] = 0
+    with app.app_context():
+        es = elasticsearch_util.get_elasticsearch()
+        es.indices.delete(index=app.config['INDEX_NAME'], ignore=[404])
+        es.indices.create(
+            index=app.config['INDEX_NAME'],
+            body={'mappings': {
+                'type': {
+                    'properties': PROPERTIES
+                }
+            }})
+        try:
+            for i, source in enumerate(SOURCES):
+                es.index(index=app.config['INDEX_NAME'],
+                         doc_type='type',
+                         id=i,
+                         body=source)
+            es.indices.refresh(index=app.config['INDEX_NAME'])
+
+            _assert_equivalent_to_elasticsearch(_get_index())
+        finally:
+            es.indices.delete(index=app.config['INDEX_NAME'])
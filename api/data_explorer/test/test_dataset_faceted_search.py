@@ -0,0 +1,506 @@
+import pytest
+
+from collections import OrderedDict
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+from elasticsearch_dsl.faceted_search import NestedFacet
+from flask import Flask
+from unittest import mock
+
+from data_explorer.util import dataset_faceted_search
+
+FACETS = {
+    'table.Gender': {
+        'es_facet': TermsFacet(field='table.Gender.keyword')
+    },
+    'table.Age': {
+        'es_facet': HistogramFacet(field='table.Age', interval=10)
+    },
+    'samples.table.Platform': {
+        'es_facet':
+        NestedFacet('samples',
+                    TermsFacet(field='samples.table.Platform.keyword'))
+    },
+}
+
+
+class FakeElasticsearch(object):
+    """Answers requests with the handler set for the request method.
+
+    A handler takes the request body and returns the response. Request bodies
+    are recorded in bodies.
+    """
+    def __init__(self):
+        self.handlers = {}
+        self.bodies = []
+
+    def _handle(self, method, index, body):
+        assert 'index' == index
+        self.bodies.append(body)
+        return self.handlers[method](body)
+
+    def search(self, index, body):
+        return self._handle('search', index, body)
+
+    def msearch(self, index, body):
+        return self._handle('msearch', index, body)
+
+    def count(self, index, body):
+        return self._handle('count', index, body)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['INDEX_NAME'] = 'index'
+    app.config['FACET_ENGINE'] = 'elasticsearch'
+    app.config['FACETS_SEARCH_GROUP_SIZE'] = 0
+    app.config['FACETS_SEARCH_MODE'] = 'msearch'
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def es(app):
+    es = FakeElasticsearch()
+    with mock.patch.object(dataset_faceted_search.elasticsearch_util,
+                           'get_elasticsearch',
+                           return_value=es):
+        yield es
+
+
+GENDER_AGG = {'terms': {'field': 'table.Gender.keyword'}}
+AGE_AGG = {'histogram': {'field': 'table.Age', 'interval': 10}}
+PLATFORM_AGG = {
+    'nested': {
+        'path': 'samples'
+    },
+    'aggs': {
+        'inner': {
+            'terms': {
+                'field': 'samples.table.Platform.keyword'
+            }
+        }
+    }
+}
+
+
+def test_get_body_without_filters():
+    template = dataset_faceted_search.FacetsSearchTemplate(FACETS)
+    assert {
+        'size': 0,
+        'aggs': {
+            'table.Gender': GENDER_AGG,
+            'table.Age': AGE_AGG,
+            'samples.table.Platform': PLATFORM_AGG
+        }
+    } == template.get_body({})
+
+
+def test_get_body_shares_filter():
+    template = dataset_faceted_search.FacetsSearchTemplate(FACETS)
+    gender_filter = {'terms': {'table.Gender.keyword': ['female', 'male']}}
+    age_filter = {'range': {'table.Age': {'gte': 20, 'lt': 30}}}
+    all_filters = {'bool': {'must': [gender_filter, age_filter]}}
+    # A facet's own filter doesn't apply to it. Facets without a selection
+    # share one filter aggregation.
+    expected_body = {
+        'size': 0,
+        'post_filter': all_filters,
+        'aggs': {
+            '_filter_table.Gender': {
+                'filter': age_filter,
+                'aggs': {
+                    'table.Gender': GENDER_AGG
+                }
+            },
+            '_filter_table.Age': {
+                'filter': gender_filter,
+                'aggs': {
+                    'table.Age': AGE_AGG
+                }
+            },
+            dataset_faceted_search.SHARED_FILTER_AGG_NAME: {
+                'filter': all_filters,
+                'aggs': {
+                    'samples.table.Platform': PLATFORM_AGG
+                }
+            }
+        }
+    }
+    filters = OrderedDict([('table.Gender', ['female', 'male']),
+                           ('table.Age', [20])])
+    assert expected_body == template.get_body(filters)
+    # A facet without values isn't filtered.
+    filters['samples.table.Platform'] = []
+    assert expected_body == template.get_body(filters)
+
+
+def test_get_filter_query_merges_histogram_buckets():
+    facet = HistogramFacet(field='table.Age', interval=10)
+    assert {
+        'bool': {
+            'should': [{
+                'range': {
+                    'table.Age': {
+                        'gte': 20,
+                        'lt': 50
+                    }
+                }
+            }, {
+                'range': {
+                    'table.Age': {
+                        'gte': 70,
+                        'lt': 80
+                    }
+                }
+            }]
+        }
+    } == dataset_faceted_search.get_filter_query(facet,
+                                                 [40, 70, 20, 30]).to_dict()
+
+    nested_facet = NestedFacet(
+        'samples', HistogramFacet(field='samples.table.Coverage', interval=5))
+    assert {
+        'nested': {
+            'path': 'samples',
+            'query': {
+                'range': {
+                    'samples.table.Coverage': {
+                        'gte': 0,
+                        'lt': 10
+                    }
+                }
+            }
+        }
+    } == dataset_faceted_search.get_filter_query(nested_facet,
+                                                 [0, 5]).to_dict()
+    assert dataset_faceted_search.get_filter_query(nested_facet, []) is None
+
+
+def test_get_facets():
+    template = dataset_faceted_search.FacetsSearchTemplate(FACETS)
+    filters = {'table.Gender': ['female'], 'table.Age': [20]}
+    aggregations = {
+        '_filter_table.Gender': {
+            'doc_count': 5,
+            'table.Gender': {
+                'buckets': [{
+                    'key': 'female',
+                    'doc_count': 3
+                }, {
+                    'key': 'male',
+                    'doc_count': 2
+                }]
+            }
+        },
+        '_filter_table.Age': {
+            'doc_count': 4,
+            'table.Age': {
+                'buckets': [{
+                    'key': 20,
+                    'doc_count': 3
+                }]
+            }
+        },
+        dataset_faceted_search.SHARED_FILTER_AGG_NAME: {
+            'doc_count': 3,
+            'samples.table.Platform': {
+                'doc_count': 4,
+                'inner': {
+                    'buckets': [{
+                        'key': 'Illumina',
+                        'doc_count': 4
+                    }]
+                }
+            }
+        }
+    }
+    assert {
+        'table.Gender': [('female', 3, True), ('male', 2, False)],
+        'table.Age': [(20, 3, True)],
+        'samples.table.Platform': [('Illumina', 4, False)],
+    } == template.get_facets(filters, aggregations)
+
+
+def test_approximate_search_template():
+    template = dataset_faceted_search.FacetsSearchTemplate(FACETS)
+    sampler_name = dataset_faceted_search.SAMPLER_AGG_NAME
+    filters = {'table.Gender': ['female']}
+    body = template.get_body(filters, 100)
+    exact_body = template.get_body(filters)
+    assert 'random_score' in body['query']['function_score']
+    assert exact_body['post_filter'] == body['post_filter']
+    # Every filter aggregation samples its documents.
+    assert set(exact_body['aggs'].keys()) == set(body['aggs'].keys())
+    for name, filter_agg in body['aggs'].items():
+        assert exact_body['aggs'][name]['filter'] == filter_agg['filter']
+        assert {
+            sampler_name: {
+                'sampler': {
+                    'shard_size': 100
+                },
+                'aggs': exact_body['aggs'][name]['aggs']
+            }
+        } == filter_agg['aggs']
+
+    aggregations = {
+        '_filter_table.Gender': {
+            'doc_count': 100,
+            sampler_name: {
+                'doc_count': 10,
+                'table.Gender': {
+                    'buckets': [{
+                        'key': 'female',
+                        'doc_count': 4
+                    }]
+                }
+            }
+        },
+        dataset_faceted_search.SHARED_FILTER_AGG_NAME: {
+            'doc_count': 50,
+            # The sample is all documents, so counts are exact.
+            sampler_name: {
+                'doc_count': 50,
+                'table.Age': {
+                    'buckets': [{
+                        'key': 20,
+                        'doc_count': 7
+                    }]
+                },
+                'samples.table.Platform': {
+                    'doc_count': 60,
+                    'inner': {
+                        'buckets': [{
+                            'key': 'Illumina',
+                            'doc_count': 60
+                        }]
+                    }
+                }
+            }
+        }
+    }
+    # The standard error of female is 10 * sqrt(10 * 0.4 * 0.6 * 90 / 99).
+    assert ({
+        'table.Gender': [('female', 40, True)],
+        'table.Age': [(20, 7, False)],
+        'samples.table.Platform': [('Illumina', 60, False)],
+    }, {
+        'table.Gender': [15],
+        'table.Age': [0],
+        'samples.table.Platform': [0],
+    }) == template.get_approximate_facets(filters, aggregations, 50)
+
+    # Without filters, the sample is drawn from all documents.
+    template = dataset_faceted_search.FacetsSearchTemplate(
+        OrderedDict([('table.Age', FACETS['table.Age'])]))
+    body = template.get_body({}, 100)
+    assert ['table.Age'] == list(body['aggs'][sampler_name]['aggs'].keys())
+    aggregations = {
+        sampler_name: {
+            'doc_count': 20,
+            'table.Age': {
+                'buckets': [{
+                    'key': 20,
+                    'doc_count': 5
+                }]
+            }
+        }
+    }
+    assert [
+        (20, 50, False)
+    ] == template.get_approximate_facets({}, aggregations, 200)[0]['table.Age']
+
+
+def test_get_search_template():
+    template = dataset_faceted_search.get_search_template(FACETS)
+    assert template is dataset_faceted_search.get_search_template(FACETS)
+    assert template is not dataset_faceted_search.get_search_template(
+        FACETS, ['table.Age'])
+
+
+def test_get_terms_page(es):
+    def search(body):
+        buckets = [{
+            'key': {
+                'value': 'female'
+            },
+            'doc_count': 3
+        }, {
+            'key': {
+                'value': 'male'
+            },
+            'doc_count': 2
+        }]
+        if 'after' in body['aggs']['values']['composite']:
+            buckets = buckets[1:]
+        return {'aggregations': {'values': {'buckets': buckets}}}
+
+    es.handlers['search'] = search
+    filters = {'table.Gender': ['female'], 'table.Age': [20]}
+    assert ([('female', 3), ('male', 2)],
+            'male') == dataset_faceted_search.get_terms_page(filters,
+                                                             FACETS,
+                                                             'table.Gender',
+                                                             page_size=2)
+    assert ([('male', 2)],
+            None) == dataset_faceted_search.get_terms_page(filters,
+                                                           FACETS,
+                                                           'table.Gender',
+                                                           after='male',
+                                                           page_size=2)
+    with pytest.raises(ValueError):
+        dataset_faceted_search.get_terms_page({}, FACETS,
+                                              'samples.table.Platform')
+
+    # The facet's own filter doesn't apply.
+    assert {
+        'range': {
+            'table.Age': {
+                'gte': 20,
+                'lt': 30
+            }
+        }
+    } == es.bodies[0]['query']
+    assert {
+        'size': 2,
+        'sources': [{
+            'value': {
+                'terms': {
+                    'field': 'table.Gender.keyword'
+                }
+            }
+        }],
+        'after': {
+            'value': 'male'
+        }
+    } == es.bodies[1]['aggs']['values']['composite']
+
+
+def test_split_facets():
+    es_facets = OrderedDict(('field%d' % i, {}) for i in range(10))
+    groups = dataset_faceted_search._split_facets(es_facets, 4)
+    assert [3, 3, 4] == [len(group) for group in groups]
+    assert list(es_facets.keys()) == [
+        name for group in groups for name in group.keys()
+    ]
+
+
+def test_execute_facets_search_msearch(app, es):
+    def _get_aggregations(aggs):
+        aggregations = {}
+        for name, agg in aggs.items():
+            if 'filter' in agg:
+                aggregations[name] = _get_aggregations(agg['aggs'])
+                aggregations[name]['doc_count'] = 7
+            else:
+                aggregations[name] = {
+                    'buckets': [{
+                        'key': 'value',
+                        'doc_count': 7
+                    }]
+                }
+        return aggregations
+
+    def msearch(body):
+        responses = []
+        for request in body[1::2]:
+            assert 0 == request['size']
+            # Every group is filtered by all filters.
+            assert {
+                'terms': {
+                    'table.field0': ['value']
+                }
+            } == request['post_filter']
+            responses.append({
+                'took': 1,
+                'hits': {
+                    'total': 7,
+                    'hits': []
+                },
+                'aggregations': _get_aggregations(request['aggs'])
+            })
+        return {'responses': responses}
+
+    es.handlers['msearch'] = msearch
+    app.config['FACETS_SEARCH_GROUP_SIZE'] = 2
+    es_facets = OrderedDict(('table.field%d' % i, {
+        'es_facet': TermsFacet(field='table.field%d' % i)
+    }) for i in range(5))
+    es_response_facets, count = dataset_faceted_search.execute_facets_search(
+        {'table.field0': ['value']}, es_facets)
+    assert 7 == count
+    assert dict((name, [('value', 7, name == 'table.field0')])
+                for name in es_facets.keys()) == es_response_facets
+
+
+def test_execute_count(es):
+    def count(body):
+        assert {
+            'bool': {
+                'must': [{
+                    'terms': {
+                        'table.Gender.keyword': ['female']
+                    }
+                }, {
+                    'nested': {
+                        'path': 'samples',
+                        'query': {
+                            'terms': {
+                                'samples.table.Platform.keyword': ['Illumina']
+                            }
+                        }
+                    }
+                }]
+            }
+        } == body['query']
+        return {'count': 7}
+
+    es.handlers['count'] = count
+    assert 7 == dataset_faceted_search.execute_count(
+        OrderedDict([('table.Gender', ['female']),
+                     ('samples.table.Platform', ['Illumina'])]), FACETS)
+
+
+def test_execute_facets_search_aggregated_facet_names(app, es):
+    def search(body):
+        # Only the aggregated facet is aggregated, and the filter on the other
+        # facet applies to it.
+        assert ['_filter_table.Gender'] == list(body['aggs'].keys())
+        assert ['table.Gender'
+                ] == list(body['aggs']['_filter_table.Gender']['aggs'].keys())
+        assert {
+            'range': {
+                'table.Age': {
+                    'gte': 20,
+                    'lt': 30
+                }
+            }
+        } == body['aggs']['_filter_table.Gender']['filter']
+        return {
+            'hits': {
+                'total': 3,
+                'hits': []
+            },
+            'aggregations': {
+                '_filter_table.Gender': {
+                    'doc_count': 4,
+                    'table.Gender': {
+                        'buckets': [{
+                            'key': 'female',
+                            'doc_count': 3
+                        }]
+                    }
+                }
+            }
+        }
+
+    es.handlers['search'] = search
+    app.config['FACETS_SEARCH_GROUP_SIZE'] = 2
+    assert ({
+        'table.Gender': [('female', 3, True)]
+    }, 3) == dataset_faceted_search.execute_facets_search(
+        {
+            'table.Gender': ['female'],
+            'table.Age': [20]
+        }, FACETS, ['table.Gender'])
@@ -1,3 +1,5 @@
+from flask import Flask
+
 from data_explorer.util import elasticsearch_util
 
 
@@ -33,3 +35,48 @@ def test_number_to_range():
     _inner(1000000, 1000000, '1.0M-1.9M')
     _inner(10000000, 10000000, '10M-19M')
     _inner(10000000000, 10000000000, '10B-19B')
+
+
+def test_merge_histogram_ranges():
+    assert [[20, 50], [70, 80]
+            ] == elasticsearch_util.merge_histogram_ranges([40, 70, 20, 30],
+                                                           10)
+    assert [[7, 9],
+            [10, 11]] == elasticsearch_util.merge_histogram_ranges([8, 7, 10],
+                                                                   1)
+    assert [[-10, 10]] == elasticsearch_util.merge_histogram_ranges([0, -10],
+                                                                    10)
+    assert [] == elasticsearch_util.merge_histogram_ranges([], 10)
+
+
+def test_get_metrics_field_names():
+    def _inner(es_field_name, field_type, time_series_vals, expected_names):
+        actual_names = elasticsearch_util.get_metrics_field_names(
+            es_field_name, field_type, time_series_vals)
+        assert expected_names == actual_names
+
+    _inner('project.dataset.table.Gender', 'text', [],
+           ['project.dataset.table.Gender.keyword'])
+    _inner('project.dataset.table.Smoker', 'boolean', [], [])
+    _inner('project.dataset.table.Age', 'long', [],
+           ['project.dataset.table.Age'])
+    _inner('project.dataset.table.AGE.2', 'long', ['1', '2', 'Unknown'], [
+        'project.dataset.table.AGE.1', 'project.dataset.table.AGE.2',
+        'project.dataset.table.AGE.Unknown'
+    ])
+
+
+def test_get_terms_size():
+    app = Flask(__name__)
+    app.config['TERMS_FACET_MAX_SIZE'] = 1000
+    with app.app_context():
+
+        def _inner(cardinality, expected_size):
+            assert expected_size == elasticsearch_util.get_terms_size(
+                None, 'table.Gender.keyword',
+                {'table.Gender.keyword': (None, None, cardinality)})
+
+        _inner(None, 1)
+        _inner(2, 3)
+        _inner(100, 111)
+        _inner(5000, 1000)
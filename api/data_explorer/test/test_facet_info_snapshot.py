@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+from elasticsearch_dsl.faceted_search import NestedFacet
+from flask import Flask
+
+from data_explorer.util import facet_info_snapshot
+
+
+def test_save_and_load(tmpdir):
+    facets = OrderedDict()
+    facets['project.dataset.table.Age'] = {
+        'ui_facet_name': 'Age',
+        'type': 'long',
+        'time_series_panel': False,
+        'separate_panel': True,
+        'time_series_field': False,
+        'es_facet': HistogramFacet(field='project.dataset.table.Age',
+                                   interval=10)
+    }
+    facets['samples.project.dataset.table.Platform'] = {
+        'ui_facet_name':
+        'Platform (samples)',
+        'type':
+        'text',
+        'time_series_panel':
+        False,
+        'separate_panel':
+        True,
+        'time_series_field':
+        False,
+        'description':
+        'Sequencing platform',
+        'es_facet':
+        NestedFacet(
+            'samples',
+            TermsFacet(field='samples.project.dataset.table.Platform.keyword',
+                       size=1000))
+    }
+    path = str(tmpdir.join('facet_info_snapshot.json'))
+
+    with Flask(__name__).app_context():
+        facet_info_snapshot.save(path, 'key1', facets, ['samples'])
+        assert (None, None) == facet_info_snapshot.load(path, 'key2')
+        loaded_facets, nested_paths = facet_info_snapshot.load(path, 'key1')
+
+    assert ['samples'] == nested_paths
+    assert list(facets.keys()) == list(loaded_facets.keys())
+    for es_field_name, facet_info in facets.items():
+        loaded_facet_info = loaded_facets[es_field_name]
+        assert facet_info['es_facet'].get_aggregation().to_dict(
+        ) == loaded_facet_info['es_facet'].get_aggregation().to_dict()
+        for key in facet_info:
+            if key != 'es_facet':
+                assert facet_info[key] == loaded_facet_info[key]
@@ -0,0 +1,91 @@
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+
+from data_explorer.controllers import facets_controller
+
+
+def test_get_time_series_params_sorts_by_count():
+    ts_values = [[[True, False], [4, 5]], [[True, False], [1, 0]],
+                 [[True, False], [0, 2]]]
+    assert ([False, True],
+            [[5, 4], [0, 1], [2, 0]
+             ]) == facets_controller._get_time_series_params(ts_values, True)
+    # Ties in total count are sorted by name.
+    ts_values = [[['b', 'a', 'c'], [1, 1, 2]]]
+    assert (['c', 'a', 'b'],
+            [[2, 1, 1]
+             ]) == facets_controller._get_time_series_params(ts_values, True)
+
+
+def test_get_time_series_params_sorts_by_range():
+    # The second time has no counts, so it has no row.
+    ts_values = [[['10-19', '0-9'], [1, 2]], [['20-29'], [0]],
+                 [['0-9', '-10--1'], [3, 1]]]
+    assert (['-10--1', '0-9', '10-19', '20-29'],
+            [[0, 2, 1, 0], [1, 3, 0, 0]
+             ]) == facets_controller._get_time_series_params(ts_values, False)
+
+
+def test_get_time_series_params_empty():
+    assert ([], []) == facets_controller._get_time_series_params([[[], []]],
+                                                                 True)
+
+
+def test_get_sparse_time_series_params():
+    ts_values = [[[True, False], [4, 5]], [[True, False], [1, 0]],
+                 [[True, False], [0, 2]]]
+    assert ([False, True], [[0, 1], [1], [0]], [[5, 4], [1], [
+        2
+    ]]) == facets_controller._get_sparse_time_series_params(ts_values, True)
+    # Times without counts have no row.
+    ts_values = [[['10-19', '0-9'], [1, 0]], [['20-29'], [0]],
+                 [['0-9', '-10--1'], [3, 1]]]
+    assert (['-10--1', '0-9', '10-19', '20-29'], [[2], [0, 1]],
+            [[1], [1, 3]]) == facets_controller._get_sparse_time_series_params(
+                ts_values, False)
+
+
+def test_get_aggregated_facet_names():
+    combined_facets = [('t.Gender', {}), ('t.Age', {}),
+                       ('t.BMI.1', {
+                           'time_series_panel': True,
+                           'separate_panel': True
+                       }), ('t.BMI.2', {
+                           'time_series_panel': True
+                       })]
+    assert facets_controller._get_aggregated_facet_names(
+        combined_facets, None) is None
+    assert ['t.Age'] == facets_controller._get_aggregated_facet_names(
+        combined_facets, {'t.Age', 't.Unknown'})
+    # A time series facet needs all its panels.
+    assert ['t.BMI.1',
+            't.BMI.2'] == facets_controller._get_aggregated_facet_names(
+                combined_facets, {'t.BMI'})
+    assert ['t.BMI.1'] == facets_controller._get_aggregated_facet_names(
+        combined_facets, {'t.BMI.1'})
+
+
+def test_get_invalid_fields():
+    combined_facets = [('t.Age', {}), ('t.BMI.1', {'time_series_panel': True})]
+    assert facets_controller._get_invalid_fields(combined_facets, None) is None
+    assert [] == facets_controller._get_invalid_fields(
+        combined_facets, {'t.Age', 't.BMI', 't.BMI.1'})
+    assert ['t.A', 't.B'
+            ] == facets_controller._get_invalid_fields(combined_facets,
+                                                       {'t.B', 't.Age', 't.A'})
+
+
+def test_get_canonical_filter():
+    facets = {
+        't.Gender': {
+            'es_facet': TermsFacet(field='t.Gender.keyword')
+        },
+        't.Age': {
+            'es_facet': HistogramFacet(field='t.Age', interval=10)
+        }
+    }
+    # Same filters as "t.Gender=male", "t.Age=30-39", "t.Age=20-29",
+    # "t.Gender=female" and "t.Age=20-29", in any order.
+    filter_dict = {'t.Gender': ['male', 'female'], 't.Age': [30, 20, 20]}
+    assert ['t.Age=20-29', 't.Age=30-39', 't.Gender=female', 't.Gender=male'
+            ] == facets_controller._get_canonical_filter(filter_dict, facets)
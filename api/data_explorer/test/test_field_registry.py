@@ -0,0 +1,64 @@
+from flask import Flask
+from unittest import mock
+
+from data_explorer.util import field_registry
+from data_explorer.util.field_registry import FieldRegistry
+
+
+def test_field_exists():
+    registry = FieldRegistry([
+        'project.dataset.table.Gender',
+        'project.dataset.table.AGE',
+    ])
+    assert registry.field_exists('project.dataset.table.Gender')
+    # Time series field
+    assert registry.field_exists('project.dataset.table.AGE.1')
+    assert not registry.field_exists('project.dataset.table.Height')
+    assert not registry.field_exists('project.dataset.table.Gender.1.2')
+
+
+def test_get_field_descriptions():
+    class FakeElasticsearch(object):
+        def __init__(self):
+            self.mget_ids = []
+
+        def mget(self, index, doc_type, body):
+            self.mget_ids.append(sorted(body['ids']))
+            return {
+                'docs': [{
+                    '_id': 'project.dataset.table.AGE',
+                    'found': True,
+                    '_source': {
+                        'description': 'Age at exam'
+                    }
+                }, {
+                    '_id': 'project.dataset.table.Gender',
+                    'found': True,
+                    '_source': {}
+                }]
+            }
+
+    es = FakeElasticsearch()
+    app = Flask(__name__)
+    app.config['FIELDS_INDEX_NAME'] = 'dataset_fields'
+    with app.app_context(), \
+            mock.patch.object(field_registry.index_generation,
+                              'get_index_generation',
+                              return_value='generation1'), \
+            mock.patch.object(field_registry.elasticsearch_util,
+                              'get_elasticsearch',
+                              return_value=es):
+        field_names = [
+            'project.dataset.table.AGE', 'project.dataset.table.Gender',
+            'project.dataset.table.AGE'
+        ]
+        expected = {
+            'project.dataset.table.AGE':
+            'Dataset dataset, table table: Age at exam',
+            'project.dataset.table.Gender': 'Dataset dataset, table table',
+        }
+        assert expected == field_registry.get_field_descriptions(field_names)
+        # Second call is served from the cache.
+        assert expected == field_registry.get_field_descriptions(field_names)
+    assert [['project.dataset.table.AGE',
+             'project.dataset.table.Gender']] == es.mget_ids
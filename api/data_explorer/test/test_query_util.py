@@ -0,0 +1,27 @@
+from data_explorer.util import query_util
+
+
+def test_get_range_clauses_merges_adjacent_ranges():
+    assert ['age >= 20 AND age < 50'
+            ] == query_util._get_range_clauses('age',
+                                               ['30-39', '20-29', '40-49'], 10)
+    assert ['age >= 20 AND age < 30', 'age >= 40 AND age < 50'
+            ] == query_util._get_range_clauses('age', ['40-49', '20-29'], 10)
+    assert ['age >= -10 AND age < 10'
+            ] == query_util._get_range_clauses('age', ['-10--1', '0-9'], 10)
+    assert ['income >= 1000000000 AND income < 3000000000'
+            ] == query_util._get_range_clauses('income',
+                                               ['1.0B-1.9B', '2.0B-2.9B'],
+                                               1000000000)
+    assert ['bmi >= 0.1 AND bmi < 0.3'
+            ] == query_util._get_range_clauses('bmi', ['0.1-0.2', '0.2-0.3'],
+                                               0.1)
+
+
+def test_get_range_clauses_single_values():
+    # With interval 1, buckets are single values. Like in Elasticsearch
+    # filters, they are ranges and are merged.
+    assert ['age >= 7 AND age < 9', 'age >= 10 AND age < 11'
+            ] == query_util._get_range_clauses('age', ['8', '7', '10'], 1)
+    assert ['age = 7', 'age = 20'
+            ] == query_util._get_range_clauses('age', ['7', '20'], None)
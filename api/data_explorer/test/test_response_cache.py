@@ -0,0 +1,33 @@
+from data_explorer.util.response_cache import ResponseCache
+
+
+def test_get_and_put():
+    cache = ResponseCache(max_bytes=10, ttl_seconds=60)
+    assert cache.get('key1', 'generation1') is None
+    cache.put('key1', 'generation1', b'12345')
+    assert b'12345' == cache.get('key1', 'generation1')
+
+    # Responses larger than the cache aren't cached.
+    cache.put('key2', 'generation1', b'12345678901')
+    assert cache.get('key2', 'generation1') is None
+
+    # Responses are evicted when the cache is full.
+    cache.put('key3', 'generation1', b'123456')
+    assert cache.get('key1', 'generation1') is None
+    assert b'123456' == cache.get('key3', 'generation1')
+
+    # A new index generation clears the cache.
+    assert cache.get('key3', 'generation2') is None
+
+    assert {
+        'hits': 2,
+        'misses': 4,
+        'entries': 0,
+        'bytes': 0
+    } == cache.get_stats()
+
+
+def test_disabled():
+    cache = ResponseCache(max_bytes=0, ttl_seconds=60)
+    cache.put('key1', 'generation1', b'12345')
+    assert cache.get('key1', 'generation1') is None
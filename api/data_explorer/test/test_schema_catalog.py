@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+
+from data_explorer.util.schema_catalog import SchemaCatalog
+
+_DATASET_CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                                   'dataset_config')
+
+
+def _get_catalog(dataset):
+    mappings_path = os.path.join(_DATASET_CONFIG_DIR, dataset, 'mappings.json')
+    with open(mappings_path) as f:
+        mappings = json.loads(next(f))
+    return SchemaCatalog(mappings['mappings']['type']['properties'])
+
+
+def test_nested_fields():
+    catalog = _get_catalog('1000_genomes')
+    assert ['samples'] == catalog.nested_paths
+
+    samples = catalog.get_field('samples')
+    assert 'nested' == samples.type
+    assert 'samples' == samples.nested_path
+
+    gender = catalog.get_field(
+        'verily-public-data.human_genome_variants.1000_genomes_participant_info.Gender'
+    )
+    assert 'text' == gender.type
+    assert gender.nested_path is None
+    assert not gender.is_time_series
+
+    with pytest.raises(KeyError):
+        catalog.get_field('verily-public-data.no_such_field')
+
+
+def test_time_series_fields():
+    catalog = _get_catalog('framingham_heart_study_teaching')
+    table = 'verily-public-data.framingham_heart_study_teaching.framingham_heart_study_teaching'
+
+    age = catalog.get_field(table + '.AGE')
+    assert age.type is None
+    assert age.is_time_series
+    assert ['1', '2', '3'] == age.time_series_vals
+
+    age_1 = catalog.get_field(table + '.AGE.1')
+    assert 'long' == age_1.type
+    assert not age_1.is_time_series
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from data_explorer.util.single_flight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'result'
+
+    results = []
+
+    def do():
+        results.append(single_flight.do('key', fn))
+
+    leader = threading.Thread(target=do)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=do) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # Wait for the followers to be waiting on the leader's call.
+    while single_flight.get_stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert 1 == len(calls)
+    assert [('result', False)] + [('result', True)] * 3 == results
+    assert {'executions': 1, 'coalesced': 3} == single_flight.get_stats()
+
+    # Calls after the first finished run again.
+    release.set()
+    assert ('result', False) == single_flight.do('key', fn)
+
+
+def test_error():
+    single_flight = SingleFlight()
+
+    def fn():
+        raise ValueError('error')
+
+    with pytest.raises(ValueError):
+        single_flight.do('key', fn)
+    # The failed call doesn't stay in flight.
+    assert ('result', False) == single_flight.do('key', lambda: 'result')
@@ -0,0 +1,159 @@
+"""Compressed bitmaps of entity ordinals, for the columnar facet engine.
+
+Postings map each value of a column to the set of entities (documents, or
+nested documents) with that value. Like the containers of Roaring bitmaps, a
+set is stored as a sorted array of uint32 ordinals if it is sparse, and as a
+bitset of 64 bit words if it is dense, so a set never takes more than 4 bytes
+per entity or 1 bit per entity in the index.
+
+Filters are evaluated as bitsets: the sets of the selected values of a facet
+are OR'ed together, and the bitsets of different facets are AND'ed together,
+as in query_util.get_sql_query(). Facet counts are the sizes of the
+intersections of a filter bitset with each value's set.
+"""
+
+import numpy as np
+
+_WORD_BITS = 64
+# Constants for count().
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _get_word_count(size):
+    return (size + _WORD_BITS - 1) // _WORD_BITS
+
+
+def mask_to_bitset(mask):
+    """Returns a bitset with the bits of a bool array set."""
+    mask = np.asarray(mask, dtype=bool)
+    padded = np.zeros(_get_word_count(len(mask)) * _WORD_BITS, dtype=bool)
+    padded[:len(mask)] = mask
+    return np.packbits(padded, bitorder='little').view('<u8')
+
+
+def bitset_to_mask(bitset, size):
+    """Returns a bool array of the first size bits of bitset."""
+    return np.unpackbits(bitset.view(np.uint8),
+                         bitorder='little')[:size].astype(bool)
+
+
+def ordinals_to_bitset(ordinals, size):
+    mask = np.zeros(size, dtype=bool)
+    mask[ordinals] = True
+    return mask_to_bitset(mask)
+
+
+def bitset_to_ordinals(bitset, size):
+    return np.flatnonzero(bitset_to_mask(bitset, size))
+
+
+def count(bitset):
+    """Returns the number of bits set in bitset."""
+    # Per word popcount, from "Bit Twiddling Hacks".
+    words = bitset - ((bitset >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return int(((words * _H01) >> np.uint64(56)).sum())
+
+
+def contains(bitset, ordinals):
+    """Returns a bool array of whether each of ordinals is in bitset."""
+    # Unpacking and indexing is faster than shifting words per ordinal.
+    return np.unpackbits(bitset.view(np.uint8),
+                         bitorder='little').view(bool)[ordinals]
+
+
+def intersect(bitsets):
+    """Returns the AND of bitsets, or None (all entities) if there are none."""
+    result = None
+    for bitset in bitsets:
+        result = bitset.copy() if result is None else result & bitset
+    return result
+
+
+class Postings(object):
+    """Sets of entities for each value code of a column."""
+    def __init__(self, codes, entities, code_count, size):
+        """
+        :param codes: Array of value codes in [0, code_count).
+        :param entities: Array of entity ordinals in [0, size), parallel to
+          codes. Duplicate (code, entity) pairs are counted once.
+        :param code_count: Number of value codes.
+        :param size: Number of entities.
+        """
+        self.size = size
+        codes = np.asarray(codes, dtype=np.int64)
+        entities = np.asarray(entities, dtype=np.int64)
+        if len(codes):
+            order = np.lexsort((entities, codes))
+            codes = codes[order]
+            entities = entities[order]
+            keep = np.ones(len(codes), dtype=bool)
+            keep[1:] = (codes[1:] != codes[:-1]) | (entities[1:] !=
+                                                    entities[:-1])
+            codes = codes[keep]
+            entities = entities[keep]
+        # Number of entities with each value.
+        self.counts = np.bincount(codes, minlength=code_count)
+
+        # A sorted array takes 32 bits per entity, and a bitset 1 bit per
+        # entity in the index.
+        is_dense = self.counts * 32 > size
+        self._bitsets = {}
+        for code in np.flatnonzero(is_dense):
+            self._bitsets[int(code)] = ordinals_to_bitset(
+                entities[codes == code], size)
+        is_sparse = ~is_dense[codes]
+        # Sparse sets, concatenated in code order.
+        self._sparse_codes = codes[is_sparse]
+        self._sparse_entities = entities[is_sparse].astype(np.uint32)
+        self._sparse_starts = np.searchsorted(self._sparse_codes,
+                                              np.arange(code_count + 1))
+
+    def get_bitset(self, codes):
+        """Returns the OR of the sets of codes, as a bitset."""
+        mask = np.zeros(self.size, dtype=bool)
+        for code in codes:
+            mask[self._sparse_entities[self._sparse_starts[code]:self.
+                                       _sparse_starts[code + 1]]] = True
+        bitset = mask_to_bitset(mask)
+        for code in codes:
+            if code in self._bitsets:
+                bitset |= self._bitsets[code]
+        return bitset
+
+    def get_counts(self, bitset):
+        """Returns the number of entities in bitset with each value code.
+
+        If bitset is None, counts all entities.
+        """
+        if bitset is None:
+            return self.counts
+        counts = np.zeros(len(self.counts), dtype=np.int64)
+        if len(self._sparse_entities):
+            # Sparse sets are contiguous, so their counts are differences of
+            # the cumulative sum of whether each entity is in bitset.
+            cumulative_counts = np.zeros(len(self._sparse_entities) + 1,
+                                         dtype=np.int64)
+            np.cumsum(contains(bitset, self._sparse_entities),
+                      out=cumulative_counts[1:])
+            counts = (cumulative_counts[self._sparse_starts[1:]] -
+                      cumulative_counts[self._sparse_starts[:-1]])
+        for code, code_bitset in self._bitsets.items():
+            counts[code] = count(code_bitset & bitset)
+        return counts
+
+    def map_codes(self, code_map, code_count):
+        """Returns Postings with each code replaced by code_map[code]."""
+        codes = [self._sparse_codes]
+        entities = [self._sparse_entities.astype(np.int64)]
+        for code, bitset in self._bitsets.items():
+            ordinals = bitset_to_ordinals(bitset, self.size)
+            codes.append(np.full(len(ordinals), code, dtype=np.int64))
+            entities.append(ordinals)
+        codes = np.concatenate(codes)
+        return Postings(code_map[codes], np.concatenate(entities), code_count,
+                        self.size)
@@ -0,0 +1,551 @@
+"""In-process facet engine for datasets that fit in memory.
+
+For datasets with facet_engine "columnar" in dataset.json, the documents of the
+main index are loaded into NumPy columns, and /facets searches are answered in
+process instead of by Elasticsearch aggregations. Results have the same shape
+as FacetsSearchTemplate.get_facets(): a dict from facet name to a list of
+(key, doc count, is selected) tuples, in Elasticsearch bucket order.
+
+Each mapped leaf field becomes a column with a sorted array of its distinct
+values, and compressed bitmaps (see bitmap_postings.py) of the entities with
+each value. Entities are documents, or nested documents for fields under a
+nested path. Numeric and boolean values are stored as floats. Time series
+fields are ordinary leaf fields, eg "table.AGE.1". Histogram facets use
+bitmaps of the entities in each bucket, built on first use of an interval.
+
+Filters are AND'ed across facets and OR'ed within a facet by combining
+bitmaps, and facet counts are sizes of bitmap intersections.
+
+Only TermsFacet and HistogramFacet, optionally in one level of NestedFacet,
+are supported. execute() returns None for other facets, and the caller falls
+back to Elasticsearch.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from elasticsearch import helpers
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+from flask import current_app
+
+from data_explorer.util import bitmap_postings
+from data_explorer.util import elasticsearch_util
+from data_explorer.util import index_generation
+from data_explorer.util import schema_catalog
+
+# Mapping types stored as numeric columns.
+_NUMERIC_TYPES = ('long', 'integer', 'short', 'byte', 'double', 'float',
+                  'half_float', 'scaled_float', 'boolean')
+# Mapping types stored as keyword columns.
+_KEYWORD_TYPES = ('text', 'keyword')
+# ignore_above of the ".keyword" sub-field of text fields. Longer values are not
+# indexed, so Elasticsearch doesn't count or match them.
+_TEXT_KEYWORD_IGNORE_ABOVE = 256
+# Elasticsearch's default terms aggregation size.
+_DEFAULT_TERMS_SIZE = 10
+
+# Index returned by get_columnar_index(). It is loaded in init() and reloaded
+# in the background when the index generation changes.
+_index = None
+_refreshing = False
+_lock = threading.Lock()
+
+
+def _to_number(value, field_type):
+    """Returns value as a float, or None if it can't be converted."""
+    if field_type == 'boolean':
+        if isinstance(value, str):
+            if value.lower() == 'true':
+                return 1.0
+            if value.lower() == 'false':
+                return 0.0
+            return None
+        return 1.0 if value else 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_field_precision(values, field_type):
+    """Rounds float64 values to the precision Elasticsearch stores.
+
+    float and half_float fields are stored with 32 and 16 bits, and widened to
+    doubles for aggregations and range queries.
+    """
+    if field_type == 'float':
+        return np.asarray(values, dtype=np.float32).astype(np.float64)
+    if field_type == 'half_float':
+        return np.asarray(values, dtype=np.float16).astype(np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _to_keyword(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class _Column(object):
+    """Values of one field, as postings of entities per distinct value."""
+    def __init__(self, field_type, nested_path, entities, values,
+                 entity_count):
+        """
+        :param entities: List of entity ordinals.
+        :param values: List of values, parallel to entities.
+        :param entity_count: Number of documents, or of nested documents for
+          fields under a nested path.
+        """
+        self.field_type = field_type
+        self.nested_path = nested_path
+        self.is_keyword = field_type in _KEYWORD_TYPES
+        if self.is_keyword:
+            if field_type == 'text':
+                pairs = [(entity, value)
+                         for entity, value in zip(entities, values)
+                         if len(value) <= _TEXT_KEYWORD_IGNORE_ABOVE]
+                entities = [entity for entity, _ in pairs]
+                values = [value for _, value in pairs]
+            values = np.array(values, dtype=object)
+        else:
+            values = _to_field_precision(values, field_type)
+        # Sorted, so code order is key order.
+        self.keys, codes = np.unique(values, return_inverse=True)
+        if self.is_keyword:
+            self.keys = self.keys.tolist()
+            self._codes_by_key = dict(
+                (key, code) for code, key in enumerate(self.keys))
+        self.postings = bitmap_postings.Postings(codes, entities,
+                                                 len(self.keys), entity_count)
+        # Histogram interval to (first bucket, Postings of bucket codes).
+        self._histogram_postings = {}
+
+    def get_codes(self, keys):
+        """Returns the codes of the keys that have values."""
+        if self.is_keyword:
+            return [
+                self._codes_by_key[key] for key in keys
+                if key in self._codes_by_key
+            ]
+        keys = np.asarray(keys, dtype=np.float64)
+        codes = np.searchsorted(self.keys, keys)
+        found = codes < len(self.keys)
+        found[found] = self.keys[codes[found]] == keys[found]
+        return codes[found].tolist()
+
+    def get_range_codes(self, lower, upper):
+        """Returns the codes of the keys in [lower, upper)."""
+        return np.flatnonzero((self.keys >= lower)
+                              & (self.keys < upper)).tolist()
+
+    def get_histogram_postings(self, interval):
+        """Returns the first bucket and Postings of bucket - first bucket.
+
+        Bucket codes are computed from the value codes on first use for each
+        interval.
+        """
+        if interval not in self._histogram_postings:
+            buckets = np.floor(self.keys / interval)
+            first_bucket = int(buckets.min()) if len(buckets) else 0
+            bucket_codes = (buckets - first_bucket).astype(np.int64)
+            bucket_count = int(bucket_codes.max()) + 1 if len(buckets) else 0
+            self._histogram_postings[interval] = (first_bucket,
+                                                  self.postings.map_codes(
+                                                      bucket_codes,
+                                                      bucket_count))
+        return self._histogram_postings[interval]
+
+
+class _FacetSpec(object):
+    """What a facet aggregates, parsed from its es_facet."""
+    def __init__(self, es_facet, column):
+        self.column = column
+        if hasattr(es_facet, '_inner'):
+            es_facet = es_facet._inner
+        self.is_histogram = isinstance(es_facet, HistogramFacet)
+        self.interval = es_facet._params.get('interval')
+        self.size = es_facet._params.get('size', _DEFAULT_TERMS_SIZE)
+
+
+class ColumnarIndex(object):
+    """Columns for every mapped field of the main index."""
+    def __init__(self, sources, catalog, generation=None):
+        """
+        :param sources: Iterable of document _source dicts.
+        :param catalog: schema_catalog.SchemaCatalog of the main index.
+        :param generation: The index generation sources were read at.
+        """
+        self.generation = generation
+        self._catalog = catalog
+        # Only top level nested paths are supported. Fields under deeper
+        # nested paths are skipped, so facets on them fall back to
+        # Elasticsearch.
+        self._nested_paths = set(path for path in catalog.nested_paths
+                                 if not any(
+                                     path.startswith(other + '.')
+                                     for other in catalog.nested_paths))
+        # Nested path to the parent document of each nested document.
+        nested_parents = dict((path, []) for path in self._nested_paths)
+        # Field name to ([entity], [value]).
+        field_values = {}
+
+        self.doc_count = 0
+        for source in sources:
+            self._add_values('', source, self.doc_count, None, nested_parents,
+                             field_values)
+            self.doc_count += 1
+
+        self._nested_parents = dict(
+            (path, np.array(parents, dtype=np.int64))
+            for path, parents in nested_parents.items())
+        self._columns = {}
+        for field_name, (entities, values) in field_values.items():
+            field = catalog.get_field(field_name)
+            self._columns[field_name] = _Column(
+                field.type, field.nested_path, entities, values,
+                self._get_entity_count(field.nested_path))
+
+    def _add_values(self, prefix, source, entity, nested_path, nested_parents,
+                    field_values):
+        for key, value in source.items():
+            field_name = prefix + key
+            items = value if isinstance(value, list) else [value]
+            if field_name in self._nested_paths and nested_path is None:
+                for item in items:
+                    if isinstance(item, dict):
+                        nested_entity = len(nested_parents[field_name])
+                        nested_parents[field_name].append(entity)
+                        self._add_values(field_name + '.', item, nested_entity,
+                                         field_name, nested_parents,
+                                         field_values)
+                continue
+            if field_name not in self._catalog:
+                # Not in the mapping, so not indexed.
+                continue
+            field = self._catalog.get_field(field_name)
+            if field.nested_path != nested_path:
+                # Under an unsupported nested path.
+                continue
+            for item in items:
+                if isinstance(item, dict):
+                    self._add_values(field_name + '.', item, entity,
+                                     nested_path, nested_parents, field_values)
+                elif item is not None:
+                    if field.type in _KEYWORD_TYPES:
+                        item = _to_keyword(item)
+                    elif field.type in _NUMERIC_TYPES:
+                        item = _to_number(item, field.type)
+                        if item is None:
+                            continue
+                    else:
+                        continue
+                    entities, values = field_values.setdefault(
+                        field_name, ([], []))
+                    entities.append(entity)
+                    values.append(item)
+
+    def _get_column(self, field):
+        if field.endswith('.keyword'):
+            base_field = field[:-len('.keyword')]
+            if (base_field in self._catalog
+                    and self._catalog.get_field(base_field).type == 'text'):
+                field = base_field
+        if field not in self._catalog:
+            return None
+        column = self._columns.get(field)
+        if column is None:
+            # Mapped, but no document has a value.
+            field_info = self._catalog.get_field(field)
+            if (field_info.nested_path is not None
+                    and field_info.nested_path not in self._nested_paths):
+                return None
+            column = _Column(field_info.type, field_info.nested_path, [], [],
+                             self._get_entity_count(field_info.nested_path))
+        return column
+
+    def _get_entity_count(self, nested_path):
+        if nested_path is None:
+            return self.doc_count
+        return len(self._nested_parents[nested_path])
+
+    def _get_facet_spec(self, es_facet):
+        """Returns a _FacetSpec for es_facet, or None if it isn't supported."""
+        nested_path = None
+        if hasattr(es_facet, '_inner'):
+            nested_path = es_facet._path
+            es_facet = es_facet._inner
+            if hasattr(es_facet, '_inner'):
+                return None
+        if not isinstance(es_facet, (TermsFacet, HistogramFacet)):
+            return None
+        column = self._get_column(es_facet._params['field'])
+        if column is None or column.nested_path != nested_path:
+            return None
+        if isinstance(es_facet, HistogramFacet) and column.is_keyword:
+            return None
+        return _FacetSpec(es_facet, column)
+
+    def _get_entity_bitset(self, column, doc_bitset):
+        """Returns the entities of column in doc_bitset, as a bitset."""
+        if column.nested_path is None or doc_bitset is None:
+            return doc_bitset
+        return bitmap_postings.mask_to_bitset(
+            bitmap_postings.contains(doc_bitset,
+                                     self._nested_parents[column.nested_path]))
+
+    def _get_filter_bitset(self, spec, filter_values):
+        """Returns the documents matching any of filter_values, as a bitset."""
+        column = spec.column
+        if spec.is_histogram:
+            codes = []
+            for filter_value in filter_values:
+                lower, upper = _to_field_precision(
+                    [filter_value, filter_value + spec.interval],
+                    column.field_type)
+                codes.extend(column.get_range_codes(lower, upper))
+        elif column.is_keyword:
+            codes = column.get_codes(
+                [_to_keyword(value) for value in filter_values])
+        else:
+            numbers = [
+                number for number in [
+                    _to_number(value, column.field_type)
+                    for value in filter_values
+                ] if number is not None
+            ]
+            codes = column.get_codes(
+                _to_field_precision(numbers, column.field_type))
+
+        entity_bitset = column.postings.get_bitset(codes)
+        if column.nested_path is None:
+            return entity_bitset
+        entities = bitmap_postings.bitset_to_ordinals(entity_bitset,
+                                                      column.postings.size)
+        return bitmap_postings.ordinals_to_bitset(
+            self._nested_parents[column.nested_path][entities], self.doc_count)
+
+    def _get_terms_values(self, spec, entity_bitset, filter_values):
+        column = spec.column
+        counts = column.postings.get_counts(entity_bitset)
+        codes = np.flatnonzero(counts)
+        counts = counts[codes]
+        # Elasticsearch orders terms buckets by doc count, then key. Codes are
+        # in key order.
+        order = np.lexsort((codes, -counts))[:spec.size]
+
+        values = []
+        for i in order:
+            key = column.keys[codes[i]]
+            if column.field_type in ('double', 'float', 'half_float',
+                                     'scaled_float'):
+                key = float(key)
+            elif not column.is_keyword:
+                key = int(key)
+            values.append((key, int(counts[i]), key in filter_values))
+        return values
+
+    def _get_histogram_values(self, spec, entity_bitset, filter_values):
+        first_bucket, postings = spec.column.get_histogram_postings(
+            spec.interval)
+        counts = postings.get_counts(entity_bitset)
+        nonzero = np.flatnonzero(counts)
+        if not len(nonzero):
+            return []
+        values = []
+        # Like Elasticsearch's histogram min_doc_count of 0, include empty
+        # buckets between the first and last non-empty bucket.
+        for i in range(nonzero[0], nonzero[-1] + 1):
+            # Elasticsearch histogram keys are doubles.
+            key = float(first_bucket + i) * spec.interval
+            values.append((key, int(counts[i]), key in filter_values))
+        return values
+
+    def prepare(self, es_facets):
+        """Builds the histogram bitmaps of es_facets ahead of searches."""
+        for facet_info in es_facets.values():
+            spec = self._get_facet_spec(facet_info['es_facet'])
+            if spec is not None and spec.is_histogram:
+                spec.column.get_histogram_postings(spec.interval)
+
+    def execute(self, filters, es_facets, aggregated_facet_names=None):
+        """Computes facet values like FacetsSearchTemplate searches.
+
+        Args:
+          filters: Dict from es_field_name to list of facet values
+          es_facets: A dict of facet info's. For facet info structure, see
+            app.app.config['FACET_INFO'] in __main__.py
+          aggregated_facet_names: Names of the facets in es_facets to compute
+            values for, or None for all
+
+        Returns:
+          1) Dict from es_field_name to list of (value, count, is_selected)
+          2) Number of documents matching filters
+          Returns None if any aggregated or filtered facet isn't supported.
+        """
+        if aggregated_facet_names is None:
+            aggregated_facet_names = list(es_facets.keys())
+        specs = {}
+        for name in list(aggregated_facet_names) + [
+                name
+                for name, filter_values in filters.items() if filter_values
+        ]:
+            spec = self._get_facet_spec(es_facets[name]['es_facet'])
+            if spec is None:
+                return None
+            specs[name] = spec
+
+        filter_bitsets = {}
+        for name, filter_values in filters.items():
+            if filter_values:
+                filter_bitsets[name] = self._get_filter_bitset(
+                    specs[name], filter_values)
+        # None means all documents.
+        all_filters_bitset = bitmap_postings.intersect(filter_bitsets.values())
+        # Nested path to entities in all_filters_bitset.
+        all_filters_entity_bitsets = {}
+
+        facets = {}
+        for name in aggregated_facet_names:
+            spec = specs[name]
+            if name in filter_bitsets:
+                # Like FacetedSearch, a facet's own filter doesn't apply to it.
+                entity_bitset = self._get_entity_bitset(
+                    spec.column,
+                    bitmap_postings.intersect(
+                        bitset
+                        for other_name, bitset in filter_bitsets.items()
+                        if other_name != name))
+            else:
+                nested_path = spec.column.nested_path
+                if nested_path not in all_filters_entity_bitsets:
+                    all_filters_entity_bitsets[
+                        nested_path] = self._get_entity_bitset(
+                            spec.column, all_filters_bitset)
+                entity_bitset = all_filters_entity_bitsets[nested_path]
+            filter_values = filters.get(name, ())
+            if spec.is_histogram:
+                facets[name] = self._get_histogram_values(
+                    spec, entity_bitset, filter_values)
+            else:
+                facets[name] = self._get_terms_values(spec, entity_bitset,
+                                                      filter_values)
+        if all_filters_bitset is None:
+            return facets, self.doc_count
+        return facets, bitmap_postings.count(all_filters_bitset)
+
+    def count(self, filters, es_facets):
+        """Returns the number of documents matching filters.
+
+        Returns None if the facet of any filter isn't supported.
+        """
+        filter_bitsets = []
+        for name, filter_values in filters.items():
+            if not filter_values:
+                continue
+            spec = self._get_facet_spec(es_facets[name]['es_facet'])
+            if spec is None:
+                return None
+            filter_bitsets.append(self._get_filter_bitset(spec, filter_values))
+        all_filters_bitset = bitmap_postings.intersect(filter_bitsets)
+        if all_filters_bitset is None:
+            return self.doc_count
+        return bitmap_postings.count(all_filters_bitset)
+
+
+def _read_index_file(index_path):
+    with open(index_path) as f:
+        for line in f:
+            # See elasticsearch_util._get_index_actions().
+            yield json.loads(line)['_source']
+
+
+def _scan_index(es):
+    for hit in helpers.scan(es,
+                            index=current_app.config['INDEX_NAME'],
+                            query={'query': {
+                                'match_all': {}
+                            }}):
+        yield hit['_source']
+
+
+def _load(index_path=None):
+    generation = index_generation.get_index_generation()
+    catalog = schema_catalog.get_schema_catalog()
+    if index_path and os.path.isfile(index_path):
+        sources = _read_index_file(index_path)
+    else:
+        sources = _scan_index(elasticsearch_util.get_elasticsearch())
+    index = ColumnarIndex(sources, catalog, generation)
+    index.prepare(current_app.config['FACET_INFO'])
+    current_app.logger.info('Loaded %d documents into columnar facet engine.' %
+                            index.doc_count)
+    return index
+
+
+def init(index_path=None):
+    """Loads the main index, from index_path if it exists.
+
+    Called from init(), so with gunicorn preload the columns are loaded once
+    and shared by all workers.
+    """
+    global _index
+    index = _load(index_path)
+    with _lock:
+        _index = index
+
+
+def _refresh(app):
+    global _index, _refreshing
+    with app.app_context():
+        try:
+            index = _load()
+            with _lock:
+                _index = index
+        except Exception:
+            app.logger.exception('Could not reload columnar facet engine.')
+        finally:
+            with _lock:
+                _refreshing = False
+
+
+def get_columnar_index():
+    """Returns the ColumnarIndex.
+
+    If the index generation has changed since it was loaded, starts reloading
+    it from Elasticsearch in a background thread. Until that finishes, the
+    previous ColumnarIndex is returned, or None if none was loaded.
+    """
+    global _refreshing
+    generation = index_generation.get_index_generation()
+    with _lock:
+        if ((_index is None or _index.generation != generation)
+                and not _refreshing):
+            _refreshing = True
+            # Threads don't survive fork, so start one on demand in the worker
+            # rather than in init().
+            threading.Thread(target=_refresh,
+                             args=(current_app._get_current_object(), ),
+                             daemon=True).start()
+        return _index
+
+
+def execute(filters, es_facets, aggregated_facet_names=None):
+    """Returns ColumnarIndex.execute() for the current index, or None if no
+    index is loaded."""
+    index = get_columnar_index()
+    if index is None:
+        return None
+    return index.execute(filters, es_facets, aggregated_facet_names)
+
+
+def count(filters, es_facets):
+    """Returns ColumnarIndex.count() for the current index, or None if no
+    index is loaded."""
+    index = get_columnar_index()
+    if index is None:
+        return None
+    return index.count(filters, es_facets)
@@ -1,32 +1,549 @@
-"""Subclass of FacetedSearch for Data Explorer datasets."""
+"""Elasticsearch faceted searches for Data Explorer datasets."""
 
+import concurrent.futures
+import math
+import threading
+import time
+
+from cachetools import LRUCache
 from collections import OrderedDict
 from flask import current_app
 
-from elasticsearch import Elasticsearch
-from elasticsearch_dsl import FacetedSearch
+from elasticsearch.exceptions import TransportError
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import Q
+from elasticsearch_dsl import TermsFacet
+from elasticsearch_dsl.faceted_search import NestedFacet
+from elasticsearch_dsl.utils import AttrDict
+
+from data_explorer.util import columnar_facets
+from data_explorer.util import elasticsearch_util
+
+# Name of the filter aggregation shared by all facets without a selection.
+# Facets with a selection use '_filter_<facet name>', like FacetedSearch, so
+# this can't clash with them.
+SHARED_FILTER_AGG_NAME = '_shared_filter'
+# Name of the sampler aggregation wrapping facet aggregations in approximate
+# searches.
+SAMPLER_AGG_NAME = '_sample'
+
+# Templates returned by get_search_template(), keyed by facet set.
+_templates = LRUCache(maxsize=100)
+_templates_lock = threading.Lock()
+
+
+def get_filter_query(facet, filter_values):
+    """Returns the filter query of facet for filter_values.
+
+    Like Facet.add_filter(), but the selected buckets of a histogram facet are
+    merged into as few range queries as possible, so selecting "20-29",
+    "30-39" and "40-49" filters on one range instead of three.
+    """
+    if isinstance(facet, NestedFacet):
+        inner_query = get_filter_query(facet._inner, filter_values)
+        if inner_query:
+            return Q('nested', path=facet._path, query=inner_query)
+        return None
+    if not isinstance(facet, HistogramFacet):
+        return facet.add_filter(filter_values)
+    if not filter_values:
+        return None
+
+    filter_query = None
+    for low, high in elasticsearch_util.merge_histogram_ranges(
+            filter_values, facet._params['interval']):
+        range_query = Q('range',
+                        **{facet._params['field']: {
+                               'gte': low,
+                               'lt': high
+                           }})
+        if filter_query is None:
+            filter_query = range_query
+        else:
+            filter_query |= range_query
+    return filter_query
+
+
+def _get_filter_queries(facets, filters):
+    """Returns a dict from facet name to filter query for filters.
 
+    :param facets: a dict from facet name to es_facet.
+    """
+    filter_queries = OrderedDict()
+    for name, filter_values in filters.items():
+        # Like Facet.add_filter(), with histogram buckets merged.
+        filter_query = get_filter_query(facets[name], filter_values)
+        if filter_query is not None:
+            filter_queries[name] = filter_query
+    return filter_queries
 
-class DatasetFacetedSearch(FacetedSearch):
-    """Subclass of FacetedSearch for Datasets."""
-    def __init__(self, filters={}, es_facets={}):
+
+def _get_combined_filter(filter_queries, excluded_name):
+    """Returns the AND of all filter queries except excluded_name's."""
+    combined_filter = Q('match_all')
+    for name, facet_filter in filter_queries.items():
+        if name != excluded_name:
+            combined_filter &= facet_filter
+    return combined_filter
+
+
+class FacetsSearchTemplate(object):
+    """/facets request body, compiled once per set of facets.
+
+    Only the filters change between requests, so a template serializes the
+    aggregation of each facet once. get_body() adds the filters of a request,
+    and the body is sent with the low-level client.
+
+    Like elasticsearch-dsl's FacetedSearch, a facet's own filter doesn't apply
+    to its aggregation. FacetedSearch wraps every facet in its own filter
+    aggregation, made of the filters of all other facets. That makes the
+    request O(facets * filters), and Elasticsearch evaluates the same filter
+    once per facet. The effective filter of a facet without a selection is
+    all filters, so those facets share one filter aggregation. Only facets
+    with a selection get their own.
+    """
+    def __init__(self, es_facets, aggregated_facet_names=None):
         """
+        :param es_facets: a dict of facets to perform faceted search on.
+        :param aggregated_facet_names: names of the facets in es_facets to
+        return values for. Defaults to all. filters may be for any facet in
+        es_facets.
+        """
+        self.facets = dict((name, facet_info['es_facet'])
+                           for name, facet_info in es_facets.items())
+        if aggregated_facet_names is None:
+            aggregated_facet_names = list(es_facets.keys())
+        self.aggregated_facet_names = aggregated_facet_names
+        # Shared by all bodies, so must not be modified.
+        self._aggs = OrderedDict(
+            (name, self.facets[name].get_aggregation().to_dict())
+            for name in aggregated_facet_names)
+
+    def get_body(self, filters, sample_shard_size=None):
+        """Returns the request body for filters.
+
+        Unlike FacetedSearch, doesn't request highlighting, which does nothing
+        without hits.
+
+        If sample_shard_size is set, facet aggregations only count a random
+        sample of sample_shard_size matching documents per shard; see
+        get_approximate_facets().
+
         :param filters: a dictionary of facet_name:[object] values to filter
         the query on.
         Ex: {'project_id.dataset_id.table_name.Region':['southeast', 'northwest'], 'project_id.dataset_id.table_name.Gender':['male']}.
-        :param es_facets: a dict of facets to perform faceted search on.
+        :param sample_shard_size: documents per shard to sample, or None to
+        count all documents.
+        """
+        body = {'size': 0}
+        if sample_shard_size is not None:
+            # The sampler aggregation takes the top scoring documents, so give
+            # documents random scores. With a fixed seed, the sample is the
+            # same for every request.
+            body['query'] = {
+                'function_score': {
+                    'random_score': {
+                        'seed': 0,
+                        'field': '_seq_no'
+                    }
+                }
+            }
+
+        def sample(aggs):
+            if sample_shard_size is None:
+                return aggs
+            return {
+                SAMPLER_AGG_NAME: {
+                    'sampler': {
+                        'shard_size': sample_shard_size
+                    },
+                    'aggs': aggs
+                }
+            }
+
+        filter_queries = _get_filter_queries(self.facets, filters)
+        if not filter_queries:
+            body['aggs'] = sample(self._aggs)
+            return body
+
+        body['post_filter'] = _get_combined_filter(filter_queries,
+                                                   None).to_dict()
+        aggs = {}
+        for name, agg in self._aggs.items():
+            if name in filter_queries:
+                aggs['_filter_' + name] = {
+                    'filter': _get_combined_filter(filter_queries,
+                                                   name).to_dict(),
+                    'aggs': {
+                        name: agg
+                    }
+                }
+            else:
+                if SHARED_FILTER_AGG_NAME not in aggs:
+                    aggs[SHARED_FILTER_AGG_NAME] = {
+                        'filter': body['post_filter'],
+                        'aggs': {}
+                    }
+                aggs[SHARED_FILTER_AGG_NAME]['aggs'][name] = agg
+        for filter_agg in aggs.values():
+            filter_agg['aggs'] = sample(filter_agg['aggs'])
+        body['aggs'] = aggs
+        return body
+
+    def get_facets(self, filters, aggregations):
+        """Returns a dict from facet name to a list of (key, doc count, is
+        selected) tuples, like FacetedResponse.facets.
+
+        :param filters: the filters passed to get_body().
+        :param aggregations: the aggregations of the response.
         """
-        self.index = current_app.config['INDEX_NAME']
-        self.facets = dict([
-            (elasticsearch_field_name, field['es_facet'])
-            for elasticsearch_field_name, field in list(es_facets.items())
-        ])
-        self.using = Elasticsearch(current_app.config['ELASTICSEARCH_URL'])
-        # Now that using is set, create _s.
-        super(DatasetFacetedSearch, self).__init__(None, filters)
-
-    def search(self):
-        s = super(DatasetFacetedSearch, self).search()
-        # Don't execute query; we only care about aggregations. See
-        # https://www.elastic.co/guide/en/elasticsearch/reference/current/returning-only-agg-results.html
-        return s.params(size=0)
+        aggregations = AttrDict(aggregations)
+        filtered_names = set(name for name, filter_values in filters.items()
+                             if filter_values)
+        facets = {}
+        for name in self.aggregated_facet_names:
+            data = aggregations
+            if name in filtered_names:
+                data = data['_filter_' + name]
+            elif filtered_names:
+                data = data[SHARED_FILTER_AGG_NAME]
+            facets[name] = self.facets[name].get_values(
+                data[name], filters.get(name, ()))
+        return facets
+
+    def get_approximate_facets(self, filters, aggregations, total):
+        """Returns estimated facet values and their standard errors.
+
+        For the response to get_body(filters, sample_shard_size). Counts in
+        the sample are scaled up by the number of documents the sample was
+        drawn from divided by the sample size. The standard error of a count
+        is that of a proportion estimated from a simple random sample, scaled
+        the same way.
+
+        :param filters: the filters passed to get_body().
+        :param aggregations: the aggregations of the response.
+        :param total: the number of documents in the index, which is the
+        number the sample was drawn from if there are no filters.
+
+        Returns:
+          1) Dict from facet name to list of (value, estimated count,
+             is_selected), like get_facets()
+          2) Dict from facet name to list of standard errors, parallel to 1)
+        """
+        filtered_names = set(name for name, filter_values in filters.items()
+                             if filter_values)
+        facets = {}
+        errors = {}
+        for name in self.aggregated_facet_names:
+            data = aggregations
+            population_size = total
+            if filtered_names:
+                data = data['_filter_' + name if name in
+                            filtered_names else SHARED_FILTER_AGG_NAME]
+                population_size = data['doc_count']
+            data = data[SAMPLER_AGG_NAME]
+            sample_size = data['doc_count']
+            values = self.facets[name].get_values(AttrDict(data[name]),
+                                                  filters.get(name, ()))
+            if not sample_size:
+                facets[name] = values
+                errors[name] = [0] * len(values)
+                continue
+            scale = population_size / float(sample_size)
+            # Finite population correction, so a sample of all documents has
+            # no error.
+            correction = (population_size - sample_size) / float(
+                max(population_size - 1, 1))
+            facets[name] = [(value, int(round(count * scale)), is_selected)
+                            for value, count, is_selected in values]
+            errors[name] = []
+            for _, count, _ in values:
+                # Nested facets count nested documents, so count may exceed
+                # sample_size.
+                proportion = min(count / float(sample_size), 1.0)
+                errors[name].append(
+                    int(
+                        round(scale *
+                              math.sqrt(sample_size * proportion *
+                                        (1 - proportion) * correction))))
+        return facets, errors
+
+
+def get_search_template(es_facets, aggregated_facet_names=None):
+    """Returns the FacetsSearchTemplate for es_facets, compiled on first use.
+
+    Templates are keyed by the ids of the facet objects. A template references
+    its facets, so their ids aren't reused while it is cached.
+    """
+    key = (tuple((name, id(facet_info['es_facet']))
+                 for name, facet_info in es_facets.items()),
+           tuple(aggregated_facet_names)
+           if aggregated_facet_names is not None else None)
+    with _templates_lock:
+        template = _templates.get(key)
+    if template is None:
+        template = FacetsSearchTemplate(es_facets, aggregated_facet_names)
+        with _templates_lock:
+            _templates[key] = template
+    return template
+
+
+def get_terms_page(filters, es_facets, name, after=None, page_size=100):
+    """Returns a page of the values of terms facet name, in value order.
+
+    /facets returns at most TERMS_FACET_MAX_SIZE values of a terms facet. This
+    pages through all values with a composite aggregation. Like /facets,
+    counts are of documents matching all filters except the facet's own.
+
+    Args:
+      filters: Dict from es_field_name to list of facet values
+      es_facets: A dict of facet info's, including name. For facet info
+        structure, see app.app.config['FACET_INFO'] in __main__.py
+      name: es_field_name of the facet to page through
+      after: The last value of the previous page, or None for the first page
+      page_size: Maximum number of values to return
+
+    Returns:
+      1) List of (value, count)
+      2) The value to pass as after for the next page, or None if this is the
+         last page
+
+    Raises:
+      ValueError if the facet isn't a terms facet on a non-nested field.
+      Composite aggregations can't be nested in Elasticsearch 6.
+    """
+    facet = es_facets[name]['es_facet']
+    if not isinstance(facet, TermsFacet):
+        raise ValueError('%s is not a non-nested terms facet.' % name)
+    facets = dict((facet_name, facet_info['es_facet'])
+                  for facet_name, facet_info in es_facets.items())
+    filter_queries = _get_filter_queries(facets, filters)
+
+    composite = {
+        'size': page_size,
+        'sources': [{
+            'value': {
+                'terms': {
+                    'field': facet._params['field']
+                }
+            }
+        }]
+    }
+    if after is not None:
+        composite['after'] = {'value': after}
+    body = {
+        'size': 0,
+        'query': _get_combined_filter(filter_queries, name).to_dict(),
+        'aggs': {
+            'values': {
+                'composite': composite
+            }
+        }
+    }
+    raw_response = elasticsearch_util.get_elasticsearch().search(
+        index=current_app.config['INDEX_NAME'], body=body)
+
+    buckets = raw_response['aggregations']['values']['buckets']
+    values = [(bucket['key']['value'], bucket['doc_count'])
+              for bucket in buckets]
+    if len(buckets) < page_size:
+        return values, None
+    return values, buckets[-1]['key']['value']
+
+
+def execute_count(filters, es_facets):
+    """Returns the number of documents matching filters.
+
+    Unlike execute_facets_search(), runs no aggregations, so this is fast even
+    when facet counts are slow. Uses the columnar facet engine if the dataset
+    uses it and it supports all filtered facets.
+
+    Args:
+      filters: Dict from es_field_name to list of facet values
+      es_facets: A dict of facet info's, including the facets of filters. For
+        facet info structure, see app.app.config['FACET_INFO'] in __main__.py
+    """
+    if current_app.config['FACET_ENGINE'] == 'columnar':
+        count = columnar_facets.count(filters, es_facets)
+        if count is not None:
+            return count
+
+    facets = dict((name, facet_info['es_facet'])
+                  for name, facet_info in es_facets.items())
+    filter_queries = _get_filter_queries(facets, filters)
+    body = {'query': _get_combined_filter(filter_queries, None).to_dict()}
+    return elasticsearch_util.get_elasticsearch().count(
+        index=current_app.config['INDEX_NAME'], body=body)['count']
+
+
+def _split_facets(es_facets, group_size):
+    """Splits es_facets into groups of at most group_size facets.
+
+    Groups differ in size by at most one facet.
+    """
+    items = list(es_facets.items())
+    group_count = int(math.ceil(len(items) / float(group_size)))
+    groups = []
+    start = 0
+    for i in range(group_count):
+        end = start + (len(items) - start) // (group_count - i)
+        groups.append(OrderedDict(items[start:end]))
+        start = end
+    return groups
+
+
+def _execute_msearch(es, index, bodies):
+    """Executes searches in one _msearch request.
+
+    Returns a list of (raw response, Elasticsearch took in ms).
+    """
+    body = []
+    for search_body in bodies:
+        body.extend([{}, search_body])
+    raw_responses = es.msearch(index=index, body=body)['responses']
+    for raw_response in raw_responses:
+        if 'error' in raw_response:
+            raise TransportError('N/A', raw_response['error']['type'],
+                                 raw_response['error'])
+    return [(raw_response, raw_response['took'])
+            for raw_response in raw_responses]
+
+
+def _execute_timed(es, index, body):
+    start = time.time()
+    raw_response = es.search(index=index, body=body)
+    return raw_response, (time.time() - start) * 1000
+
+
+def _execute_concurrently(es, index, bodies, concurrency):
+    """Executes searches on a thread pool.
+
+    Returns a list of (raw response, wall time in ms).
+    """
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        return list(
+            executor.map(lambda body: _execute_timed(es, index, body), bodies))
+
+
+def _execute_templates(es_facets, aggregated_facet_names, get_body):
+    """Runs the searches for es_facets.
+
+    If there are more than FACETS_SEARCH_GROUP_SIZE aggregated facets, they
+    are split into groups with one search per group. The searches are sent in
+    one _msearch request, or concurrently from FACETS_SEARCH_CONCURRENCY
+    threads, depending on FACETS_SEARCH_MODE.
+
+    Args:
+      es_facets: A dict of facet info's. For facet info structure, see
+        app.app.config['FACET_INFO'] in __main__.py
+      aggregated_facet_names: Names of the facets in es_facets to return
+        values for, or None for all
+      get_body: Function from FacetsSearchTemplate to request body
+
+    Returns:
+      List of (FacetsSearchTemplate, raw response)
+    """
+    es = elasticsearch_util.get_elasticsearch()
+    index = current_app.config['INDEX_NAME']
+    group_size = current_app.config['FACETS_SEARCH_GROUP_SIZE']
+    if aggregated_facet_names is None:
+        aggregated_facets = es_facets
+    else:
+        aggregated_facets = OrderedDict(
+            (name, es_facets[name]) for name in aggregated_facet_names)
+    if not group_size or len(aggregated_facets) <= group_size:
+        template = get_search_template(es_facets, aggregated_facet_names)
+        return [(template, es.search(index=index, body=get_body(template)))]
+
+    groups = _split_facets(aggregated_facets, group_size)
+    templates = [
+        get_search_template(es_facets, list(group.keys())) for group in groups
+    ]
+    bodies = [get_body(template) for template in templates]
+    mode = current_app.config['FACETS_SEARCH_MODE']
+    if mode == 'msearch':
+        results = _execute_msearch(es, index, bodies)
+    else:
+        results = _execute_concurrently(
+            es, index, bodies, current_app.config['FACETS_SEARCH_CONCURRENCY'])
+    current_app.logger.info(
+        'Facets search (%s): %s' %
+        (mode, ', '.join('%d facets in %d ms' % (len(group), took)
+                         for group, (_, took) in zip(groups, results))))
+    return [(template, raw_response)
+            for template, (raw_response, _) in zip(templates, results)]
+
+
+def execute_facets_search(filters, es_facets, aggregated_facet_names=None):
+    """Runs a faceted search for es_facets.
+
+    If the dataset uses the columnar facet engine and it supports all facets,
+    the search runs in process; see columnar_facets.py. Otherwise, request
+    bodies are built from FacetsSearchTemplates and sent by
+    _execute_templates().
+
+    Args:
+      filters: Dict from es_field_name to list of facet values
+      es_facets: A dict of facet info's, including the facets of filters. For
+        facet info structure, see app.app.config['FACET_INFO'] in __main__.py
+      aggregated_facet_names: Names of the facets in es_facets to return
+        values for, or None for all. Only these facets are aggregated, but
+        filters may be for any facet in es_facets.
+
+    Returns:
+      1) Dict from es_field_name to list of (value, count, is_selected), for
+         aggregated_facet_names
+      2) Number of documents matching filters
+    """
+    if current_app.config['FACET_ENGINE'] == 'columnar':
+        result = columnar_facets.execute(filters, es_facets,
+                                         aggregated_facet_names)
+        if result is not None:
+            return result
+
+    results = _execute_templates(es_facets, aggregated_facet_names,
+                                 lambda template: template.get_body(filters))
+    es_response_facets = {}
+    for template, raw_response in results:
+        es_response_facets.update(
+            template.get_facets(filters, raw_response.get('aggregations', {})))
+    # Every search has the same post_filter, so the same count.
+    return es_response_facets, results[0][1]['hits']['total']
+
+
+def execute_approximate_facets_search(filters,
+                                      es_facets,
+                                      aggregated_facet_names=None):
+    """Like execute_facets_search(), but facet counts may be estimated.
+
+    Facet aggregations only count a sample of APPROXIMATE_FACETS_SHARD_SIZE
+    matching documents per shard. The number of documents matching filters
+    is still exact. The columnar facet engine always computes exact counts.
+
+    Returns:
+      1) Dict from es_field_name to list of (value, count, is_selected)
+      2) Number of documents matching filters
+      3) Dict from es_field_name to list of standard errors of the counts in
+         1), or None if the counts are exact
+    """
+    if current_app.config['FACET_ENGINE'] == 'columnar':
+        result = columnar_facets.execute(filters, es_facets,
+                                         aggregated_facet_names)
+        if result is not None:
+            return result[0], result[1], None
+
+    shard_size = current_app.config['APPROXIMATE_FACETS_SHARD_SIZE']
+    results = _execute_templates(
+        es_facets, aggregated_facet_names,
+        lambda template: template.get_body(filters, shard_size))
+    count = results[0][1]['hits']['total']
+    es_response_facets = {}
+    errors = {}
+    for template, raw_response in results:
+        # Without filters, there is no post_filter, so count is the number
+        # of documents in the index.
+        facets, facet_errors = template.get_approximate_facets(
+            filters, raw_response.get('aggregations', {}), count)
+        es_response_facets.update(facets)
+        errors.update(facet_errors)
+    return es_response_facets, count, errors
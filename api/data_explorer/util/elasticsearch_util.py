@@ -1,8 +1,18 @@
+import contextlib
+import fcntl
+import hashlib
 import json
 import math
+import os
+import tempfile
+import threading
+import time
 import urllib.parse
 
-from elasticsearch import helpers, NotFoundError
+from collections import OrderedDict
+from elasticsearch import Elasticsearch
+from elasticsearch import helpers
+from elasticsearch_dsl import MultiSearch
 from elasticsearch_dsl import Search
 from elasticsearch_dsl import HistogramFacet
 from elasticsearch_dsl import TermsFacet
@@ -19,41 +29,149 @@ from .filters_facet import FiltersFacet
 
 from flask import current_app
 
+# Maximum number of fields whose metrics are computed by one search in
+# get_field_metrics(). Each field adds up to three metric aggregations.
+_METRICS_FIELDS_PER_SEARCH = 100
 
-def _get_metrics(es, field_name):
-    search = Search(using=es, index=current_app.config['INDEX_NAME'])
-    # Traverse down the nesting levels from the root field, until we reach the leaf.
-    # Need to traverse until the root, because we have to build the search object
-    # by adding Nested aggregations consecutively. For example, a nested "samples.foo"
-    # field will result in:
-    # Search(...).bucket('samples', Nested(path='samples')).metric(...)
+# load_index_from_json() logs progress every this many documents.
+_BULK_LOAD_PROGRESS_INTERVAL = 100000
+
+# Client returned by get_elasticsearch(), and the process it was created in.
+_elasticsearch = None
+_elasticsearch_pid = None
+_elasticsearch_lock = threading.Lock()
+
+
+def create_elasticsearch(config):
+    """Creates an Elasticsearch client from app config.
+
+    The client owns a urllib3 connection pool with keep-alive connections, so
+    it should be created once per process and reused by every request.
+    """
+    return Elasticsearch(
+        config['ELASTICSEARCH_URL'],
+        maxsize=config['ELASTICSEARCH_MAXSIZE'],
+        timeout=config['ELASTICSEARCH_TIMEOUT'],
+        max_retries=config['ELASTICSEARCH_MAX_RETRIES'],
+        retry_on_timeout=config['ELASTICSEARCH_RETRY_ON_TIMEOUT'])
+
+
+def get_elasticsearch():
+    """Returns the Elasticsearch client shared by all requests in this process.
+
+    When gunicorn preloads the app, init() runs in the master and workers are
+    forked from it. A client's sockets must not be shared across processes, so
+    each process creates its own client on first use.
+    """
+    global _elasticsearch, _elasticsearch_pid
+    with _elasticsearch_lock:
+        if _elasticsearch is None or _elasticsearch_pid != os.getpid():
+            _elasticsearch = create_elasticsearch(current_app.config)
+            _elasticsearch_pid = os.getpid()
+        return _elasticsearch
+
+
+def _get_nestings(field_name):
+    """Returns the nested paths enclosing field_name, outermost first."""
     parts = field_name.split('.')
-    bucket = search.aggs
     parent = ''
     nestings = []
     for part in parts:
         parent = '%s.%s' % (parent, part) if parent else part
         if parent in current_app.config['NESTED_PATHS']:
-            bucket = bucket.bucket(parent, Nested(path=parent))
             nestings.append(parent)
+    return nestings
+
+
+def _get_metrics_search(es, field_names):
+    """Returns a Search with min/max/cardinality aggregations for field_names.
+
+    Metric aggregations for field_names[i] are named i_min, i_max and
+    i_cardinality. Fields under the same nested path share one Nested
+    aggregation. For example, nested "samples.foo" and "samples.bar" fields
+    will result in:
+    Search(...).bucket('samples', Nested(path='samples')).metric(...)
+    """
+    search = Search(using=es, index=current_app.config['INDEX_NAME'])
+    for i, field_name in enumerate(field_names):
+        # Traverse down the nesting levels from the root field, until we reach
+        # the leaf. Need to traverse until the root, because we have to build
+        # the search object by adding Nested aggregations consecutively.
+        bucket = search.aggs
+        for nesting in _get_nestings(field_name):
+            if nesting in bucket:
+                bucket = bucket[nesting]
+            else:
+                bucket = bucket.bucket(nesting, Nested(path=nesting))
+        # Keyword fields don't support min and max.
+        if not field_name.endswith('.keyword'):
+            bucket.metric('%d_max' % i, Max(field=field_name))
+            bucket.metric('%d_min' % i, Min(field=field_name))
+        bucket.metric('%d_cardinality' % i, Cardinality(field=field_name))
+    return search.extra(size=0)
+
+
+def get_field_metrics(es, field_names):
+    """Returns a dict from field name to (min, max, cardinality).
+
+    For ".keyword" fields, min and max are None.
+
+    Aggregations for all fields are sent in one multi-search request, with at
+    most _METRICS_FIELDS_PER_SEARCH fields per search.
+    """
+    field_names = list(OrderedDict.fromkeys(field_names))
+    if not field_names:
+        return {}
+    chunks = [
+        field_names[i:i + _METRICS_FIELDS_PER_SEARCH]
+        for i in range(0, len(field_names), _METRICS_FIELDS_PER_SEARCH)
+    ]
+    multi_search = MultiSearch(using=es,
+                               index=current_app.config['INDEX_NAME'])
+    for chunk in chunks:
+        multi_search = multi_search.add(_get_metrics_search(es, chunk))
+
+    metrics = {}
+    for chunk, response in zip(chunks, multi_search.execute()):
+        all_aggs = response.aggregations.to_dict()
+        for i, field_name in enumerate(chunk):
+            aggs = all_aggs
+            for nesting in _get_nestings(field_name):
+                aggs = aggs.get(nesting)
+            metrics[field_name] = (aggs.get('%d_min' % i, {}).get('value'),
+                                   aggs.get('%d_max' % i, {}).get('value'),
+                                   aggs['%d_cardinality' % i]['value'])
+    return metrics
+
+
+def _get_base_metrics_field_names(field_name, time_series_vals):
+    if time_series_vals:
+        return ["%s.%s" % (field_name, tsv) for tsv in time_series_vals]
+    return [field_name]
 
-    bucket.metric('max', Max(field=field_name))
-    bucket.metric('min', Min(field=field_name))
-    bucket.metric('cardinality', Cardinality(field=field_name))
 
-    aggs = search.params(size=0).execute().aggregations.to_dict()
-    for nesting in nestings:
-        aggs = aggs.get(nesting)
+def get_metrics_field_names(elasticsearch_field_name, field_type,
+                            time_series_vals):
+    """Returns the fields whose metrics get_elasticsearch_facet() needs.
 
-    return (aggs['min']['value'], aggs['max']['value'],
-            aggs['cardinality']['value'])
+    Callers building many facets can pass these to get_field_metrics() once,
+    and pass the result to get_elasticsearch_facet().
+    """
+    if field_type == 'text':
+        return [elasticsearch_field_name + '.keyword']
+    if field_type == 'boolean':
+        return []
+    if time_series_vals:
+        elasticsearch_field_name = elasticsearch_field_name.rsplit('.', 1)[0]
+    return _get_base_metrics_field_names(elasticsearch_field_name,
+                                         time_series_vals)
 
 
-def _get_field_range_and_cardinality(es, field_name, time_series_vals):
+def _get_field_range_and_cardinality(field_name, time_series_vals, metrics):
     if time_series_vals:
         all_metrics = [
-            _get_metrics(es, "%s.%s" % (field_name, tsv))
-            for tsv in time_series_vals
+            metrics[name] for name in _get_base_metrics_field_names(
+                field_name, time_series_vals)
         ]
         total_max = max(m[1] for m in all_metrics)
         total_card = max(m[2] for m in all_metrics)
@@ -62,7 +180,7 @@ def _get_field_range_and_cardinality(es, field_name, time_series_vals):
         else:
             total_min = None
     else:
-        total_min, total_max, total_card = _get_metrics(es, field_name)
+        total_min, total_max, total_card = metrics[field_name]
     if total_max:
         field_range = total_max - total_min
     else:
@@ -71,9 +189,38 @@ def _get_field_range_and_cardinality(es, field_name, time_series_vals):
     return (field_range, total_card)
 
 
-def get_bucket_interval(es, field_name, time_series_vals):
+def get_terms_size(es, field_name, metrics=None):
+    """Returns the terms aggregation size for a keyword field.
+
+    The size is the field's cardinality, plus headroom because cardinality is
+    approximate, up to TERMS_FACET_MAX_SIZE. Fields with few values then don't
+    make Elasticsearch reserve TERMS_FACET_MAX_SIZE buckets per shard. Values
+    beyond TERMS_FACET_MAX_SIZE can be paged through with /facetValues.
+
+    metrics is an optional dict from get_field_metrics().
+    """
+    if metrics is None or field_name not in metrics:
+        metrics = get_field_metrics(es, [field_name])
+    cardinality = metrics[field_name][2] or 0
+    return max(
+        1,
+        min(current_app.config['TERMS_FACET_MAX_SIZE'],
+            cardinality + cardinality // 10 + 1))
+
+
+def get_bucket_interval(es, field_name, time_series_vals, metrics=None):
+    """Returns the histogram interval for a numeric field.
+
+    metrics is an optional dict from get_field_metrics(). If it doesn't have
+    metrics for field_name, they are fetched from Elasticsearch.
+    """
+    metrics_field_names = _get_base_metrics_field_names(
+        field_name, time_series_vals)
+    if metrics is None or not all(name in metrics
+                                  for name in metrics_field_names):
+        metrics = get_field_metrics(es, metrics_field_names)
     field_range, cardinality = _get_field_range_and_cardinality(
-        es, field_name, time_series_vals)
+        field_name, time_series_vals, metrics)
     if field_range < 1:
         return .1
     elif field_range == 1 and cardinality > 2:
@@ -167,6 +314,25 @@ def number_to_range(interval_start, interval):
                             (interval_start + interval - 1) // 1000000000)
 
 
+def merge_histogram_ranges(filter_values, interval):
+    """Returns the fewest [low, high) ranges covering the selected buckets.
+
+    filter_values are bucket starts, eg from range_to_number(). Buckets are
+    merged when one starts where or before the previous one ends, so the
+    ranges cover exactly the same values as the buckets. Both Elasticsearch
+    filters and the SQL query are built from these ranges, so they select the
+    same documents.
+    """
+    ranges = []
+    for low in sorted(filter_values):
+        high = low + interval
+        if ranges and low <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], high)
+        else:
+            ranges.append([low, high])
+    return ranges
+
+
 def convert_to_index_name(s):
     """Converts a string to an Elasticsearch index name."""
     # For Elasticsearch index name restrictions, see
@@ -188,12 +354,12 @@ def convert_to_index_name(s):
     return s
 
 
-def get_facet_value_dict(es, filters, facets):
+def get_facet_value_dict(registry, filters, facets):
     """
     Parses filters and facets into a dict from es_field_name to list of facet values.
 
     Args:
-      es: Elasticsearch
+      registry: A field_registry.FieldRegistry
       filters: List of filter params, where each param has the format
         es_field_name=facet_value
       facets: A dict of facet info's. For facet info structure, see
@@ -215,7 +381,7 @@ def get_facet_value_dict(es, filters, facets):
         es_field_name = facet_name_value[0]
         facet_value = facet_name_value[1]
 
-        if not field_exists(es, es_field_name):
+        if not field_exists(es_field_name, registry):
             invalid_filter_facets.append(es_field_name)
             continue
 
@@ -229,82 +395,82 @@ def get_facet_value_dict(es, filters, facets):
     return filter_dict, invalid_filter_facets
 
 
-def field_exists(es, field_name):
-    try:
-        es.get(index=current_app.config['FIELDS_INDEX_NAME'],
-               doc_type='type',
-               id=field_name)
-    except NotFoundError:
-        # Time series field_name looks like
-        # verily-public-data.framingham_heart_study_teaching.framingham_heart_study_teaching.AGE.1
-        # Remove the ".1" and try again
-        field_name = field_name.rsplit('.', 1)[0]
-        try:
-            es.get(index=current_app.config['FIELDS_INDEX_NAME'],
+def field_exists(field_name, registry):
+    """Returns whether field_name is in the fields index.
+
+    Args:
+      field_name: Elasticsearch field name. Time series field names end with
+        the time, eg ".1".
+      registry: A field_registry.FieldRegistry
+    """
+    return registry.field_exists(field_name)
+
+
+def get_field_descriptions(es, field_names):
+    """Returns a dict from field name to description.
+
+    All descriptions are fetched from the fields index with one mget.
+
+    Args:
+      es: Elasticsearch
+      field_names: Ids of documents in the fields index
+    """
+    if not field_names:
+        return {}
+    docs = es.mget(index=current_app.config['FIELDS_INDEX_NAME'],
                    doc_type='type',
-                   id=field_name)
-        except NotFoundError:
-            return False
-        return True
-    return True
-
-
-def get_field_description(es, field_name):
-    s = Search(using=es, index=current_app.config['FIELDS_INDEX_NAME'])
-    s.update_from_dict(
-        {"query": {
-            "bool": {
-                "must": [{
-                    "match": {
-                        "_id": field_name
-                    }
-                }]
-            }
-        }})
-    hits = s.execute()['hits']['hits']
-    if len(hits) == 0:
-        raise ValueError(
-            'elasticsearch_field_name %s not found in Elasticsearch index %s' %
-            (field_name, current_app.config['FIELDS_INDEX_NAME']))
-
-    dataset = field_name.split('.')[1]
-    table = field_name.split('.')[2]
-    description = 'Dataset {}, table {}'.format(dataset, table)
-    if 'description' in hits[0]['_source']:
-        description += ': {}'.format(hits[0]['_source']['description'])
-    return description
-
-
-def get_field_type(field_name, mapping):
-    submapping = mapping[
-        current_app.config['INDEX_NAME']]['mappings']['type']['properties']
-    for subname in field_name.split('.')[:-1]:
-        submapping = submapping[subname]['properties']
-    submapping = submapping[field_name.split('.')[-1]]
-    return submapping['type']
-
-
-def is_time_series(field_name, mapping):
+                   body={'ids': list(field_names)})['docs']
+    descriptions = {}
+    for doc in docs:
+        field_name = doc['_id']
+        if not doc.get('found'):
+            raise ValueError(
+                'elasticsearch_field_name %s not found in Elasticsearch index %s'
+                % (field_name, current_app.config['FIELDS_INDEX_NAME']))
+        dataset = field_name.split('.')[1]
+        table = field_name.split('.')[2]
+        description = 'Dataset {}, table {}'.format(dataset, table)
+        if 'description' in doc['_source']:
+            description += ': {}'.format(doc['_source']['description'])
+        descriptions[field_name] = description
+    return descriptions
+
+
+def get_field_type(field_name, catalog):
+    """Returns the Elasticsearch type of field_name.
+
+    Args:
+      field_name: Full Elasticsearch field name
+      catalog: A schema_catalog.SchemaCatalog
+    """
+    field_type = catalog.get_field(field_name).type
+    if field_type is None:
+        raise KeyError('%s is an object field, which has no type' % field_name)
+    return field_type
+
+
+def is_time_series(field_name, catalog):
     """Returns true iff field_name has time series data.
     """
-    submapping = mapping[
-        current_app.config['INDEX_NAME']]['mappings']['type']['properties']
-    for subname in field_name.split('.')[:-1]:
-        submapping = submapping[subname]['properties']
-    submapping = submapping[field_name.split('.')[-1]]
-    return ('properties' in submapping
-            and '_is_time_series' in submapping['properties'])
+    return catalog.get_field(field_name).is_time_series
 
 
-def get_time_series_vals(field_name, mapping):
+def get_time_series_vals(field_name, catalog):
     """Returns a sorted array of the times at which field_name could have
     data.
     """
-    submapping = mapping[
-        current_app.config['INDEX_NAME']]['mappings']['type']['properties']
-    for subname in field_name.split('.'):
-        submapping = submapping[subname]['properties']
-    time_series_vals = list(submapping.keys())
+    time_series_vals = catalog.get_field(field_name).time_series_vals
+    assert time_series_vals is not None
+    return list(time_series_vals)
+
+
+def sort_time_series_vals(time_series_keys):
+    """Returns the times in time_series_keys, in sorted order.
+
+    time_series_keys are the property names of a time series field in the
+    index mapping, for example ['_is_time_series', '1', '2', 'Unknown'].
+    """
+    time_series_vals = list(time_series_keys)
     assert '_is_time_series' in time_series_vals
     time_series_vals.remove('_is_time_series')
     has_unknown = 'Unknown' in time_series_vals
@@ -326,25 +492,11 @@ def get_time_series_vals(field_name, mapping):
     return time_series_vals
 
 
-def _get_nested_paths_inner(prefix, mappings):
-    nested_field_paths = []
-    for field_name, field in list(mappings.items()):
-        nested_path = field_name
-        if prefix:
-            nested_path = '%s.%s' % (prefix, field_name)
-        if 'type' in field and field['type'] == 'nested':
-            nested_field_paths.append(nested_path)
-        if 'properties' in field:
-            nested_field_paths.extend(
-                _get_nested_paths_inner(nested_path, field['properties']))
-    return nested_field_paths
-
-
 # TODO: After we are using elasticsearch-dsl version with
 # https://github.com/elastic/elasticsearch-dsl-py/commit/845a2d6bc606e79d36fcebccca64a269ff10984e,
 # delete this method and current_app.config['NESTED_PATHS']. Instead of using
 # current_app.config['NESTED_PATHS'], use index.resolve_nested() instead.
-def get_nested_paths(es):
+def get_nested_paths(catalog):
     """
     Returns nested paths, which can be used to created NestedFacet's.
 
@@ -354,15 +506,10 @@ def get_nested_paths(es):
     The first argument to NestedFacet is a path to the nested field. For example, the 1000 Genomes index has
     one nested path: "samples". See https://github.com/DataBiosphere/data-explorer-indexers#main-dataset-index
 
-    This method crawls through index mappings and returns all nested paths.
+    The schema catalog finds all nested paths when it crawls through the index
+    mappings.
     """
-    nested_paths = []
-    mappings = es.indices.get_mapping(index=current_app.config['INDEX_NAME'])
-    nested_paths.extend(
-        _get_nested_paths_inner(
-            '', mappings[current_app.config['INDEX_NAME']]['mappings']['type']
-            ['properties']))
-    return nested_paths
+    return list(catalog.nested_paths)
 
 
 def _maybe_get_nested_facet(elasticsearch_field_name, es_facet):
@@ -387,15 +534,19 @@ def _maybe_get_nested_facet(elasticsearch_field_name, es_facet):
     return es_facet
 
 
-def get_elasticsearch_facet(es, elasticsearch_field_name, field_type,
-                            time_series_vals):
+def get_elasticsearch_facet(es,
+                            elasticsearch_field_name,
+                            field_type,
+                            time_series_vals,
+                            metrics=None):
     if field_type == 'text':
         # Use ".keyword" because we want aggregation on keyword field, not
         # term field. See
         # https://www.elastic.co/guide/en/elasticsearch/reference/6.2/fielddata.html#before-enabling-fielddata
-        es_facet = TermsFacet(
-            field=elasticsearch_field_name + '.keyword',
-            size=1000)  # TODO we will need to use paging if >1000
+        keyword_field_name = elasticsearch_field_name + '.keyword'
+        es_facet = TermsFacet(field=keyword_field_name,
+                              size=get_terms_size(es, keyword_field_name,
+                                                  metrics))
     elif field_type == 'boolean':
         es_facet = TermsFacet(field=elasticsearch_field_name)
     else:
@@ -405,7 +556,7 @@ def get_elasticsearch_facet(es, elasticsearch_field_name, field_type,
         else:
             es_base_field_name = elasticsearch_field_name
         interval = get_bucket_interval(es, es_base_field_name,
-                                       time_series_vals)
+                                       time_series_vals, metrics)
         # TODO: When https://github.com/elastic/elasticsearch/issues/31828
         # is fixed, use AutoHistogramFacet instead.
         es_facet = HistogramFacet(field=elasticsearch_field_name,
@@ -417,6 +568,32 @@ def get_elasticsearch_facet(es, elasticsearch_field_name, field_type,
     return es_facet
 
 
+def add_elasticsearch_facets(es, facets, facets_time_series_vals):
+    """Sets es_facet for every facet in facets.
+
+    Histogram intervals depend on the min, max and cardinality of numeric
+    fields. Fetch these for all facets in one multi-search, rather than one
+    search per field and time.
+
+    Args:
+      es: Elasticsearch
+      facets: A dict of facet info's, without es_facet. For facet info
+        structure, see app.app.config['FACET_INFO'] in __main__.py
+      facets_time_series_vals: Dict from es_field_name to the field's time
+        series values
+    """
+    metrics_field_names = []
+    for es_field_name, facet_info in facets.items():
+        metrics_field_names.extend(
+            get_metrics_field_names(es_field_name, facet_info['type'],
+                                    facets_time_series_vals[es_field_name]))
+    metrics = get_field_metrics(es, metrics_field_names)
+    for es_field_name, facet_info in facets.items():
+        facet_info['es_facet'] = get_elasticsearch_facet(
+            es, es_field_name, facet_info['type'],
+            facets_time_series_vals[es_field_name], metrics)
+
+
 def is_histogram_facet(facet):
     if isinstance(facet, HistogramFacet):
         return True
@@ -450,27 +627,153 @@ def _create_index(es, index, mappings_file=None):
         es.indices.create(index=index)
 
 
-def load_index_from_json(es, index, index_file, mappings_file=None):
-    """Load index from index.json.
+def _get_index_actions(index, index_file):
+    """Yields bulk index actions for the documents in index_file.
 
-    Input must be JSON, not CSV. Unlike JSON, CSV values don't have types, so
-    numbers would be indexed as strings. (And there is no easy way in Python to
-    detect the type of a string.)
+    This is a generator, so only the documents in flight are in memory.
     """
-    current_app.logger.info('Loading %s index from JSON cache.' % index)
-    _delete_index(es, index)
-    _create_index(es, index, mappings_file)
-    actions = []
     with open(index_file) as f:
         for line in f:
             # Each line contains a JSON document. See
             # https://github.com/taskrabbit/elasticsearch-dump#dump-format
             record = json.loads(line)
-            action = {
+            yield {
                 '_id': record['_id'],
                 '_index': index,
                 '_type': 'type',
                 '_source': record['_source'],
             }
-            actions.append(action)
-    helpers.bulk(es, actions)
+
+
+def _get_bulk_load_settings(es, index):
+    """Returns the index settings that _set_bulk_load_settings() changes."""
+    settings = es.indices.get_settings(index=index)[index]['settings']['index']
+    # None resets refresh_interval to the Elasticsearch default.
+    return {
+        'refresh_interval': settings.get('refresh_interval'),
+        'number_of_replicas': settings.get('number_of_replicas'),
+    }
+
+
+def _set_bulk_load_settings(es, index):
+    """Speeds up bulk loading by disabling refresh and replicas.
+
+    Replicas are rebuilt from the primary once loading is done, which is
+    cheaper than indexing every document on every replica.
+    """
+    es.indices.put_settings(
+        index=index,
+        body={'index': {
+            'refresh_interval': '-1',
+            'number_of_replicas': 0,
+        }})
+
+
+def _get_checksum_and_count(index_file, mappings_file):
+    """Returns a checksum of index_file and mappings_file, and the number of
+    documents in index_file.
+    """
+    checksum = hashlib.sha256()
+    document_count = 0
+    with open(index_file, 'rb') as f:
+        for line in f:
+            checksum.update(line)
+            document_count += 1
+    if mappings_file:
+        with open(mappings_file, 'rb') as f:
+            checksum.update(f.read())
+    return checksum.hexdigest(), document_count
+
+
+def _index_is_current(es, index, checksum, document_count):
+    """Returns true iff index was loaded from files with the given checksum."""
+    if not es.indices.exists(index=index):
+        return False
+    mappings = es.indices.get_mapping(index=index)[index]['mappings']
+    meta = mappings.get('type', {}).get('_meta', {})
+    if meta.get('checksum') != checksum:
+        return False
+    return es.count(index=index)['count'] == document_count
+
+
+@contextlib.contextmanager
+def _index_file_lock(index):
+    """Serializes loading of index across processes on this machine.
+
+    Without this, gunicorn workers started without preload would delete and
+    recreate each other's index.
+    """
+    lock_path = os.path.join(tempfile.gettempdir(),
+                             'data_explorer_%s.lock' % index)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_index_from_json(es, index, index_file, mappings_file=None):
+    """Load index from index.json, unless it is already loaded.
+
+    Input must be JSON, not CSV. Unlike JSON, CSV values don't have types, so
+    numbers would be indexed as strings. (And there is no easy way in Python to
+    detect the type of a string.)
+
+    A checksum of index_file and mappings_file is stored in the index mapping's
+    _meta. If the index already exists with the same checksum and document
+    count, it is reused.
+    """
+    checksum, document_count = _get_checksum_and_count(index_file,
+                                                       mappings_file)
+    with _index_file_lock(index):
+        if _index_is_current(es, index, checksum, document_count):
+            current_app.logger.info(
+                'Index %s is up to date with JSON cache, not reloading.' %
+                index)
+            return
+        _load_index_from_json(es, index, index_file, mappings_file)
+        # Only store the checksum after all documents have been loaded, so a
+        # partially loaded index is never reused.
+        es.indices.put_mapping(index=index,
+                               doc_type='type',
+                               body={'_meta': {
+                                   'checksum': checksum
+                               }})
+
+
+def _load_index_from_json(es, index, index_file, mappings_file):
+    """Deletes index and loads it from index_file.
+
+    index_file is streamed, and chunks of documents are indexed by
+    BULK_LOAD_THREAD_COUNT threads, so memory use doesn't grow with the size
+    of index_file.
+    """
+    current_app.logger.info('Loading %s index from JSON cache.' % index)
+    _delete_index(es, index)
+    _create_index(es, index, mappings_file)
+
+    original_settings = _get_bulk_load_settings(es, index)
+    _set_bulk_load_settings(es, index)
+    start = time.time()
+    count = 0
+    try:
+        for success, info in helpers.parallel_bulk(
+                es,
+                _get_index_actions(index, index_file),
+                thread_count=current_app.config['BULK_LOAD_THREAD_COUNT'],
+                chunk_size=current_app.config['BULK_LOAD_CHUNK_SIZE'],
+                max_chunk_bytes=current_app.config['BULK_LOAD_MAX_CHUNK_BYTES']
+        ):
+            count += 1
+            if count % _BULK_LOAD_PROGRESS_INTERVAL == 0:
+                current_app.logger.info(
+                    'Loaded %d documents into %s index (%d documents/sec).' %
+                    (count, index, count / (time.time() - start)))
+    finally:
+        es.indices.put_settings(index=index, body={'index': original_settings})
+    es.indices.refresh(index=index)
+    elapsed = time.time() - start
+    current_app.logger.info(
+        'Loaded %d documents into %s index in %d seconds (%d documents/sec).' %
+        (count, index, elapsed, count / max(elapsed, .001)))
@@ -0,0 +1,113 @@
+"""Reads and writes snapshots of app.app.config['FACET_INFO'].
+
+Computing FACET_INFO requires reading the index mapping and running
+Elasticsearch queries to choose histogram intervals and terms sizes. The result
+only depends on the mapping, the documents, ui.json and TERMS_FACET_MAX_SIZE, so
+it is saved to a JSON file keyed by a fingerprint of those. Workers that start
+with an unchanged index and ui.json load the file instead of recomputing
+FACET_INFO.
+"""
+
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+from elasticsearch_dsl import HistogramFacet
+from elasticsearch_dsl import TermsFacet
+from elasticsearch_dsl.faceted_search import NestedFacet
+from flask import current_app
+
+from data_explorer.util import schema_catalog
+
+# Bump this if the snapshot format changes, so old snapshots are ignored.
+_SNAPSHOT_VERSION = 2
+
+_FACET_CLASSES = {
+    'histogram': HistogramFacet,
+    'terms': TermsFacet,
+}
+
+
+def get_snapshot_key(es, ui_config_path):
+    """Returns a fingerprint of everything FACET_INFO is computed from."""
+    catalog = schema_catalog.get_schema_catalog()
+    document_count = es.count(index=current_app.config['INDEX_NAME'])['count']
+    with open(ui_config_path, 'rb') as f:
+        ui_config = f.read()
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(str(_SNAPSHOT_VERSION).encode('utf-8'))
+    fingerprint.update(catalog.fingerprint.encode('utf-8'))
+    fingerprint.update(str(document_count).encode('utf-8'))
+    fingerprint.update(
+        str(current_app.config['TERMS_FACET_MAX_SIZE']).encode('utf-8'))
+    fingerprint.update(ui_config)
+    return fingerprint.hexdigest()
+
+
+def _facet_to_dict(es_facet):
+    # Use hasattr instead of isinstance for NestedFacet; see
+    # elasticsearch_util.is_histogram_facet().
+    if hasattr(es_facet, '_inner'):
+        return {
+            'nested_path': es_facet._path,
+            'inner': _facet_to_dict(es_facet._inner)
+        }
+    return {'agg_type': es_facet.agg_type, 'params': es_facet._params}
+
+
+def _facet_from_dict(facet_dict):
+    if 'nested_path' in facet_dict:
+        return NestedFacet(facet_dict['nested_path'],
+                           _facet_from_dict(facet_dict['inner']))
+    return _FACET_CLASSES[facet_dict['agg_type']](**facet_dict['params'])
+
+
+def save(path, key, facets, nested_paths):
+    """Writes facets and nested_paths to path.
+
+    The file is written to a temporary file and renamed, so concurrent readers
+    never see a partial snapshot.
+    """
+    facets_dicts = OrderedDict()
+    for es_field_name, facet_info in facets.items():
+        facet_dict = OrderedDict(facet_info)
+        facet_dict['es_facet'] = _facet_to_dict(facet_info['es_facet'])
+        facets_dicts[es_field_name] = facet_dict
+
+    snapshot = {
+        'key': key,
+        'nested_paths': nested_paths,
+        'facets': facets_dicts,
+    }
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.rename(tmp_path, path)
+    current_app.logger.info('Wrote facet info snapshot %s' % path)
+
+
+def load(path, key):
+    """Returns (facets, nested_paths) from the snapshot at path.
+
+    Returns (None, None) if there is no snapshot, or if it was computed from a
+    different mapping, document count or ui.json.
+    """
+    if not os.path.isfile(path):
+        return None, None
+    with open(path) as f:
+        try:
+            snapshot = json.load(f, object_pairs_hook=OrderedDict)
+        except ValueError as e:
+            current_app.logger.warning(
+                'Ignoring unreadable facet info snapshot %s: %s' % (path, e))
+            return None, None
+    if snapshot.get('key') != key:
+        current_app.logger.info('Facet info snapshot %s is stale.' % path)
+        return None, None
+
+    facets = snapshot['facets']
+    for facet_info in facets.values():
+        facet_info['es_facet'] = _facet_from_dict(facet_info['es_facet'])
+    return facets, snapshot['nested_paths']
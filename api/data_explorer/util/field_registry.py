@@ -0,0 +1,111 @@
+"""In-memory registry of the fields in the fields index.
+
+Validating a filter or extra facet used to mean one or two GETs against the
+fields index. FieldRegistry holds the ids of all documents in the fields index,
+so validation doesn't touch Elasticsearch.
+
+Field descriptions are only needed for extra facets, so they are fetched when
+first requested and kept in an LRU cache.
+"""
+
+import threading
+
+from cachetools import LRUCache
+from elasticsearch import helpers
+from flask import current_app
+
+from data_explorer.util import elasticsearch_util
+from data_explorer.util import index_generation
+
+# Registry returned by get_field_registry().
+_registry = None
+_lock = threading.Lock()
+
+_DESCRIPTIONS_CACHE_SIZE = 10000
+# Field name to description, for the index generation in
+# _descriptions_generation.
+_descriptions = LRUCache(maxsize=_DESCRIPTIONS_CACHE_SIZE)
+_descriptions_generation = None
+_descriptions_lock = threading.Lock()
+
+
+class FieldRegistry(object):
+    """Names of the fields in the fields index."""
+    def __init__(self, field_names, generation=None):
+        """
+        :param field_names: Ids of the documents in the fields index.
+        :param generation: The index generation field_names was read at.
+        """
+        self.generation = generation
+        self._field_names = frozenset(field_names)
+
+    def field_exists(self, field_name):
+        if field_name in self._field_names:
+            return True
+        # Time series field_name looks like
+        # verily-public-data.framingham_heart_study_teaching.framingham_heart_study_teaching.AGE.1
+        # The fields index only has the field without the ".1".
+        return field_name.rsplit('.', 1)[0] in self._field_names
+
+    def __len__(self):
+        return len(self._field_names)
+
+
+def _load_field_names(es):
+    hits = helpers.scan(es,
+                        index=current_app.config['FIELDS_INDEX_NAME'],
+                        query={'query': {
+                            'match_all': {}
+                        }},
+                        _source=False)
+    return [hit['_id'] for hit in hits]
+
+
+def get_field_registry(refresh=False):
+    """Returns the registry for the fields index.
+
+    The registry is reloaded when the index generation changes, or when
+    refresh is true.
+    """
+    global _registry
+    generation = index_generation.get_index_generation()
+    with _lock:
+        if (refresh or _registry is None
+                or _registry.generation != generation):
+            _registry = FieldRegistry(
+                _load_field_names(elasticsearch_util.get_elasticsearch()),
+                generation)
+            current_app.logger.info(
+                'Loaded %d fields from %s index.' %
+                (len(_registry), current_app.config['FIELDS_INDEX_NAME']))
+        return _registry
+
+
+def get_field_descriptions(field_names):
+    """Returns a dict from field name to description.
+
+    Descriptions that aren't cached are fetched with one mget. The cache is
+    cleared when the index generation changes.
+    """
+    global _descriptions_generation
+    generation = index_generation.get_index_generation()
+    descriptions = {}
+    missing_field_names = []
+    with _descriptions_lock:
+        if _descriptions_generation != generation:
+            _descriptions.clear()
+            _descriptions_generation = generation
+        for field_name in set(field_names):
+            if field_name in _descriptions:
+                descriptions[field_name] = _descriptions[field_name]
+            else:
+                missing_field_names.append(field_name)
+
+    if missing_field_names:
+        fetched = elasticsearch_util.get_field_descriptions(
+            elasticsearch_util.get_elasticsearch(), missing_field_names)
+        with _descriptions_lock:
+            if _descriptions_generation == generation:
+                _descriptions.update(fetched)
+        descriptions.update(fetched)
+    return descriptions
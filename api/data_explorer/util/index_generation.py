@@ -0,0 +1,49 @@
+"""Detects when the main or fields Elasticsearch index changes.
+
+Data derived from the indices, such as the schema catalog, is kept in memory
+and rebuilt when the generation returned by get_index_generation() changes.
+"""
+
+import threading
+import time
+
+from flask import current_app
+
+from data_explorer.util import elasticsearch_util
+
+# Last generation seen by this process, and when it was checked.
+_generation = None
+_checked_at = 0
+_lock = threading.Lock()
+
+
+def _fetch_index_generation(es):
+    index_names = [
+        current_app.config['INDEX_NAME'],
+        current_app.config['FIELDS_INDEX_NAME']
+    ]
+    # Reindexing creates a new index, with a new uuid. docs.count catches
+    # documents being added to or deleted from an existing index.
+    indices = es.cat.indices(index=','.join(index_names),
+                             h='index,uuid,docs.count',
+                             format='json')
+    by_name = dict((index['index'], index) for index in indices)
+    return tuple((by_name[name]['uuid'], by_name[name]['docs.count'])
+                 for name in index_names)
+
+
+def get_index_generation():
+    """Returns a token that changes when the main or fields index changes.
+
+    Elasticsearch is asked at most once every INDEX_GENERATION_CHECK_SECONDS;
+    in between, the last token is returned.
+    """
+    global _generation, _checked_at
+    with _lock:
+        now = time.time()
+        if (_generation is None or now - _checked_at >=
+                current_app.config['INDEX_GENERATION_CHECK_SECONDS']):
+            _generation = _fetch_index_generation(
+                elasticsearch_util.get_elasticsearch())
+            _checked_at = now
+        return _generation
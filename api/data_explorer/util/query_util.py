@@ -1,45 +1,47 @@
 import urllib.parse
+from collections import OrderedDict
 from elasticsearch_dsl import HistogramFacet
 
 from flask import current_app
 
+from data_explorer.util import elasticsearch_util
 
-def _get_range_clause(column, value, bucket_interval):
-    """Returns an SQL clause specifying that column is in the range
-    specified by value. Uses bucket_interval to avoid potentially
-    ambiguous ranges such as 1.0B-1.9B, which really means [1B, 2B).
-    """
-    if value[0] == '-':
-        # avoid minus sign with split
-        arr = value[1:].split('-', 1)
-        arr[0] = '-' + arr[0]
-    else:
-        arr = value.split('-', 1)
-    if len(arr) > 1:
-        low = arr[0]
-        high = arr[1]
-    else:
-        return column + " = " + value
-    if low.endswith('M'):
-        low = int(round(float(low[:-1]) * 1000000))
-        high = low + bucket_interval
-    elif low.endswith('B'):
-        low = int(round(float(low[:-1]) * 1000000000))
-        high = low + bucket_interval
-    elif '.' not in low:
-        low = int(low)
-        high = low + bucket_interval
 
-    # low is inclusive, high is exclusive
-    # See https://github.com/elastic/elasticsearch-dsl-py/blob/master/elasticsearch_dsl/faceted_search.py#L125
-    return column + " >= " + str(low) + " AND " + column + " < " + str(high)
+def _format_bound(bound):
+    # Bounds of float intervals are sums like 0.1 + 0.2, so round off the
+    # error.
+    if isinstance(bound, float):
+        return '%.15g' % bound
+    return str(bound)
+
 
+def _get_range_clauses(column, values, bucket_interval):
+    """Returns SQL clauses specifying that column is in the histogram buckets
+    specified by values, eg "20-29". Contiguous buckets are merged, so "20-29"
+    and "30-39" become one clause, "age76 >= 20 AND age76 < 40".
 
-def _get_table_and_clause(es_field_name, field_type, value, bucket_interval,
-                          sample_file_column_fields, is_time_series,
-                          time_series_column):
-    """Returns a table name and a single condition of a WHERE clause,
-    eg "((age76 >= 20 AND age76 < 30) OR (age76 >= 30 AND age76 < 40))".
+    Buckets are merged by elasticsearch_util.merge_histogram_ranges(), like in
+    Elasticsearch filters. Without bucket_interval, values are compared for
+    equality.
+    """
+    if bucket_interval is None:
+        return [column + " = " + value for value in values]
+    clauses = []
+    # low is inclusive, high is exclusive
+    # See https://github.com/elastic/elasticsearch-dsl-py/blob/master/elasticsearch_dsl/faceted_search.py#L125
+    lows = [elasticsearch_util.range_to_number(value) for value in values]
+    for low, high in elasticsearch_util.merge_histogram_ranges(
+            lows, bucket_interval):
+        clauses.append(column + " >= " + _format_bound(low) + " AND " +
+                       column + " < " + _format_bound(high))
+    return clauses
+
+
+def _get_table_and_clauses(es_field_name, field_type, values, bucket_interval,
+                           sample_file_column_fields, is_time_series,
+                           time_series_column):
+    """Returns a table name and conditions of a WHERE clause, one per value
+    or merged range of values, eg ["age76 >= 20 AND age76 < 40"].
     """
     sample_file_type_field = False
 
@@ -60,28 +62,36 @@ def _get_table_and_clause(es_field_name, field_type, value, bucket_interval,
             op = '='
         assert not sample_file_type_field
         if field_type == 'text':
-            clause = '%s = "%s" AND %s %s %s' % (column, value,
-                                                 time_series_column, op, tsv)
+            clauses = [
+                '%s = "%s" AND %s %s %s' %
+                (column, value, time_series_column, op, tsv)
+                for value in values
+            ]
         elif field_type == 'boolean':
-            clause = '%s = %s AND %s %s %s' % (column, value,
-                                               time_series_column, op, tsv)
+            clauses = [
+                '%s = %s AND %s %s %s' %
+                (column, value, time_series_column, op, tsv)
+                for value in values
+            ]
         else:
-            clause = '%s AND %s %s %s' % (_get_range_clause(
-                column, value, bucket_interval), time_series_column, op, tsv)
+            clauses = [
+                '%s AND %s %s %s' % (clause, time_series_column, op, tsv) for
+                clause in _get_range_clauses(column, values, bucket_interval)
+            ]
     else:
         table_name, column = es_field_name.rsplit('.', 1)
         if sample_file_type_field:
-            if value == True:
-                clause = '%s IS NOT NULL' % column
-            else:
-                clause = '%s IS NULL' % column
+            clauses = [
+                '%s IS NOT NULL' % column if value == True else '%s IS NULL' %
+                column for value in values
+            ]
         elif field_type == 'text':
-            clause = '%s = "%s"' % (column, value)
+            clauses = ['%s = "%s"' % (column, value) for value in values]
         elif field_type == 'boolean':
-            clause = '%s = %s' % (column, value)
+            clauses = ['%s = %s' % (column, value) for value in values]
         else:
-            clause = _get_range_clause(column, value, bucket_interval)
-    return table_name, column, clause
+            clauses = _get_range_clauses(column, values, bucket_interval)
+    return table_name, column, clauses
 
 
 def _get_bucket_interval(facet):
@@ -119,12 +129,16 @@ def get_sql_query(filters, extra_facets_dict):
     # facet_table_clauses must have two levels of nesting (es_field_name, table_name)
     # because clauses from the same column are OR'ed together, whereas clauses
     # from different columns are AND'ed together.
-    facet_table_clauses = {}
+    # Map from es_field_name to list of values. Values of the same facet are
+    # converted to clauses together, so that adjacent ranges can be merged.
+    facet_values = OrderedDict()
     for filter_str in filters:
         filter_str = urllib.parse.unquote(filter_str)
         splits = filter_str.rsplit('=', 1)
-        es_field_name = splits[0]
-        value = splits[1]
+        facet_values.setdefault(splits[0], []).append(splits[1])
+
+    facet_table_clauses = {}
+    for es_field_name, values in facet_values.items():
         field_type = ''
         is_time_series = False
         bucket_interval = None
@@ -141,15 +155,15 @@ def get_sql_query(filters, extra_facets_dict):
                 'time_series_field', False)
             bucket_interval = _get_bucket_interval(
                 extra_facets_dict[es_field_name]['es_facet'])
-        table_name, column, clause = _get_table_and_clause(
-            es_field_name, field_type, value, bucket_interval,
+        table_name, column, clauses = _get_table_and_clauses(
+            es_field_name, field_type, values, bucket_interval,
             sample_file_column_fields, is_time_series, time_series_column)
 
         if es_field_name not in facet_table_clauses:
             facet_table_clauses[es_field_name] = {}
         if table_name not in facet_table_clauses[es_field_name]:
             facet_table_clauses[es_field_name][table_name] = []
-        facet_table_clauses[es_field_name][table_name].append(clause)
+        facet_table_clauses[es_field_name][table_name].extend(clauses)
 
     # Map from table name to list of where clauses.
     table_wheres = {}
@@ -214,4 +228,4 @@ def get_sql_query(filters, extra_facets_dict):
         query = _append_to_query(query, table, join, table_num)
         table_num += 1
 
-    return query
\ No newline at end of file
+    return query
@@ -0,0 +1,95 @@
+"""Per-process cache of serialized API responses.
+
+Responses are stored as JSON bytes, keyed by a canonical form of the request.
+The cache is bounded by the total size of the stored responses, entries expire
+after a TTL, and the cache is cleared when the index generation changes.
+"""
+
+import threading
+
+from cachetools import TTLCache
+from flask import current_app
+
+# Cache returned by get_facets_cache().
+_facets_cache = None
+_facets_cache_lock = threading.Lock()
+# Cache returned by get_count_cache().
+_count_cache = None
+_count_cache_lock = threading.Lock()
+
+
+class ResponseCache(object):
+    """Bounded cache from request key to response bytes."""
+    def __init__(self, max_bytes, ttl_seconds):
+        """
+        :param max_bytes: Maximum total size of cached responses. 0 disables
+          the cache.
+        :param ttl_seconds: How long a response is cached for.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        if max_bytes > 0:
+            self._cache = TTLCache(maxsize=max_bytes,
+                                   ttl=ttl_seconds,
+                                   getsizeof=len)
+        else:
+            self._cache = None
+
+    def get(self, key, generation):
+        """Returns the response bytes for key, or None.
+
+        If generation differs from the index generation of the cached
+        responses, the cache is cleared first.
+        """
+        with self._lock:
+            if self._generation != generation:
+                if self._cache is not None:
+                    self._cache.clear()
+                self._generation = generation
+            value = self._cache.get(key) if self._cache is not None else None
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        with self._lock:
+            if (self._cache is None or self._generation != generation
+                    or len(value) > self.max_bytes):
+                return
+            self._cache[key] = value
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._cache) if self._cache is not None else 0,
+                'bytes': self._cache.currsize if self._cache is not None else 0
+            }
+
+
+def get_facets_cache():
+    """Returns the cache for /facets responses."""
+    global _facets_cache
+    with _facets_cache_lock:
+        if _facets_cache is None:
+            _facets_cache = ResponseCache(
+                current_app.config['FACETS_CACHE_MAX_BYTES'],
+                current_app.config['FACETS_CACHE_TTL_SECONDS'])
+        return _facets_cache
+
+
+def get_count_cache():
+    """Returns the cache for /count responses."""
+    global _count_cache
+    with _count_cache_lock:
+        if _count_cache is None:
+            _count_cache = ResponseCache(
+                current_app.config['COUNT_CACHE_MAX_BYTES'],
+                current_app.config['FACETS_CACHE_TTL_SECONDS'])
+        return _count_cache
@@ -0,0 +1,96 @@
+"""In-memory catalog of the fields in the main index mapping.
+
+Looking up a field used to mean fetching the mapping from Elasticsearch and
+walking it by splitting the field name on '.'. SchemaCatalog walks the mapping
+once and stores every field by its full name.
+"""
+
+import collections
+import hashlib
+import json
+import threading
+
+from flask import current_app
+
+from data_explorer.util import elasticsearch_util
+from data_explorer.util import index_generation
+
+# - type: Elasticsearch field type, or None for object fields
+# - nested_path: Path of the innermost nested field containing this field
+#   (possibly this field itself), or None
+# - is_time_series: If this field has time series data
+# - time_series_vals: Sorted times at which this field could have data, if
+#   is_time_series
+SchemaField = collections.namedtuple(
+    'SchemaField',
+    ['type', 'nested_path', 'is_time_series', 'time_series_vals'])
+
+# Catalog returned by get_schema_catalog().
+_catalog = None
+_lock = threading.Lock()
+
+
+class SchemaCatalog(object):
+    """Fields of an index mapping, keyed by full field name."""
+    def __init__(self, properties, generation=None):
+        """
+        :param properties: The 'properties' dict of the index mapping.
+        :param generation: The index generation properties was read at.
+        """
+        self.generation = generation
+        self.fingerprint = hashlib.sha256(
+            json.dumps(properties,
+                       sort_keys=True).encode('utf-8')).hexdigest()
+        # Nested paths, in the order they appear in the mapping.
+        self.nested_paths = []
+        self._fields = {}
+        self._add_fields('', None, properties)
+
+    def _add_fields(self, prefix, nested_path, properties):
+        for name, field in properties.items():
+            field_name = '%s.%s' % (prefix, name) if prefix else name
+            field_nested_path = nested_path
+            if field.get('type') == 'nested':
+                self.nested_paths.append(field_name)
+                field_nested_path = field_name
+            sub_properties = field.get('properties', {})
+            is_time_series = '_is_time_series' in sub_properties
+            time_series_vals = None
+            if is_time_series:
+                time_series_vals = elasticsearch_util.sort_time_series_vals(
+                    sub_properties.keys())
+            self._fields[field_name] = SchemaField(field.get('type'),
+                                                   field_nested_path,
+                                                   is_time_series,
+                                                   time_series_vals)
+            if sub_properties:
+                self._add_fields(field_name, field_nested_path, sub_properties)
+
+    def get_field(self, field_name):
+        """Returns the SchemaField for field_name.
+
+        Raises KeyError if field_name is not in the mapping.
+        """
+        return self._fields[field_name]
+
+    def __contains__(self, field_name):
+        return field_name in self._fields
+
+
+def get_schema_catalog():
+    """Returns the catalog for the main index.
+
+    The catalog is rebuilt from the index mapping when the index generation
+    changes, so requests normally don't fetch the mapping.
+    """
+    global _catalog
+    generation = index_generation.get_index_generation()
+    with _lock:
+        if _catalog is None or _catalog.generation != generation:
+            index_name = current_app.config['INDEX_NAME']
+            es = elasticsearch_util.get_elasticsearch()
+            mapping = es.indices.get_mapping(index=index_name)
+            _catalog = SchemaCatalog(
+                mapping[index_name]['mappings']['type']['properties'],
+                generation)
+        return _catalog
@@ -0,0 +1,62 @@
+"""Coalesces identical concurrent calls within a process.
+
+When many users load the same page at once, each gunicorn thread would send
+the same Elasticsearch query. With SingleFlight, the first call for a key runs
+and concurrent calls for the same key wait for and share its result.
+"""
+
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time."""
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (fn(), whether the result came from a concurrent call).
+
+        If fn is already running for key, waits for it and returns its result,
+        or raises its exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def get_stats(self):
+        with self._lock:
+            return {'executions': self.executions, 'coalesced': self.coalesced}
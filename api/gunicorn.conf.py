@@ -0,0 +1,26 @@
+"""gunicorn settings for the API server.
+
+By default the app is preloaded: data_explorer.__main__ is imported, and so
+init() runs, once in the gunicorn master. Workers are forked from the master
+and share its app.app.config copy-on-write, so startup time doesn't grow with
+the number of workers and bundled datasets are only loaded into Elasticsearch
+once. Each worker opens its own Elasticsearch connections after fork; see
+elasticsearch_util.get_elasticsearch().
+
+Preloading doesn't work with --reload, because workers are forked from the
+master's already-imported code. Set PRELOAD_APP=false when using --reload.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() == 'true'
+
+
+def pre_fork(server, worker):
+    # Move objects created by init() into the permanent generation, so the
+    # garbage collector doesn't write to their pages in workers. Writes would
+    # copy the pages, undoing copy-on-write sharing. gc.freeze() is only
+    # available in Python 3.7+.
+    if preload_app and hasattr(gc, 'freeze'):
+        gc.freeze()
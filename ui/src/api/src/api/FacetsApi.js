@@ -13,6 +13,8 @@
 
 
 import ApiClient from "../ApiClient";
+import CountResponse from '../model/CountResponse';
+import FacetValuesResponse from '../model/FacetValuesResponse';
 import FacetsResponse from '../model/FacetsResponse';
 
 /**
@@ -34,6 +36,107 @@ export default class FacetsApi {
     }
 
 
+    /**
+     * Callback function to receive the result of the countGet operation.
+     * @callback module:api/FacetsApi~countGetCallback
+     * @param {String} error Error message, if any.
+     * @param {module:model/CountResponse} data The data returned by the service call.
+     * @param {String} response The complete HTTP response.
+     */
+
+    /**
+     * Returns the number of entities matching filter, like the count of /facets. This doesn&#39;t compute facets, so it is much faster than /facets. 
+     * @param {Object} opts Optional parameters
+     * @param {Array.<String>} opts.filter Same as the /facets filter parameter.
+     * @param {Array.<String>} opts.extraFacets Same as the /facets extraFacets parameter. Needed for filters on extra facets. 
+     * @param {module:api/FacetsApi~countGetCallback} callback The callback function, accepting three arguments: error, data, response
+     * data is of type: {@link module:model/CountResponse}
+     */
+    countGet(opts, callback) {
+      opts = opts || {};
+      let postBody = null;
+
+
+      let pathParams = {
+      };
+      let queryParams = {
+        'filter': this.apiClient.buildCollectionParam(opts['filter'], 'pipes'),
+        'extraFacets': this.apiClient.buildCollectionParam(opts['extraFacets'], 'pipes')
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = [];
+      let contentTypes = [];
+      let accepts = [];
+      let returnType = CountResponse;
+
+      return this.apiClient.callApi(
+        '/count', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, callback
+      );
+    }
+
+
+    /**
+     * Callback function to receive the result of the facetValuesGet operation.
+     * @callback module:api/FacetsApi~facetValuesGetCallback
+     * @param {String} error Error message, if any.
+     * @param {module:model/FacetValuesResponse} data The data returned by the service call.
+     * @param {String} response The complete HTTP response.
+     */
+
+    /**
+     * Returns a page of the values of a text facet, in value order. /facets returns at most TERMS_FACET_MAX_SIZE values per facet; this returns all of them, one page at a time. Counts are computed like in /facets. Facets of nested fields aren&#39;t supported. 
+     * @param {String} esFieldName The Elasticsearch field name of the facet.
+     * @param {Object} opts Optional parameters
+     * @param {Array.<String>} opts.filter Same as the /facets filter parameter.
+     * @param {Array.<String>} opts.extraFacets Same as the /facets extraFacets parameter.
+     * @param {String} opts.after after from the previous page&#39;s response. Unset for the first page. 
+     * @param {Number} opts.pageSize Maximum number of values to return. (default to 100)
+     * @param {module:api/FacetsApi~facetValuesGetCallback} callback The callback function, accepting three arguments: error, data, response
+     * data is of type: {@link module:model/FacetValuesResponse}
+     */
+    facetValuesGet(esFieldName, opts, callback) {
+      opts = opts || {};
+      let postBody = null;
+
+      // verify the required parameter 'esFieldName' is set
+      if (esFieldName === undefined || esFieldName === null) {
+        throw new Error("Missing the required parameter 'esFieldName' when calling facetValuesGet");
+      }
+
+
+      let pathParams = {
+      };
+      let queryParams = {
+        'esFieldName': esFieldName,
+        'filter': this.apiClient.buildCollectionParam(opts['filter'], 'pipes'),
+        'extraFacets': this.apiClient.buildCollectionParam(opts['extraFacets'], 'pipes'),
+        'after': opts['after'],
+        'pageSize': opts['pageSize']
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = [];
+      let contentTypes = [];
+      let accepts = [];
+      let returnType = FacetValuesResponse;
+
+      return this.apiClient.callApi(
+        '/facetValues', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, callback
+      );
+    }
+
+
     /**
      * Callback function to receive the result of the facetsGet operation.
      * @callback module:api/FacetsApi~facetsGetCallback
@@ -47,6 +150,9 @@ export default class FacetsApi {
      * @param {Object} opts Optional parameters
      * @param {Array.<String>} opts.filter filter represents selected facet values. Elasticsearch query will be run only over selected facet values. filter is an array of strings, where each string has the format \&quot;esFieldName&#x3D;facetValue\&quot;. Example url /facets?filter&#x3D;Gender&#x3D;female,Region&#x3D;northwest,Region&#x3D;southwest 
      * @param {Array.<String>} opts.extraFacets extraFacets represents the fields selected from the field search box. extraFacets is a list of Elasticsearch field names. In the returned list of facets, the extra facets will come before the facets from ui.json.
+     * @param {String} opts.timeSeriesEncoding How time series facet counts are returned. With dense, time_series_value_counts has a count for every time and value. With sparse, it only has the non-zero counts of each time, and time_series_value_indexes has their value indexes. Sparse is much smaller for time series facets with many times and values.  (default to 'dense')
+     * @param {Boolean} opts.approximate If true, facet counts may be estimated from a random sample of the documents matching the filters, which is faster on large indices. count is always exact.  (default to false)
+     * @param {Array.<String>} opts.fields If set, only the facets with these Elasticsearch field names are returned, for example the facets on screen, and only their counts are computed. For a time series facet, use its es_field_name without the time. filter still applies to all facets. 
      * @param {module:api/FacetsApi~facetsGetCallback} callback The callback function, accepting three arguments: error, data, response
      * data is of type: {@link module:model/FacetsResponse}
      */
@@ -59,7 +165,10 @@ export default class FacetsApi {
       };
       let queryParams = {
         'filter': this.apiClient.buildCollectionParam(opts['filter'], 'pipes'),
-        'extraFacets': this.apiClient.buildCollectionParam(opts['extraFacets'], 'pipes')
+        'extraFacets': this.apiClient.buildCollectionParam(opts['extraFacets'], 'pipes'),
+        'timeSeriesEncoding': opts['timeSeriesEncoding'],
+        'approximate': opts['approximate'],
+        'fields': this.apiClient.buildCollectionParam(opts['fields'], 'pipes')
       };
       let headerParams = {
       };
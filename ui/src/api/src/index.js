@@ -13,10 +13,12 @@
 
 
 import ApiClient from './ApiClient';
+import CountResponse from './model/CountResponse';
 import DatasetResponse from './model/DatasetResponse';
 import ExportUrlRequest from './model/ExportUrlRequest';
 import ExportUrlResponse from './model/ExportUrlResponse';
 import Facet from './model/Facet';
+import FacetValuesResponse from './model/FacetValuesResponse';
 import FacetsResponse from './model/FacetsResponse';
 import SearchResponse from './model/SearchResponse';
 import SearchResult from './model/SearchResult';
@@ -64,6 +66,12 @@ export {
      */
     ApiClient,
 
+    /**
+     * The CountResponse model constructor.
+     * @property {module:model/CountResponse}
+     */
+    CountResponse,
+
     /**
      * The DatasetResponse model constructor.
      * @property {module:model/DatasetResponse}
@@ -88,6 +96,12 @@ export {
      */
     Facet,
 
+    /**
+     * The FacetValuesResponse model constructor.
+     * @property {module:model/FacetValuesResponse}
+     */
+    FacetValuesResponse,
+
     /**
      * The FacetsResponse model constructor.
      * @property {module:model/FacetsResponse}
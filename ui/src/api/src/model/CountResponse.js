@@ -0,0 +1,72 @@
+/**
+ * Data Explorer Service
+ * API Service that reads from Elasticsearch.
+ *
+ * OpenAPI spec version: 0.0.1
+ * 
+ *
+ * NOTE: This class is auto generated by the swagger code generator program.
+ * https://github.com/swagger-api/swagger-codegen.git
+ * Do not edit the class manually.
+ *
+ */
+
+
+import ApiClient from '../ApiClient';
+
+
+
+
+
+/**
+* The CountResponse model module.
+* @module model/CountResponse
+* @version 0.0.1
+*/
+export default class CountResponse {
+    /**
+    * Constructs a <code>CountResponse</code> from a plain JavaScript object, optionally creating a new instance.
+    * Copies all relevant properties from <code>data</code> to <code>obj</code> if supplied or a new instance if not.
+    * @param {Object} data The plain JavaScript object bearing properties of interest.
+    * @param {module:model/CountResponse} obj Optional instance to populate.
+    * @return {module:model/CountResponse} The populated <code>CountResponse</code> instance.
+    */
+    static constructFromObject(data, obj) {
+        if (data) {
+            obj = obj || new CountResponse();
+
+            
+            
+            
+
+            if (data.hasOwnProperty('count')) {
+                obj['count'] = ApiClient.convertToType(data['count'], 'Number');
+            }
+            if (data.hasOwnProperty('invalid_filter_facets')) {
+                obj['invalid_filter_facets'] = ApiClient.convertToType(data['invalid_filter_facets'], ['String']);
+            }
+        }
+        return obj;
+    }
+
+    /**
+    * Number of entities represented by current facet selection.
+    * @member {Number} count
+    */
+    count = undefined;
+    /**
+    * Facets that were passed in filter param that don't exist in Elasticsearch index. See FacetsResponse. 
+    * @member {Array.<String>} invalid_filter_facets
+    */
+    invalid_filter_facets = undefined;
+
+
+
+
+
+
+
+
+}
+
+
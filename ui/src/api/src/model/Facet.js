@@ -57,12 +57,18 @@ export default class Facet {
             if (data.hasOwnProperty('value_counts')) {
                 obj['value_counts'] = ApiClient.convertToType(data['value_counts'], ['Number']);
             }
+            if (data.hasOwnProperty('value_count_errors')) {
+                obj['value_count_errors'] = ApiClient.convertToType(data['value_count_errors'], ['Number']);
+            }
             if (data.hasOwnProperty('time_names')) {
                 obj['time_names'] = ApiClient.convertToType(data['time_names'], ['String']);
             }
             if (data.hasOwnProperty('time_series_value_counts')) {
                 obj['time_series_value_counts'] = ApiClient.convertToType(data['time_series_value_counts'], [['Number']]);
             }
+            if (data.hasOwnProperty('time_series_value_indexes')) {
+                obj['time_series_value_indexes'] = ApiClient.convertToType(data['time_series_value_indexes'], [['Number']]);
+            }
         }
         return obj;
     }
@@ -98,15 +104,25 @@ export default class Facet {
     */
     value_counts = undefined;
     /**
+    * Only set if the response is approximate. Standard errors of value_counts. 
+    * @member {Array.<Number>} value_count_errors
+    */
+    value_count_errors = undefined;
+    /**
     * Array of times.
     * @member {Array.<String>} time_names
     */
     time_names = undefined;
     /**
-    * 2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names. 
+    * 2-dimensional array of facet value counts, indexed by time then value; indexes correspond to time_names and then value_names. If timeSeriesEncoding is sparse, each time only has its non-zero counts, for the values in time_series_value_indexes. 
     * @member {Array.<Array.<Number>>} time_series_value_counts
     */
     time_series_value_counts = undefined;
+    /**
+    * Only set if timeSeriesEncoding is sparse. 2-dimensional array of value_names indexes, indexed by time, in increasing order. time_series_value_counts[i][j] is the count of value_names[time_series_value_indexes[i][j]] at time_names[i]. 
+    * @member {Array.<Array.<Number>>} time_series_value_indexes
+    */
+    time_series_value_indexes = undefined;
 
 
 
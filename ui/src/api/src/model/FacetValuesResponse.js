@@ -0,0 +1,88 @@
+/**
+ * Data Explorer Service
+ * API Service that reads from Elasticsearch.
+ *
+ * OpenAPI spec version: 0.0.1
+ * 
+ *
+ * NOTE: This class is auto generated by the swagger code generator program.
+ * https://github.com/swagger-api/swagger-codegen.git
+ * Do not edit the class manually.
+ *
+ */
+
+
+import ApiClient from '../ApiClient';
+
+
+
+
+
+/**
+* The FacetValuesResponse model module.
+* @module model/FacetValuesResponse
+* @version 0.0.1
+*/
+export default class FacetValuesResponse {
+    /**
+    * Constructs a <code>FacetValuesResponse</code> from a plain JavaScript object, optionally creating a new instance.
+    * Copies all relevant properties from <code>data</code> to <code>obj</code> if supplied or a new instance if not.
+    * @param {Object} data The plain JavaScript object bearing properties of interest.
+    * @param {module:model/FacetValuesResponse} obj Optional instance to populate.
+    * @return {module:model/FacetValuesResponse} The populated <code>FacetValuesResponse</code> instance.
+    */
+    static constructFromObject(data, obj) {
+        if (data) {
+            obj = obj || new FacetValuesResponse();
+
+            
+            
+            
+
+            if (data.hasOwnProperty('es_field_name')) {
+                obj['es_field_name'] = ApiClient.convertToType(data['es_field_name'], 'String');
+            }
+            if (data.hasOwnProperty('value_names')) {
+                obj['value_names'] = ApiClient.convertToType(data['value_names'], ['String']);
+            }
+            if (data.hasOwnProperty('value_counts')) {
+                obj['value_counts'] = ApiClient.convertToType(data['value_counts'], ['Number']);
+            }
+            if (data.hasOwnProperty('after')) {
+                obj['after'] = ApiClient.convertToType(data['after'], 'String');
+            }
+        }
+        return obj;
+    }
+
+    /**
+    * The Elasticsearch field name.
+    * @member {String} es_field_name
+    */
+    es_field_name = undefined;
+    /**
+    * Array of names of facet values, in order.
+    * @member {Array.<String>} value_names
+    */
+    value_names = undefined;
+    /**
+    * Array of counts for each facet value.
+    * @member {Array.<Number>} value_counts
+    */
+    value_counts = undefined;
+    /**
+    * Pass as after to get the next page. Not set on the last page. 
+    * @member {String} after
+    */
+    after = undefined;
+
+
+
+
+
+
+
+
+}
+
+
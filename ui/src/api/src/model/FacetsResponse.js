@@ -55,6 +55,12 @@ export default class FacetsResponse {
             if (data.hasOwnProperty('sql_query')) {
                 obj['sql_query'] = ApiClient.convertToType(data['sql_query'], 'String');
             }
+            if (data.hasOwnProperty('approximate')) {
+                obj['approximate'] = ApiClient.convertToType(data['approximate'], 'Boolean');
+            }
+            if (data.hasOwnProperty('invalid_fields')) {
+                obj['invalid_fields'] = ApiClient.convertToType(data['invalid_fields'], ['String']);
+            }
         }
         return obj;
     }
@@ -83,6 +89,16 @@ export default class FacetsResponse {
     * @member {String} sql_query
     */
     sql_query = undefined;
+    /**
+    * True if facet counts were estimated from a sample of documents. Unset if they are exact. 
+    * @member {Boolean} approximate
+    */
+    approximate = undefined;
+    /**
+    * Names that were passed in fields param that aren't facets, for example because the dataset was updated since a saved url was created. Unset if fields isn't set or all of its names are facets. 
+    * @member {Array.<String>} invalid_fields
+    */
+    invalid_fields = undefined;
 
 
 